@@ -1,29 +1,27 @@
-import cv2
 import numpy as np
-import time
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from mypkg.calibration import load_camera_params
+from mypkg.adaptive_color import AdaptiveColorRanges
+from mypkg.detector import BallDetector
+from mypkg.distance_model import load_distance_lut
+from mypkg.frontend import run_tracker
+from mypkg.kalman import BallStateEstimator
+from mypkg.sources import open_source_from_args
 
 # カメラ設定
 DEVICE = '/dev/video4'
-cap = cv2.VideoCapture(DEVICE)
-cap.set(cv2.CAP_PROP_FRAME_WIDTH, 1280)
-cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
-cap.set(cv2.CAP_PROP_FPS, 15)
 
-if not cap.isOpened():
-    print(f"カメラ {DEVICE} を開けませんでした")
-    exit()
+# True にすると生フレームで検出し、円の中心と縁の点だけを歪み補正する
+SPARSE_UNDISTORT = False
 
 # 実際のボール直径（cm）
-BALL_DIAMETER = 5.5  
+BALL_DIAMETER = 5.5
 
-# カメラキャリブレーションパラメータ
-camera_matrix = np.array([
-    [750.10059546,   0.0,        704.54913907],
-    [0.0,            746.54075486, 445.7714058],
-    [0.0,            0.0,          1.0]
-])
-
-dist_coeffs = np.array([0.04739503, -0.07422041, 0.00880341, 0.0123376, 0.02295108])
+# カメラキャリブレーションパラメータ（camera_calib で作ったファイル、なければ params.py の値）
+camera_matrix, dist_coeffs = load_camera_params(DEVICE, (1280, 720))
 
 # HSV色範囲（赤・青・黄）
 color_ranges = {
@@ -38,80 +36,48 @@ draw_colors = {
     "yellow": (0, 255, 255)
 }
 
-kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (5, 5))
-
-def update_max_circle(x, y, radius, color, current_max):
-    if radius > current_max["radius"]:
-        current_max["radius"] = radius
-        current_max["center"] = (int(x), int(y))
-        current_max["color"] = color
-    return current_max
-
-while True:
-    start_time = time.time()
-
-    ret, frame = cap.read()
-    if not ret:
-        print("フレーム取得に失敗")
-        break
-
-    # 歪み補正
-    frame_undistorted = cv2.undistort(frame, camera_matrix, dist_coeffs)
-
-    blurred = cv2.medianBlur(frame_undistorted, 5)
-    hsv = cv2.cvtColor(blurred, cv2.COLOR_BGR2HSV)
-
-    combined_mask = None
-    masks = {}
-
-    max_circle = {
-        "radius": 0,
-        "center": None,
-        "color": None
-    }
-
-    for color, (lower, upper) in color_ranges.items():
-        mask = cv2.inRange(hsv, lower, upper)
-        masks[color] = mask
-        combined_mask = mask if combined_mask is None else combined_mask | mask
-
-    for color, mask in masks.items():
-        mask_cleaned = cv2.morphologyEx(mask, cv2.MORPH_OPEN, kernel, iterations=2)
-        contours, _ = cv2.findContours(mask_cleaned, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-
-        for cnt in contours:
-            area = cv2.contourArea(cnt)
-            if area < 300:
-                continue
-            (x, y), radius = cv2.minEnclosingCircle(cnt)
-            max_circle = update_max_circle(x, y, radius, color, max_circle)
-
-    if max_circle["center"] is not None:
-        cv2.circle(frame_undistorted, max_circle["center"], int(max_circle["radius"]), draw_colors[max_circle["color"]], 2)
-        cv2.circle(frame_undistorted, max_circle["center"], 5, (0, 0, 0), -1)
-        cv2.putText(frame_undistorted, f"{max_circle['color'].capitalize()} Ball Pos: {max_circle['center']}",
-                    (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, draw_colors[max_circle["color"]], 2)
-
-        # 距離計算（焦点距離は fx を使用）
-        pixel_diameter = max_circle["radius"] * 2
-        if pixel_diameter > 0:
-            fx = camera_matrix[0, 0]
-            distance = (BALL_DIAMETER * fx) / pixel_diameter
-            cv2.putText(frame_undistorted, f"Distance: {distance:.2f} cm",
-                        (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.7, draw_colors[max_circle["color"]], 2)
-
-    # 表示
-    cv2.imshow("Combined Mask", combined_mask)
-    cv2.imshow("Undistorted View", frame_undistorted)
-
-    fps = 1 / (time.time() - start_time)
-    print(f"FPS: {fps:.2f}", end='\r')
-
-    time.sleep(0.1)
-
-    if cv2.waitKey(1) & 0xFF == 27:
-        break
-
-cap.release()
-cv2.destroyAllWindows()
-
+# ボールを捉えている間は予測位置の周辺だけを処理する
+# （最大のボール 1 個の周辺だけを探すので、balls には 1 個しか返らない）
+ROI_TRACKING = False
+ROI_MAX_MISSES = 3   # この回数続けて見失ったら全体探索に戻る
+ROI_FULL_EVERY = 30  # このフレーム数ごとに全体探索する
+
+# True にすると検出処理中の描画・画面表示を一切行わない（ロボット上での実行用）
+HEADLESS = False
+# ヘッドレス時のプレビュー（None: なし、'mjpeg': http://127.0.0.1:8080/、'files': preview/preview.jpg）
+PREVIEW_MODE = None
+
+# 色ごとのマスク処理を並列に行うワーカープロセス数（0 なら 1 色ずつ順に処理）
+PARALLEL_WORKERS = 0
+
+# カメラの MJPEG を 1/DECODE_SCALE に縮小デコードする（1: 縮小しない、2, 4, 8）
+DECODE_SCALE = 1
+
+detector = BallDetector(
+    color_ranges,
+    camera_matrix=camera_matrix, dist_coeffs=dist_coeffs,
+    undistort='sparse' if SPARSE_UNDISTORT else 'remap', report_undistort=True,
+    ball_diameter=BALL_DIAMETER,
+    roi_tracking=ROI_TRACKING, roi_max_misses=ROI_MAX_MISSES, roi_full_every=ROI_FULL_EVERY,
+    workers=PARALLEL_WORKERS, decode_scale=DECODE_SCALE)
+
+# 距離モデルがあれば、画素直径→距離の表で距離を求める（カメラ・解像度・歪み補正が違えば使わない）
+#   distance_calib SWEEP -o ball_distance --camera /dev/video4 --undistort remap で作る
+DISTANCE_MODEL = 'ball_distance'
+detector.distance_lut = load_distance_lut(DISTANCE_MODEL, detector, DEVICE, (1280, 720))
+
+# True にすると照明の変化に合わせて色範囲を少しずつ動かす（見失い続けたら元に戻す）
+ADAPTIVE_COLOR = False
+color_model = AdaptiveColorRanges(detector, color_ranges) if ADAPTIVE_COLOR else None
+
+# 色ごとのカルマンフィルタ（平滑化と遅延補償）
+ball_filters = BallStateEstimator(model='cv')
+
+# 引数で動画・画像ディレクトリ・.raw 録画を指定するとカメラの代わりに使う（--record で録画）
+#   取り込みスレッドが起動するので、検出器（並列処理のワーカーを fork する）を作った後に開く
+capture = open_source_from_args(DEVICE, width=1280, height=720, fps=15,
+                                decode_scale=DECODE_SCALE)
+
+run_tracker(capture, detector, window_name="Undistorted View", headless=HEADLESS,
+            preview_mode=PREVIEW_MODE, ball_filters=ball_filters, draw_colors=draw_colors,
+            color_model=color_model)
@@ -1,13 +1,18 @@
 import cv2
-import numpy as np
+import os
+import sys
 import matplotlib.pyplot as plt
 
-# === キャリブレーション済みパラメータ ===
-camera_matrix = np.array([[750.10059546, 0., 704.54913907],
-                          [0., 746.54075486, 445.7714058],
-                          [0., 0., 1.]])
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from mypkg.calibration import load_camera_params
+from mypkg.capture import DEFAULT_PROFILE, open_capture
 
-dist_coeffs = np.array([0.04739503, -0.07422041, 0.00880341, 0.0123376, 0.02295108])
+# 確かめるカメラ（calibration.py で較正したもの）
+DEVICE = 0
+
+# === キャリブレーション済みパラメータ（camera_calib で作ったファイル、なければ params.py の値）===
+camera_matrix, dist_coeffs = load_camera_params(
+    DEVICE, (DEFAULT_PROFILE.width, DEFAULT_PROFILE.height))
 
 # === グリッド描画関数 ===
 def draw_grid(img, grid_size=50, color=(0, 255, 0), thickness=1):
@@ -18,13 +23,10 @@ def draw_grid(img, grid_size=50, color=(0, 255, 0), thickness=1):
         cv2.line(img, (0, y), (w, y), color, thickness)
     return img
 
-# === カメラ起動 ===
-cap = cv2.VideoCapture(0)
-cap.set(cv2.CAP_PROP_FRAME_WIDTH, 1280)
-cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 675)
-cap.set(cv2.CAP_PROP_FPS, 15)
-
-if not cap.isOpened():
+# === カメラ起動（トラッカーと同じ取り込み設定）===
+try:
+    cap, _, _ = open_capture(DEVICE, DEFAULT_PROFILE)
+except IOError:
     print("❌ カメラが開けませんでした")
     exit()
 
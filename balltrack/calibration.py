@@ -1,10 +1,26 @@
 import cv2
 import numpy as np
+import os
+import sys
 from matplotlib import pyplot as plt
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from mypkg.calibration import (AsyncChessboardFinder, calib_path, find_corners_scaled,
+                               save_calibration)
+from mypkg.capture import DEFAULT_PROFILE, open_capture
+
+# 較正するカメラ（保存先はカメラごとに分かれる。トラッカーの DEVICE と同じ値にする）
+DEVICE = 0
+
 CHECKERBOARD =( 7,7 )
 SQUARE_SIZE = 25
 
+# 交点検出に使う縮小率（プレビューとキャプチャ時の粗い検出）
+DETECT_SCALE = 0.5
+
+# キャプチャした画像の保存先（camera_calib でまとめて較正し直せる）
+SAVE_DIR = 'calib_images'
+
 criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.001)
 
 objp = np.zeros((CHECKERBOARD[0]*CHECKERBOARD[1], 3), np.float32)
@@ -15,29 +31,28 @@ objpoints = []
 imgpoints = []
 
 # === カメラ起動チェック付き設定 ===
-cap = cv2.VideoCapture(0)
-cap.set(cv2.CAP_PROP_FRAME_WIDTH, 1280)
-cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 675)
-cap.set(cv2.CAP_PROP_FPS, 15)
-
-if not cap.isOpened():
-    print("❌ カメラを開けませんでした。デバイス番号（VideoCaptureの引数）を確認してください。")
+# トラッカーと同じ取り込み設定（1280x720、MJPG、15fps）で撮る（解像度が違うと較正が合わない）
+try:
+    cap, _, _ = open_capture(DEVICE, DEFAULT_PROFILE)
+except IOError:
+    print("❌ カメラを開けませんでした。デバイス番号（open_captureの引数）を確認してください。")
     exit()
 
 print("✅ カメラ接続成功。スペースキーでキャプチャ、ESCキーで終了")
 
+# 交点検出は縮小画像で別スレッドに任せ、表示は止めない
+finder = AsyncChessboardFinder(CHECKERBOARD, DETECT_SCALE)
+image_size = None
+
 while True:
     ret, frame = cap.read()
     if not ret:
         print("❌ フレームを取得できませんでした。")
         break
 
+    finder.submit(frame)
     display = frame.copy()
-    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-
-    found, corners = cv2.findChessboardCorners(
-        gray, CHECKERBOARD,
-        cv2.CALIB_CB_ADAPTIVE_THRESH + cv2.CALIB_CB_FAST_CHECK + cv2.CALIB_CB_NORMALIZE_IMAGE)
+    found, corners = finder.latest()
 
     if found:
         cv2.drawChessboardCorners(display, CHECKERBOARD, corners, found)
@@ -50,18 +65,28 @@ while True:
     if key == 27:
         break
     elif key == 32 and found:
+        # キャプチャするフレームで検出し直し、元の解像度で交点を詰める
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        ok, corners = find_corners_scaled(gray, CHECKERBOARD, DETECT_SCALE)
+        if not ok:
+            print("> ⚠ このフレームでは交点が見つかりませんでした。もう一度押してください。")
+            continue
         corners2 = cv2.cornerSubPix(gray, corners, (11,11), (-1,-1), criteria)
+        image_size = gray.shape[::-1]
         imgpoints.append(corners2)
         objpoints.append(objp)
+        os.makedirs(SAVE_DIR, exist_ok=True)
+        cv2.imwrite(os.path.join(SAVE_DIR, f"calib_{len(objpoints):03d}.png"), frame)
         print(f"> 📸 キャプチャ成功：{len(objpoints)} 枚目")
 
+finder.close()
 cap.release()
 cv2.destroyAllWindows()
 
 # === キャリブレーション実行 ===
 if len(objpoints) >= 5:
-    ret, camera_matrix, dist_coeffs, rvecs, tvecs = cv2.calibrateCamera(
-        objpoints, imgpoints, gray.shape[::-1], None, None)
+    ret, camera_matrix, dist_coeffs, rvecs, tvecs, _, _, per_view_errors = \
+        cv2.calibrateCameraExtended(objpoints, imgpoints, image_size, None, None)
 
     print("\n=== 🎯 キャリブレーション結果 ===")
     print("カメラ行列（Camera Matrix）:")
@@ -76,6 +101,17 @@ if len(objpoints) >= 5:
     print("\n並進ベクトル（Translation Vector）:")
     print(tvecs[0].ravel())
 
+    # トラッカーが読み込むファイルに保存（画像ごとの再投影誤差も残す）
+    save_calibration(calib_path(DEVICE), {
+        'rms': ret,
+        'camera_matrix': camera_matrix,
+        'dist_coeffs': dist_coeffs,
+        'per_view_errors': [
+            {'image': os.path.join(SAVE_DIR, f"calib_{i + 1:03d}.png"), 'error': float(e)}
+            for i, e in enumerate(per_view_errors.ravel())],
+    }, image_size, CHECKERBOARD, SQUARE_SIZE, {'camera': DEVICE})
+    print(f"\n💾 {calib_path(DEVICE)} に保存しました（再投影誤差 {ret:.3f} px）")
+
     # 歪み補正表示
     h, w = frame.shape[:2]
     new_camera_matrix, roi = cv2.getOptimalNewCameraMatrix(
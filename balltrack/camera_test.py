@@ -1,20 +1,44 @@
+import os
+import sys
+import time
+
 import cv2
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from mypkg.camera_profile import interval_stats, print_stats
+from mypkg.capture import DEFAULT_PROFILE, open_capture
+
 DEVICE_INDEX = 1 # /dev/video4 に対応
 
-cap = cv2.VideoCapture(DEVICE_INDEX)
-cap.set(cv2.CAP_PROP_FPS, 15)
+# V4L2 で MJPG、1280x720、15fps、ドライバのバッファ 1 枚（mypkg/capture.py の DEFAULT_PROFILE）
+PROFILE = DEFAULT_PROFILE
 
-if not cap.isOpened():
+# 画面に出す fps・ばらつきを計算するフレーム数
+WINDOW = 60
+
+try:
+    cap, applied, mismatches = open_capture(DEVICE_INDEX, PROFILE)
+except IOError:
     print("カメラを開けませんでした")
     exit()
 
+print(f"実際の設定: {applied['width']}x{applied['height']} {applied['fourcc']} "
+      f"{applied['fps']:.1f}fps バッファ {applied['buffer_size']} ({applied['backend']})")
+
+stamps = []
+frame = None
 while True:
-    ret, frame = cap.read()
+    ret, frame = cap.read(frame)
+    stamps.append(time.perf_counter())
     if not ret:
         print("フレームの取得に失敗しました")
         break
 
+    stats = interval_stats(stamps[-WINDOW:])
+    if 'fps' in stats:
+        text = (f"{stats['fps']:.1f} fps  jitter {stats['jitter_std_ms']:.1f} ms  "
+                f"{applied['fourcc']}")
+        cv2.putText(frame, text, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
     cv2.imshow('4K USB Camera', frame)
 
     if cv2.waitKey(1) & 0xFF == 27:  # ESCキーで終了
@@ -23,3 +47,5 @@ while True:
 cap.release()
 cv2.destroyAllWindows()
 
+# 全体の測定結果（表示の時間も含む。表示なしで測るときは camera_profile コマンド）
+print_stats(interval_stats(stamps, applied['fps']))
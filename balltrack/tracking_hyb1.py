@@ -1,17 +1,15 @@
-import cv2
 import numpy as np
-import time
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from mypkg.detector import BallDetector
+from mypkg.distance_model import load_distance_lut
+from mypkg.frontend import run_tracker
+from mypkg.sources import open_source_from_args
 
 # カメラ設定
 DEVICE = '/dev/video0'
-cap = cv2.VideoCapture(DEVICE)
-cap.set(cv2.CAP_PROP_FRAME_WIDTH, 1280)
-cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
-cap.set(cv2.CAP_PROP_FPS, 15)
-
-if not cap.isOpened():
-    print(f"カメラ {DEVICE} を開けませんでした")
-    exit()
 
 # 実際のボール直径とカメラの焦点距離
 BALL_DIAMETER = 5.5  # cm
@@ -30,79 +28,37 @@ draw_colors = {
     "yellow": (0, 255, 255)
 }
 
-kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (5, 5))
-
-# 円の最大半径情報を更新する関数
-def update_max_circle(x, y, radius, color, current_max):
-    if radius > current_max["radius"]:
-        current_max["radius"] = radius
-        current_max["center"] = (int(x), int(y))
-        current_max["color"] = color
-    return current_max
-
-while True:
-    start_time = time.time()
-
-    ret, frame = cap.read()
-    if not ret:
-        print("フレーム取得に失敗")
-        break
-
-    blurred = cv2.medianBlur(frame, 5)
-    hsv = cv2.cvtColor(blurred, cv2.COLOR_BGR2HSV)
-
-    combined_mask = None
-    masks = {}
-
-    # 色ごとのマスク作成
-    for color, (lower, upper) in color_ranges.items():
-        mask = cv2.inRange(hsv, lower, upper)
-        masks[color] = mask
-        combined_mask = mask if combined_mask is None else combined_mask | mask
-
-    # 最大の円情報を格納
-    max_circle = {
-        "radius": 0,
-        "center": None,
-        "color": None
-    }
-
-    for color, mask in masks.items():
-        mask_cleaned = cv2.morphologyEx(mask, cv2.MORPH_OPEN, kernel, iterations=2)
-        contours, _ = cv2.findContours(mask_cleaned, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-
-        for cnt in contours:
-            area = cv2.contourArea(cnt)
-            if area < 300:
-                continue
-            (x, y), radius = cv2.minEnclosingCircle(cnt)
-            max_circle = update_max_circle(x, y, radius, color, max_circle)
+# ボールを捉えている間は予測位置の周辺だけを処理する
+# （最大のボール 1 個の周辺だけを探すので、balls には 1 個しか返らない）
+ROI_TRACKING = False
+ROI_MAX_MISSES = 3   # この回数続けて見失ったら全体探索に戻る
+ROI_FULL_EVERY = 30  # このフレーム数ごとに全体探索する
 
-    # 最大円を描画＋距離測定
-    if max_circle["center"] is not None:
-        cv2.circle(frame, max_circle["center"], int(max_circle["radius"]), draw_colors[max_circle["color"]], 2)
-        cv2.circle(frame, max_circle["center"], 5, (0, 0, 0), -1)
-        cv2.putText(frame, f"{max_circle['color'].capitalize()} Ball Pos: {max_circle['center']}",
-                    (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, draw_colors[max_circle["color"]], 2)
+# True にすると検出処理中の描画・画面表示を一切行わない（ロボット上での実行用）
+HEADLESS = False
+# ヘッドレス時のプレビュー（None: なし、'mjpeg': http://127.0.0.1:8080/、'files': preview/preview.jpg）
+PREVIEW_MODE = None
 
-        # 距離計算
-        pixel_diameter = max_circle["radius"] * 2
-        if pixel_diameter > 0:
-            distance = (BALL_DIAMETER * FOCAL_LENGTH) / pixel_diameter
-            cv2.putText(frame, f"Distance: {distance:.2f} cm",
-                        (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.7, draw_colors[max_circle["color"]], 2)
+# 色ごとのマスク処理を並列に行うワーカープロセス数（0 なら 1 色ずつ順に処理）
+PARALLEL_WORKERS = 0
 
-    # 画面表示
-    cv2.imshow("Combined Mask", combined_mask)
-    cv2.imshow("Hybrid Detection", frame)
+# カメラの MJPEG を 1/DECODE_SCALE に縮小デコードする（1: 縮小しない、2, 4, 8）
+DECODE_SCALE = 1
 
-    # FPS表示（ターミナル）
-    fps = 1 / (time.time() - start_time)
-    print(f"FPS: {fps:.2f}", end='\r')
+detector = BallDetector(
+    color_ranges, ball_diameter=BALL_DIAMETER, focal_length=FOCAL_LENGTH,
+    roi_tracking=ROI_TRACKING, roi_max_misses=ROI_MAX_MISSES, roi_full_every=ROI_FULL_EVERY,
+    workers=PARALLEL_WORKERS, decode_scale=DECODE_SCALE)
 
-    if cv2.waitKey(1) & 0xFF == 27:
-        break
+# 距離モデルがあれば、画素直径→距離の表で距離を求める（カメラ・解像度・歪み補正が違えば使わない）
+#   distance_calib SWEEP -o tracking_hyb1 --camera /dev/video0 で作る
+DISTANCE_MODEL = 'tracking_hyb1'
+detector.distance_lut = load_distance_lut(DISTANCE_MODEL, detector, DEVICE, (1280, 720))
 
-cap.release()
-cv2.destroyAllWindows()
+# 引数で動画・画像ディレクトリ・.raw 録画を指定するとカメラの代わりに使う（--record で録画）
+#   取り込みスレッドが起動するので、検出器（並列処理のワーカーを fork する）を作った後に開く
+capture = open_source_from_args(DEVICE, width=1280, height=720, fps=15,
+                                decode_scale=DECODE_SCALE)
 
+run_tracker(capture, detector, window_name="Hybrid Detection", headless=HEADLESS,
+            preview_mode=PREVIEW_MODE, draw_colors=draw_colors)
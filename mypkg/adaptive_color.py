@@ -0,0 +1,218 @@
+from collections import deque
+
+import cv2
+import numpy as np
+
+from mypkg.color_lut import _as_range_list
+
+# H-S ヒストグラムのビン数（H は 1 ビン 1 段階、S は 1 ビン 4 段階）
+H_BINS = 180
+S_BINS = 64
+S_STEP = 256 // S_BINS
+
+
+# 色範囲の内側を一様に埋めた H-S ヒストグラム（合計 1）
+def range_histogram(color_range):
+    hist = np.zeros((H_BINS, S_BINS), dtype=np.float32)
+    for lower, upper in _as_range_list(color_range):
+        h0, h1 = int(lower[0]), int(upper[0])
+        s0, s1 = int(lower[1]) // S_STEP, int(upper[1]) // S_STEP
+        if h0 <= h1:
+            hist[h0:h1 + 1, s0:s1 + 1] = 1.0
+        else:
+            hist[h0:, s0:s1 + 1] = 1.0
+            hist[:h1 + 1, s0:s1 + 1] = 1.0
+    return hist / hist.sum()
+
+
+def _same_range(a, b):
+    ra, rb = _as_range_list(a), _as_range_list(b)
+    return len(ra) == len(rb) and all(
+        np.array_equal(la, lb) and np.array_equal(ua, ub) for (la, ua), (lb, ub) in zip(ra, rb))
+
+
+# 質量 coverage を含む最短の色相の区間 (h0, h1)（h0 > h1 は 179→0 をまたぐ）
+def hue_interval(hue_mass, coverage):
+    cum = np.concatenate(([0.0], np.cumsum(np.concatenate((hue_mass, hue_mass)))))
+    starts = np.arange(H_BINS)
+    ends = np.searchsorted(cum, cum[starts] + coverage * hue_mass.sum())
+    i = int(np.argmin(ends - starts))
+    return i, int(ends[i] - 1) % H_BINS
+
+
+# 両端から (1 - coverage) / 2 ずつ除いた区間
+def central_interval(mass, coverage):
+    cum = np.cumsum(mass) / mass.sum()
+    tail = (1.0 - coverage) / 2
+    return int(np.searchsorted(cum, tail)), int(np.searchsorted(cum, 1.0 - tail))
+
+
+class AdaptiveColorModel:
+    """1 色分の H-S ヒストグラムを確かなボールの画素で少しずつ更新し、色範囲を求め直す.
+
+    ヒストグラムは元の色範囲を一様に埋めたものから始め、
+    hist = (1 - learning_rate) * hist + learning_rate * 今回の画素 で更新する。
+    V の範囲は元のまま使う。元のヒストグラムからのずれ（Bhattacharyya 距離）が
+    max_drift を超えたら、最後に確かめた状態へ戻す。
+    """
+
+    def __init__(self, color_range, learning_rate=0.05, coverage=0.98, max_drift=0.6,
+                 history=5):
+        ranges = _as_range_list(color_range)
+        self.seed_range = color_range
+        self.v_range = (min(int(lower[2]) for lower, _ in ranges),
+                        max(int(upper[2]) for _, upper in ranges))
+        self.learning_rate = learning_rate
+        self.coverage = coverage
+        self.max_drift = max_drift
+        self.seed_hist = range_histogram(color_range)
+        self.hist = self.seed_hist.copy()
+        self.good = deque([self.seed_hist.copy()], maxlen=history)
+        self.updates = 0
+
+    # 確かなボールの HSV 画素（N x 3）で更新する
+    def update(self, pixels):
+        if len(pixels) == 0:
+            return
+        sample = cv2.calcHist([pixels.reshape(-1, 1, 3)], [0, 1], None, [H_BINS, S_BINS],
+                              [0, 180, 0, 256])
+        total = sample.sum()
+        if total == 0:
+            return
+        self.hist *= 1.0 - self.learning_rate
+        self.hist += (self.learning_rate / total) * sample
+        self.updates += 1
+
+    def drift(self):
+        return cv2.compareHist(self.seed_hist, self.hist, cv2.HISTCMP_BHATTACHARYYA)
+
+    def drifted(self):
+        return self.drift() > self.max_drift
+
+    # 今のヒストグラムから求めた色範囲 (lower, upper)（更新前なら元の色範囲）
+    def color_range(self):
+        if np.array_equal(self.hist, self.seed_hist):
+            return self.seed_range
+        h0, h1 = hue_interval(self.hist.sum(axis=1), self.coverage)
+        s0, s1 = central_interval(self.hist.sum(axis=0), self.coverage)
+        lower = np.array([h0, s0 * S_STEP, self.v_range[0]])
+        upper = np.array([h1, min(255, (s1 + 1) * S_STEP - 1), self.v_range[1]])
+        return lower, upper
+
+    # 今の状態を「確かめた状態」として残す
+    def snapshot(self):
+        self.good.append(self.hist.copy())
+
+    # 最後に確かめた状態へ戻す（一度も確かめていなければ元の色範囲）
+    def rollback(self):
+        self.hist = self.good[-1].copy()
+
+    def reset(self):
+        self.hist = self.seed_hist.copy()
+        self.good = deque([self.seed_hist.copy()], maxlen=self.good.maxlen)
+
+
+class AdaptiveColorRanges:
+    """BallDetector の色範囲を照明の変化に合わせて少しずつ動かす.
+
+    毎フレーム detect() の結果を update() に渡す。最大のボールが十分に丸く塗りつぶされて
+    いれば（面積 / 外接円の面積 >= min_fill）その内側の画素を最大 max_samples 画素だけ
+    取り出してその色のモデルを更新し、update_every フレームごとに色範囲を求め直して
+    検出器に反映する。反映後に max_misses フレーム続けて見失ったら、反映前に戻す。
+    """
+
+    def __init__(self, detector, color_ranges, update_every=10, min_fill=0.6,
+                 inner=0.7, max_samples=1024, max_misses=15, confirm_frames=30,
+                 **model_args):
+        self.detector = detector
+        self.models = {color: AdaptiveColorModel(color_ranges[color], **model_args)
+                       for color in detector.colors}
+        self.applied = {color: color_ranges[color] for color in detector.colors}
+        self.update_every = update_every
+        self.min_fill = min_fill
+        self.inner = inner
+        self.max_samples = max_samples
+        self.max_misses = max_misses
+        self.confirm_frames = confirm_frames
+        self.frame_count = 0
+        self.misses = 0
+        self.hits_since_apply = 0
+        self.pending_confirm = False
+
+    # ボールの内側の画素を間引いて取り出す（1 フレームの手間を max_samples で抑える）
+    def _ball_pixels(self, frame, det):
+        r = det.radius * self.inner
+        h, w = frame.shape[:2]
+        x0, x1 = max(0, int(det.x - r)), min(w, int(det.x + r) + 1)
+        y0, y1 = max(0, int(det.y - r)), min(h, int(det.y + r) + 1)
+        if x1 <= x0 or y1 <= y0:
+            return np.empty((0, 3), dtype=np.uint8)
+        step = max(1, int(np.ceil(np.sqrt((x1 - x0) * (y1 - y0) / self.max_samples))))
+        patch = cv2.cvtColor(np.ascontiguousarray(frame[y0:y1:step, x0:x1:step]),
+                             cv2.COLOR_BGR2HSV)
+        ys, xs = np.mgrid[y0:y1:step, x0:x1:step]
+        inside = (xs - det.x) ** 2 + (ys - det.y) ** 2 <= r * r
+        return patch[inside]
+
+    def update(self, result):
+        self.frame_count += 1
+        best = result.best
+        if best is None:
+            self.misses += 1
+            if self.pending_confirm and self.misses >= self.max_misses:
+                self.rollback()
+            return
+        self.misses = 0
+
+        if self.pending_confirm:
+            self.hits_since_apply += 1
+            if self.hits_since_apply >= self.confirm_frames:
+                # 反映した範囲で見つけ続けられたので確かな状態として残す
+                for model in self.models.values():
+                    model.snapshot()
+                self.pending_confirm = False
+
+        if best.area >= self.min_fill * np.pi * best.radius ** 2:
+            # sparse では best の中心は補正後の座標なので、フレーム上の位置に戻して取り出す
+            x, y = self.detector.frame_point(best.x, best.y)
+            self.models[best.color].update(self._ball_pixels(result.frame,
+                                                             best._replace(x=x, y=y)))
+
+        if self.frame_count % self.update_every == 0:
+            self._refresh()
+
+    # 色範囲を求め直し、変わったものだけ検出器に反映する（前回の反映を確かめるまでは待つ）
+    def _refresh(self):
+        if self.pending_confirm:
+            return
+        changed = False
+        for color, model in self.models.items():
+            if model.updates == 0:
+                continue
+            if model.drifted():
+                model.rollback()
+            color_range = model.color_range()
+            if not _same_range(self.applied[color], color_range):
+                self.applied[color] = color_range
+                changed = True
+        if changed:
+            self.detector.set_color_ranges(self.applied)
+            self.hits_since_apply = 0
+            self.pending_confirm = True
+
+    # 全色を最後に確かめた状態へ戻して反映する
+    def rollback(self):
+        for color, model in self.models.items():
+            model.rollback()
+            self.applied[color] = model.color_range()
+        self.detector.set_color_ranges(self.applied)
+        self.misses = 0
+        self.pending_confirm = False
+
+    # 元の色範囲に戻す
+    def reset(self):
+        for color, model in self.models.items():
+            model.reset()
+            self.applied[color] = model.seed_range
+        self.detector.set_color_ranges(self.applied)
+        self.pending_confirm = False
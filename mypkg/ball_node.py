@@ -0,0 +1,175 @@
+"""ボール検出結果を ROS 2 トピックに出すノード.
+
+ball/detections (std_msgs/Float64MultiArray): 1 フレームごとに 1 メッセージ
+    data[0] = 撮影時刻 [s]（エポック秒）、data[1] = フレーム番号
+    data[2:] = ボールごとに [色番号, x, y, 半径, 距離] を半径の大きい順に並べたもの
+    x, y, 半径は width x height の画素（decode_scale で縮小デコードしていても元の解像度）
+    色番号は colors パラメータ（params.COLOR_RANGES の順）の添字、距離が求まらなければ NaN
+ball/debug_image (sensor_msgs/Image): 縮小した検出画像（debug_rate で間引き、購読者がいるときのみ）
+"""
+import array
+import threading
+
+import cv2
+import numpy as np
+import rclpy
+from rclpy.node import Node
+from rclpy.qos import HistoryPolicy, QoSProfile, ReliabilityPolicy
+from sensor_msgs.msg import Image
+from std_msgs.msg import Float64MultiArray, MultiArrayDimension
+
+from mypkg import params
+from mypkg.calibration import load_camera_params
+from mypkg.detector import BallDetector
+from mypkg.distance_model import load_distance_lut
+from mypkg.frontend import build_overlay
+from mypkg.preview import draw_overlay
+from mypkg.sources import open_source
+
+FIELDS = ('color', 'x', 'y', 'radius', 'distance')
+HEADER_SIZE = 2
+
+# 制御側には常に最新の検出だけを渡す（古い結果を再送して遅らせない）
+DETECTION_QOS = QoSProfile(depth=1, history=HistoryPolicy.KEEP_LAST,
+                           reliability=ReliabilityPolicy.BEST_EFFORT)
+
+
+class BallDetectionNode(Node):
+    """カメラ（または録画）からボールを検出し、結果を配信する."""
+
+    def __init__(self, **kwargs):
+        super().__init__('ball_detection', **kwargs)
+        self.declare_parameter('source', '/dev/video4')
+        self.declare_parameter('width', 1280)
+        self.declare_parameter('height', 720)
+        self.declare_parameter('fps', 15)
+        self.declare_parameter('method', 'contour')
+        self.declare_parameter('undistort', 'sparse')
+        # ROI 追跡中は最大のボールの周辺だけを探すので、balls には 1 個しか載らない
+        self.declare_parameter('roi_tracking', False)
+        self.declare_parameter('workers', 0)
+        # カメラの MJPEG を 1/decode_scale に縮小デコードする（1, 2, 4, 8。配信する座標は元の解像度）
+        self.declare_parameter('decode_scale', 1)
+        self.declare_parameter('debug_rate', 2.0)
+        self.declare_parameter('debug_scale', 0.5)
+        self.declare_parameter('frame_id', 'camera')
+        # distance_calib で作った距離モデル（トラッカー名かパス。空なら焦点距離から求める）
+        self.declare_parameter('distance_model', 'ball_node')
+
+        param = self.get_parameter
+        undistort = param('undistort').value or None
+        camera_matrix, dist_coeffs = load_camera_params(
+            param('source').value, (param('width').value, param('height').value))
+        self.detector = BallDetector(
+            params.COLOR_RANGES, method=param('method').value,
+            camera_matrix=camera_matrix, dist_coeffs=dist_coeffs,
+            undistort=undistort, ball_diameter=params.BALL_DIAMETER,
+            roi_tracking=param('roi_tracking').value, workers=param('workers').value,
+            frame_size=(param('width').value, param('height').value),
+            # rclpy のスレッドがすでにあるので fork せず forkserver からワーカーを起動する
+            start_method='forkserver', decode_scale=param('decode_scale').value)
+        if param('distance_model').value:
+            self.detector.distance_lut = load_distance_lut(
+                param('distance_model').value, self.detector, param('source').value,
+                (param('width').value, param('height').value))
+        self.declare_parameter('colors', self.detector.colors)
+
+        self.capture = open_source(param('source').value, param('width').value,
+                                   param('height').value, param('fps').value,
+                                   realtime=True, decode_scale=param('decode_scale').value)
+
+        self.decode_scale = param('decode_scale').value
+        self.frame_id = param('frame_id').value
+        debug_rate = param('debug_rate').value
+        self.debug_period = 1.0 / debug_rate if debug_rate > 0 else None
+        self.debug_scale = param('debug_scale').value
+        self.next_debug = 0.0
+
+        self.pub = self.create_publisher(Float64MultiArray, 'ball/detections', DETECTION_QOS)
+        self.debug_pub = self.create_publisher(Image, 'ball/debug_image', 1)
+
+        # メッセージは使い回し、毎フレーム data とサイズだけを書き換える
+        self.msg = Float64MultiArray()
+        self.msg.layout.dim = [
+            MultiArrayDimension(label='balls', size=0, stride=0),
+            MultiArrayDimension(label=','.join(FIELDS), size=len(FIELDS), stride=len(FIELDS)),
+        ]
+        self.msg.layout.data_offset = HEADER_SIZE
+
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    # 検出はカメラの速さで回し、executor のスレッドは塞がない
+    def _run(self):
+        while self.running and rclpy.ok():
+            captured = self.capture.read()
+            if captured is None:
+                self.get_logger().info('フレームがなくなったので検出を止めます')
+                break
+            result = self.detector.detect(captured.frame)
+            self.publish_detections(result, captured.stamp, captured.seq)
+            if self.debug_period is not None and captured.stamp >= self.next_debug:
+                self.next_debug = captured.stamp + self.debug_period
+                self.publish_debug_image(result, captured.stamp)
+
+    def publish_detections(self, result, stamp, seq):
+        balls = result.balls
+        n = len(balls)
+        # 構造化配列の列をそのまま詰める（ボールごとの Python オブジェクトは作らない）
+        data = np.empty(HEADER_SIZE + n * len(FIELDS), dtype=np.float64)
+        data[0] = stamp
+        data[1] = seq
+        rows = data[HEADER_SIZE:].reshape(n, len(FIELDS))
+        for i, name in enumerate(FIELDS):
+            rows[:, i] = balls[name]
+        if self.decode_scale != 1:
+            # x, y, 半径は width x height の座標に戻す
+            rows[:, 1:4] *= self.decode_scale
+        self.msg.layout.dim[0].size = n
+        self.msg.layout.dim[0].stride = n * len(FIELDS)
+        # float64[] は array.array で渡すと要素ごとの検査と変換を省ける
+        self.msg.data = array.array('d', data.tobytes())
+        self.pub.publish(self.msg)
+
+    # 縮小して描画した画像（購読者がいなければ縮小も描画もしない）
+    def publish_debug_image(self, result, stamp):
+        if self.debug_pub.get_subscription_count() == 0:
+            return
+        small = cv2.resize(result.frame, None, fx=self.debug_scale, fy=self.debug_scale,
+                           interpolation=cv2.INTER_NEAREST)
+        draw_overlay(small, build_overlay(result, to_frame=self.detector.frame_point),
+                     self.debug_scale)
+        msg = Image()
+        msg.header.stamp.sec = int(stamp)
+        msg.header.stamp.nanosec = int((stamp - int(stamp)) * 1e9)
+        msg.header.frame_id = self.frame_id
+        msg.height, msg.width = small.shape[:2]
+        msg.encoding = 'bgr8'
+        msg.step = small.shape[1] * 3
+        msg.data = small.tobytes()
+        self.debug_pub.publish(msg)
+
+    def destroy_node(self):
+        self.running = False
+        self.thread.join(timeout=1.0)
+        self.capture.release()
+        self.detector.close()
+        super().destroy_node()
+
+
+def main(args=None):
+    rclpy.init(args=args)
+    node = BallDetectionNode()
+    try:
+        rclpy.spin(node)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        node.destroy_node()
+        if rclpy.ok():
+            rclpy.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+import numpy as np
+
+# 1 フレーム分のボール（color は BallDetector.colors の添字、distance は cm。求まらなければ NaN）
+#   score は contour では候補の点数、それ以外では面積
+BALL_DTYPE = np.dtype([
+    ('color', 'i1'), ('x', 'f4'), ('y', 'f4'), ('radius', 'f4'),
+    ('distance', 'f4'), ('score', 'f4'), ('area', 'f4'),
+])
+
+
+class BallBuffer:
+    """最大 max_balls 個のボールを入れる使い回しの構造化配列.
+
+    fill() は毎回同じ配列に書き込んでその先頭部分のビューを返すので、
+    次のフレームまで残したいときは copy() する。
+    """
+
+    def __init__(self, max_balls=8):
+        self.max_balls = max_balls
+        self.array = np.zeros(max_balls, dtype=BALL_DTYPE)
+
+    # circles は (x, y, 半径, 色, 面積, 点数) の列、color_ids は 色 → 色番号
+    # （多ければ先頭 max_balls 個だけ使う）
+    def fill(self, circles, color_ids):
+        n = min(len(circles), self.max_balls)
+        balls = self.array[:n]
+        for i in range(n):
+            x, y, radius, color, area, score = circles[i]
+            balls[i] = (color_ids[color], x, y, radius, np.nan, score, area)
+        return balls
+
+
+# 半径が最大のボール（なければ None）
+def largest(balls):
+    if len(balls) == 0:
+        return None
+    return balls[int(np.argmax(balls['radius']))]
+
+
+# 距離が最小のボール（距離が求まっていなければ半径が最大のもの）
+def nearest(balls):
+    if len(balls) == 0:
+        return None
+    distance = balls['distance']
+    if np.all(np.isnan(distance)):
+        return largest(balls)
+    return balls[int(np.nanargmin(distance))]
+
+
+# 色ごとに半径が最大のボール（色番号の順、その色がなければ含まない）
+def per_color(balls):
+    if len(balls) == 0:
+        return balls
+    order = np.argsort(-balls['radius'], kind='stable')
+    _, first = np.unique(balls['color'][order], return_index=True)
+    return balls[order[first]]
+
+
+# 指定した色番号のボールだけ
+def of_color(balls, color_id):
+    return balls[balls['color'] == color_id]
@@ -0,0 +1,142 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+import numpy as np
+
+from mypkg import params
+from mypkg.balls import BALL_DTYPE
+from mypkg.detector import BallDetector
+from mypkg.detector_bench import VARIANTS
+from mypkg.frames import count_frames, iter_frames
+
+# 出力ファイルの列（1 行が 1 個の検出）
+COLUMNS = ('frame', 'color', 'x', 'y', 'radius', 'area', 'distance', 'score')
+
+
+# 入力ごとに chunk_frames 枚ずつの区間に分ける（0 なら分けない）
+def make_shards(sources, chunk_frames):
+    shards = []
+    for source in sources:
+        total = count_frames(source)
+        if chunk_frames <= 0 or total <= 0:
+            shards.append((source, 0, None))
+            continue
+        for start in range(0, total, chunk_frames):
+            # 最後の区間は末尾まで読む（動画のフレーム数は目安なので）
+            stop = start + chunk_frames if start + chunk_frames < total else None
+            shards.append((source, start, stop))
+    return shards
+
+
+# 区間ごとの出力ファイル（別のディレクトリにある同じ名前の入力が重ならないよう、
+# 絶対パスのハッシュを名前に入れる）
+def shard_path(out_dir, source, start):
+    path = os.path.abspath(os.path.normpath(source))
+    name = os.path.basename(path)
+    digest = hashlib.sha1(path.encode()).hexdigest()[:8]
+    return os.path.join(out_dir, f'{name}.{digest}.{start:08d}.npz')
+
+
+# ワーカー: 1 区間を読み込みから検出まで独立に処理し、列ごとの配列で書き出す
+def run_shard(shard, options, out_dir):
+    # 並列度はプロセス数で決めるので、OpenCV 内部のスレッドは使わない
+    cv2.setNumThreads(1)
+    source, start, stop = shard
+    detector = BallDetector(params.COLOR_RANGES, camera_matrix=params.CAMERA_MATRIX,
+                            ball_diameter=params.BALL_DIAMETER, **options)
+    columns = {name: [] for name in COLUMNS}
+    frames = 0
+    begin = time.perf_counter()
+    for index, frame in iter_frames(source, start, stop):
+        frames += 1
+        balls = detector.detect(frame).balls
+        if len(balls) == 0:
+            continue
+        # balls は次の detect() で上書きされるのでここで列ごとにコピーしておく
+        columns['frame'].append(np.full(len(balls), index, dtype=np.int64))
+        for name in COLUMNS[1:]:
+            columns[name].append(balls[name].copy())
+    elapsed = time.perf_counter() - begin
+
+    dtypes = {name: BALL_DTYPE[name] for name in COLUMNS[1:]}
+    dtypes['frame'] = np.int64
+    table = {name: np.concatenate(parts) if parts else np.empty(0, dtype=dtypes[name])
+             for name, parts in columns.items()}
+    path = shard_path(out_dir, source, start)
+    np.savez(path, colors=np.array(detector.colors), source=np.array(source), **table)
+    return {'source': source, 'start': start, 'frames': frames,
+            'detections': len(table['frame']), 'seconds': elapsed, 'output': path}
+
+
+# 出力ディレクトリの区間ファイルを入力ごとに 1 つの列の辞書にまとめて読む
+def load_detections(out_dir):
+    merged = {}
+    for path in sorted(glob.glob(os.path.join(out_dir, '*.npz'))):
+        with np.load(path) as data:
+            source = str(data['source'])
+            table = merged.setdefault(source, {name: [] for name in COLUMNS})
+            for name in COLUMNS:
+                table[name].append(data[name])
+    return {source: {name: np.concatenate(parts) for name, parts in table.items()}
+            for source, table in merged.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='録画した動画・画像ディレクトリをプロセスプールで並列に検出し、列形式で保存する')
+    parser.add_argument('sources', nargs='+', help='動画ファイルまたは画像ディレクトリ')
+    parser.add_argument('--output', '-o', default='batch_out', help='出力ディレクトリ')
+    parser.add_argument('--variant', choices=sorted(VARIANTS), default='contour')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--chunk-frames', type=int, default=1800,
+                        help='1 ワーカーに渡すフレーム数（0 なら入力ごとに分けない）')
+    args = parser.parse_args()
+
+    missing = [s for s in args.sources if not os.path.exists(s)]
+    if missing:
+        print(f'入力が見つかりません: {", ".join(missing)}', file=sys.stderr)
+        return 1
+    os.makedirs(args.output, exist_ok=True)
+
+    shards = make_shards(args.sources, args.chunk_frames)
+    options = VARIANTS[args.variant]
+    print(f'{len(args.sources)} 個の入力を {len(shards)} 区間に分け、{args.workers} プロセスで処理します')
+
+    results = []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = [pool.submit(run_shard, shard, options, args.output) for shard in shards]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            print(f'  {result["source"]} [{result["start"]}〜]: {result["frames"]} フレーム, '
+                  f'{result["frames"] / max(result["seconds"], 1e-6):.1f} fps')
+    elapsed = time.perf_counter() - start
+
+    frames = sum(r['frames'] for r in results)
+    summary = {
+        'variant': args.variant,
+        'options': options,
+        'workers': args.workers,
+        'frames': frames,
+        'detections': sum(r['detections'] for r in results),
+        'seconds': elapsed,
+        'throughput_fps': frames / elapsed if elapsed > 0 else 0.0,
+        'shards': sorted(results, key=lambda r: (r['source'], r['start'])),
+    }
+    with open(os.path.join(args.output, 'summary.json'), 'w') as f:
+        f.write(json.dumps(summary, indent=2, ensure_ascii=False) + '\n')
+
+    print(f'合計 {frames} フレーム、{elapsed:.1f} 秒、{summary["throughput_fps"]:.1f} fps')
+    return 0
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+import cv2
+import numpy as np
+
+# 候補の点数 = 面積^area * 充填率^fill * 縦横比^aspect
+#   縦横比は、絞り込みでは外接矩形の短辺 / 長辺、円を当てはめる候補では 2 次モーメントの
+#   短軸 / 長軸（斜めに傾いた細長い成分も外接矩形ではほぼ正方形になるため）
+SCORE_WEIGHTS = {'area': 1.0, 'fill': 1.0, 'aspect': 1.0}
+
+# 1 色あたり、円を当てはめる前に形を調べる候補の数（max_candidates の何倍まで見るか）
+EXAMINE_FACTOR = 2
+
+
+def blob_stats(mask, min_area=0):
+    """マスクの連結成分ごとの特徴量を NumPy でまとめて求める.
+
+    戻り値は (ラベル画像, 列の辞書)。列は id, area, left, top, width, height, cx, cy,
+    fill（外接矩形に内接する楕円に対する面積比。真円なら約 1）, aspect（短辺 / 長辺）。
+    どちらも外接矩形だけから求める安い目安で、傾いた楕円は見分けられない（circles_from_mask）。
+    """
+    n, labels, stats, centroids = cv2.connectedComponentsWithStats(mask, connectivity=8)
+    area = stats[1:, cv2.CC_STAT_AREA].astype(np.float64)
+    keep = area >= min_area
+    stats = stats[1:][keep]
+    width = stats[:, cv2.CC_STAT_WIDTH].astype(np.float64)
+    height = stats[:, cv2.CC_STAT_HEIGHT].astype(np.float64)
+    area = area[keep]
+    blobs = {
+        'id': np.arange(1, n)[keep],
+        'area': area,
+        'left': stats[:, cv2.CC_STAT_LEFT],
+        'top': stats[:, cv2.CC_STAT_TOP],
+        'width': width,
+        'height': height,
+        'cx': centroids[1:, 0][keep],
+        'cy': centroids[1:, 1][keep],
+        'fill': area / (np.pi / 4 * width * height),
+        'aspect': np.minimum(width, height) / np.maximum(width, height),
+    }
+    return labels, blobs
+
+
+# 候補の点数（min_fill, min_aspect に満たないものは 0 点）
+def score_blobs(blobs, weights=None, min_fill=0.3, min_aspect=0.3):
+    w = dict(SCORE_WEIGHTS, **(weights or {}))
+    fill = np.minimum(blobs['fill'], 1.0)
+    score = blobs['area'] ** w['area'] * fill ** w['fill'] * blobs['aspect'] ** w['aspect']
+    score[(blobs['fill'] < min_fill) | (blobs['aspect'] < min_aspect)] = 0.0
+    return score
+
+
+# 2 値画像の 2 次の中心モーメントから求めた短軸 / 長軸（真円なら 1、線なら 0）
+def axis_ratio(moments):
+    mu20, mu02, mu11 = moments['mu20'], moments['mu02'], moments['mu11']
+    root = np.sqrt((mu20 - mu02) ** 2 + 4 * mu11 ** 2)
+    major = mu20 + mu02 + root
+    if major <= 0:
+        return 0.0
+    return float(np.sqrt(max(mu20 + mu02 - root, 0.0) / major))
+
+
+def circles_from_mask(mask, color, offset=(0, 0), min_area=300, max_candidates=3,
+                      weights=None, min_fill=0.3, min_aspect=0.3):
+    """連結成分で候補を絞り、点数の高い max_candidates 個だけに最小外接円を当てはめる.
+
+    外接矩形の特徴量で点数の高い順に並べ、上位の候補だけ 2 次モーメントの短軸 / 長軸を
+    求めて縦横比を置き換え、min_aspect に満たないもの（斜めの細長い成分）は捨てる。
+    戻り値は (x, y, 半径, 色, 面積, 点数) のリスト（座標は offset を足したもの）。
+    """
+    labels, blobs = blob_stats(mask, min_area)
+    if len(blobs['id']) == 0:
+        return []
+    score = score_blobs(blobs, weights, min_fill, min_aspect)
+    aspect_weight = dict(SCORE_WEIGHTS, **(weights or {}))['aspect']
+
+    circles = []
+    for i in np.argsort(-score)[:max_candidates * EXAMINE_FACTOR]:
+        if score[i] <= 0 or len(circles) >= max_candidates:
+            break
+        x0, y0 = int(blobs['left'][i]), int(blobs['top'][i])
+        x1, y1 = x0 + int(blobs['width'][i]), y0 + int(blobs['height'][i])
+        # 外接矩形の中だけで、その成分の形を調べて輪郭を取り直す
+        patch = cv2.compare(labels[y0:y1, x0:x1], int(blobs['id'][i]), cv2.CMP_EQ)
+        ratio = axis_ratio(cv2.moments(patch, binaryImage=True))
+        if ratio < min_aspect:
+            continue
+        contours, _ = cv2.findContours(patch, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE,
+                                       offset=(x0 + offset[0], y0 + offset[1]))
+        if not contours:
+            continue
+        (x, y), radius = cv2.minEnclosingCircle(max(contours, key=len))
+        points = score[i] * (ratio / blobs['aspect'][i]) ** aspect_weight
+        circles.append((x, y, radius, color, float(blobs['area'][i]), float(points)))
+    return circles
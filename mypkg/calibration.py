@@ -0,0 +1,304 @@
+import argparse
+import json
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from mypkg import params
+from mypkg.frames import list_images
+
+CALIB_VERSION = 1
+CALIB_DIR = os.path.join(os.path.expanduser('~'), '.config', 'mypkg')
+
+# calibration.py と同じチェッカーボード（内側の交点の数、1 マスの大きさ [mm]）
+CHECKERBOARD = (7, 7)
+SQUARE_SIZE = 25
+
+SUBPIX_CRITERIA = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.001)
+FIND_FLAGS = cv2.CALIB_CB_ADAPTIVE_THRESH + cv2.CALIB_CB_NORMALIZE_IMAGE
+# ライブ表示用（盤がないフレームをすぐに諦める）
+PREVIEW_FLAGS = FIND_FLAGS + cv2.CALIB_CB_FAST_CHECK
+
+
+# カメラごとのキャリブレーションファイル（camera はトラッカーの DEVICE と同じ値）
+#   '/dev/video4' → camera_calibration_video4.json、0 → camera_calibration_video0.json
+def calib_path(camera):
+    name = str(camera)
+    if name.isdigit():
+        name = f'video{name}'
+    name = re.sub(r'[^0-9A-Za-z_.-]+', '_', name.removeprefix('/dev/')).strip('_')
+    return os.path.join(CALIB_DIR, f'camera_calibration_{name}.json')
+
+
+def board_points(board=CHECKERBOARD, square_size=SQUARE_SIZE):
+    objp = np.zeros((board[0] * board[1], 3), np.float32)
+    objp[:, :2] = np.mgrid[0:board[0], 0:board[1]].T.reshape(-1, 2)
+    return objp * square_size
+
+
+# ワーカー: 1 枚の画像からチェッカーボードの交点を探す（見つからなければ corners は None）
+def find_corners(path, board=CHECKERBOARD):
+    cv2.setNumThreads(1)
+    gray = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+    if gray is None:
+        return path, None, None
+    size = (gray.shape[1], gray.shape[0])
+    found, corners = cv2.findChessboardCorners(gray, board, FIND_FLAGS)
+    if not found:
+        return path, None, size
+    corners = cv2.cornerSubPix(gray, corners, (11, 11), (-1, -1), SUBPIX_CRITERIA)
+    return path, corners, size
+
+
+# 縮小したグレースケール画像で交点を探し、元の解像度の座標で返す
+def find_corners_scaled(gray, board=CHECKERBOARD, scale=0.5, flags=PREVIEW_FLAGS):
+    small = gray
+    if scale != 1.0:
+        small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    found, corners = cv2.findChessboardCorners(small, board, flags)
+    if not found:
+        return False, None
+    return True, (corners / scale).astype(np.float32)
+
+
+class AsyncChessboardFinder:
+    """ライブ表示のフレームで、縮小画像の交点検出を別スレッドで行う.
+
+    表示側は submit() で最新フレームを渡し、latest() で最後に出た結果を受け取るだけなので、
+    盤が半分だけ写っていて検出に時間がかかってもカメラのフレームレートで表示できる。
+    検出中に届いたフレームは最新の 1 枚だけを残す。
+    """
+
+    def __init__(self, board=CHECKERBOARD, scale=0.5):
+        self.board = board
+        self.scale = scale
+        self.cond = threading.Condition()
+        self.pending = None
+        self.result = (False, None)
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def submit(self, frame):
+        with self.cond:
+            self.pending = frame
+            self.cond.notify_all()
+
+    # 最後に検出した結果 (found, corners)（corners は元の解像度の座標）
+    def latest(self):
+        with self.cond:
+            return self.result
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while self.running and self.pending is None:
+                    self.cond.wait()
+                if not self.running:
+                    return
+                frame = self.pending
+                self.pending = None
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            result = find_corners_scaled(gray, self.board, self.scale)
+            with self.cond:
+                self.result = result
+
+    def close(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+        self.thread.join(timeout=1.0)
+
+
+# 1 枚の姿勢と写り方の特徴（中心、大きさ、上下・左右の傾き）
+def view_features(corners, board, size):
+    pts = corners.reshape(board[1], board[0], 2)
+    tl, tr, bl, br = pts[0, 0], pts[0, -1], pts[-1, 0], pts[-1, -1]
+    w, h = size
+    center = pts.reshape(-1, 2).mean(axis=0) / (w, h)
+    span = np.ptp(pts.reshape(-1, 2), axis=0)
+    scale = np.sqrt(span[0] * span[1] / (w * h))
+    # 向かい合う辺の長さの比（傾いていると手前の辺が長くなる）
+    tilt_x = np.log(np.linalg.norm(tr - br) / np.linalg.norm(tl - bl))
+    tilt_y = np.log(np.linalg.norm(bl - br) / np.linalg.norm(tl - tr))
+    return np.array([center[0], center[1], scale, tilt_x, tilt_y])
+
+
+def select_views(features, count):
+    """姿勢と写る位置がなるべくばらけるように count 枚を選ぶ（最遠点サンプリング）.
+
+    似た画像ばかりだと calibrateCamera の反復が増えるうえ精度も上がらないので、
+    特徴量を標準化し、選んだ画像から一番遠いものを順に加えていく。
+    """
+    n = len(features)
+    if n <= count:
+        return list(range(n))
+    f = np.asarray(features)
+    f = (f - f.mean(axis=0)) / np.maximum(f.std(axis=0), 1e-9)
+    # 最初は平均に一番近い（典型的な）画像
+    chosen = [int(np.argmin(np.linalg.norm(f, axis=1)))]
+    dist = np.linalg.norm(f - f[chosen[0]], axis=1)
+    while len(chosen) < count:
+        i = int(np.argmax(dist))
+        chosen.append(i)
+        dist = np.minimum(dist, np.linalg.norm(f - f[i], axis=1))
+    return sorted(chosen)
+
+
+def calibrate(views, image_size, board=CHECKERBOARD, square_size=SQUARE_SIZE):
+    """交点 [(path, corners)] からカメラ行列と歪み係数を求める（image_size は (幅, 高さ)）.
+
+    戻り値は save_calibration() でそのまま保存できる辞書（画像ごとの再投影誤差を含む）。
+    """
+    objp = board_points(board, square_size)
+    image_points = [corners for _, corners in views]
+    object_points = [objp] * len(views)
+    rms, camera_matrix, dist_coeffs, _, _, _, _, per_view = cv2.calibrateCameraExtended(
+        object_points, image_points, tuple(image_size), None, None)
+    return {
+        'rms': float(rms),
+        'camera_matrix': camera_matrix,
+        'dist_coeffs': dist_coeffs.ravel(),
+        'per_view_errors': [{'image': path, 'error': float(e)}
+                            for (path, _), e in zip(views, per_view.ravel())],
+    }
+
+
+def save_calibration(path, calib, image_size, board=CHECKERBOARD, square_size=SQUARE_SIZE,
+                     extra=None):
+    data = {
+        'version': CALIB_VERSION,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'image_size': list(image_size),
+        'board': {'cols': board[0], 'rows': board[1], 'square_size': square_size},
+        'rms': calib['rms'],
+        'camera_matrix': np.asarray(calib['camera_matrix']).tolist(),
+        'dist_coeffs': np.asarray(calib['dist_coeffs']).ravel().tolist(),
+        'per_view_errors': calib['per_view_errors'],
+    }
+    data.update(extra or {})
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(json.dumps(data, indent=2, ensure_ascii=False) + '\n')
+    os.replace(tmp_path, path)
+
+
+def load_calibration(path):
+    with open(path) as f:
+        data = json.load(f)
+    if data.get('version') != CALIB_VERSION:
+        raise ValueError(f'{path} の版 {data.get("version")} には対応していません')
+    data['camera_matrix'] = np.array(data['camera_matrix'], dtype=np.float64)
+    data['dist_coeffs'] = np.array(data['dist_coeffs'], dtype=np.float64)
+    return data
+
+
+# calib_size で較正したカメラ行列を image_size (幅, 高さ) の画像用にする
+#   縦横比が違う（センサーの切り出し方が違う）ときは合わせられないので None
+def scale_to_image_size(camera_matrix, calib_size, image_size):
+    sx = image_size[0] / calib_size[0]
+    sy = image_size[1] / calib_size[1]
+    if abs(sx - sy) > 0.01 * max(sx, sy):
+        return None
+    scaled = np.array(camera_matrix, dtype=np.float64)
+    scaled[0] *= sx
+    scaled[1] *= sy
+    return scaled
+
+
+# トラッカー用: camera のキャリブレーションファイルがあればその値、なければ params の値
+#   path を渡すと camera の代わりにそのファイルを使う
+#   image_size (幅, 高さ) を渡すと較正した解像度と比べ、縦横比が同じならカメラ行列を合わせる
+def load_camera_params(camera=None, image_size=None, path=None):
+    if path is None:
+        path = calib_path(camera)
+    if not os.path.exists(path):
+        print(f'{path} がないので params.py のカメラパラメータを使います')
+        camera_matrix, dist_coeffs = params.CAMERA_MATRIX, params.DIST_COEFFS
+        calib_size = params.CAMERA_IMAGE_SIZE
+    else:
+        data = load_calibration(path)
+        errors = [v['error'] for v in data['per_view_errors']]
+        worst = max(errors) if errors else 0.0
+        print(f'カメラパラメータ {path} を読み込みました（{data["created"]}、'
+              f'{data["image_size"][0]}x{data["image_size"][1]}、再投影誤差 {data["rms"]:.3f} px、'
+              f'最大 {worst:.3f} px / {len(errors)} 枚）')
+        camera_matrix, dist_coeffs = data['camera_matrix'], data['dist_coeffs']
+        calib_size = data['image_size']
+
+    if image_size is None or tuple(calib_size) == tuple(image_size):
+        return camera_matrix, dist_coeffs
+    scaled = scale_to_image_size(camera_matrix, calib_size, image_size)
+    if scaled is None:
+        print(f'警告: カメラパラメータは {calib_size[0]}x{calib_size[1]} で較正したもので、'
+              f'{image_size[0]}x{image_size[1]} とは縦横比が違います（この解像度で較正し直してください）')
+        return camera_matrix, dist_coeffs
+    print(f'カメラ行列を {calib_size[0]}x{calib_size[1]} から '
+          f'{image_size[0]}x{image_size[1]} に合わせました')
+    return scaled, dist_coeffs
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='チェッカーボードの画像ディレクトリからカメラを較正し、ファイルに保存する')
+    parser.add_argument('images', help='チェッカーボードを撮った画像のディレクトリ')
+    parser.add_argument('--board', type=int, nargs=2, default=CHECKERBOARD,
+                        metavar=('COLS', 'ROWS'), help='内側の交点の数')
+    parser.add_argument('--square-size', type=float, default=SQUARE_SIZE, help='[mm]')
+    parser.add_argument('--max-views', type=int, default=25,
+                        help='較正に使う画像の最大数（姿勢がばらけるように選ぶ）')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--camera', required=True,
+                        help='撮影したカメラ（トラッカーの DEVICE と同じ値。例: /dev/video4）')
+    parser.add_argument('--output', '-o', default=None,
+                        help='保存先（省略時は ~/.config/mypkg/camera_calibration_<カメラ>.json）')
+    args = parser.parse_args()
+    board = tuple(args.board)
+    output = args.output or calib_path(args.camera)
+
+    paths = list_images(args.images)
+    if not paths:
+        print(f'{args.images} に画像がありません', file=sys.stderr)
+        return 1
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        results = list(pool.map(find_corners, paths, [board] * len(paths),
+                                chunksize=max(1, len(paths) // (4 * (args.workers or 1)))))
+    found = [(path, corners, size) for path, corners, size in results if corners is not None]
+    print(f'交点検出: {len(found)}/{len(paths)} 枚（{time.perf_counter() - start:.1f} 秒）')
+    if len(found) < 5:
+        print('較正には交点の見つかった画像が 5 枚以上必要です', file=sys.stderr)
+        return 1
+    sizes = {size for _, _, size in found}
+    if len(sizes) > 1:
+        print(f'画像サイズがそろっていません: {sorted(sizes)}', file=sys.stderr)
+        return 1
+
+    image_size = sizes.pop()
+    features = [view_features(corners, board, image_size) for _, corners, _ in found]
+    views = [found[i][:2] for i in select_views(features, args.max_views)]
+
+    start = time.perf_counter()
+    calib = calibrate(views, image_size, board, args.square_size)
+    print(f'較正: {len(views)} 枚、再投影誤差 {calib["rms"]:.3f} px'
+          f'（{time.perf_counter() - start:.1f} 秒）')
+    for view in sorted(calib['per_view_errors'], key=lambda v: -v['error'])[:5]:
+        print(f'  {view["error"]:.3f} px  {view["image"]}')
+
+    save_calibration(output, calib, image_size, board, args.square_size,
+                     {'camera': args.camera, 'images_found': len(found),
+                      'images_total': len(paths)})
+    print(f'{output} に保存しました')
+    return 0
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+import argparse
+import json
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from mypkg.capture import BACKENDS, DEFAULT_PROFILE, CaptureProfile, open_capture
+from mypkg.sources import RawReplaySource
+
+
+# 撮影時刻の列から、実際の fps とフレーム間隔のばらつき [ms] を求める
+def interval_stats(stamps, nominal_fps=None):
+    stamps = np.asarray(stamps, dtype=np.float64)
+    intervals = np.diff(stamps) * 1000.0
+    if len(intervals) == 0:
+        return {'frames': len(stamps)}
+    stats = {
+        'frames': len(stamps),
+        'fps': float(len(intervals) / (stamps[-1] - stamps[0])) if stamps[-1] > stamps[0] else 0.0,
+        'interval_mean_ms': float(intervals.mean()),
+        'jitter_std_ms': float(intervals.std()),
+        'interval_p95_ms': float(np.percentile(intervals, 95)),
+        'interval_max_ms': float(intervals.max()),
+    }
+    if nominal_fps:
+        # 予定の 1.5 倍以上空いた間隔はフレームを落としたとみなす
+        stats['late_intervals'] = int(np.count_nonzero(intervals > 1500.0 / nominal_fps))
+    return stats
+
+
+def probe_camera(cap, frames=300, warmup=15):
+    """カメラから frames 枚を読み、返ってきた時刻と read() で待った時間を測る.
+
+    read() がほとんど待たずに返る回数が多いときは、ドライバのキューに古いフレームが
+    溜まっている（表示や検出がその分だけ遅れる）。
+    """
+    stamps = np.empty(frames)
+    waits = np.empty(frames)
+    frame = None
+    for _ in range(warmup):
+        ret, frame = cap.read(frame)
+        if not ret:
+            raise IOError('フレームの取得に失敗しました')
+    for i in range(frames):
+        begin = time.perf_counter()
+        ret, frame = cap.read(frame)
+        stamps[i] = time.perf_counter()
+        waits[i] = stamps[i] - begin
+        if not ret:
+            stamps, waits = stamps[:i], waits[:i]
+            break
+    stats = interval_stats(stamps, cap.get(cv2.CAP_PROP_FPS))
+    if len(stamps) > 1:
+        nominal = stats['interval_mean_ms'] / 1000.0
+        stats['read_wait_mean_ms'] = float(waits.mean() * 1000.0)
+        # 間隔の 1/4 も待たずに返ったものはキューに溜まっていたフレーム
+        stats['queued_reads'] = int(np.count_nonzero(waits < nominal / 4))
+    return stats
+
+
+# 録画の撮影時刻で測る（.raw は記録した時刻、動画はコンテナの時刻）
+def probe_recording(path, frames=None):
+    if path.endswith('.raw'):
+        source = RawReplaySource(path)
+        stamps = np.array(source.stamps[:frames])
+        source.release()
+        return interval_stats(stamps)
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise IOError(f'{path} を開けませんでした')
+    stamps = []
+    try:
+        while frames is None or len(stamps) < frames:
+            if not cap.grab():
+                break
+            stamps.append(cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0)
+    finally:
+        cap.release()
+    return interval_stats(stamps, None)
+
+
+def print_stats(stats):
+    if 'fps' not in stats:
+        print(f'フレームが {stats["frames"]} 枚しかないので測れません')
+        return
+    print(f'  {stats["frames"]} フレーム、{stats["fps"]:.2f} fps')
+    print(f'  間隔: 平均 {stats["interval_mean_ms"]:.1f} ms、ばらつき {stats["jitter_std_ms"]:.2f} ms、'
+          f'95% {stats["interval_p95_ms"]:.1f} ms、最大 {stats["interval_max_ms"]:.1f} ms')
+    if 'late_intervals' in stats:
+        print(f'  予定の 1.5 倍以上空いた間隔: {stats["late_intervals"]}')
+    if 'queued_reads' in stats:
+        print(f'  read() の待ち: 平均 {stats["read_wait_mean_ms"]:.1f} ms、'
+              f'待たずに返った（キューに溜まっていた）回数 {stats["queued_reads"]}')
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='取り込み設定でカメラを開いて実際の設定を確かめ、fps とフレーム間隔のばらつきを測る')
+    parser.add_argument('source', help='カメラ（/dev/video4 や番号）、または .raw・動画の録画')
+    parser.add_argument('--width', type=int, default=DEFAULT_PROFILE.width)
+    parser.add_argument('--height', type=int, default=DEFAULT_PROFILE.height)
+    parser.add_argument('--fps', type=int, default=DEFAULT_PROFILE.fps)
+    parser.add_argument('--fourcc', default=DEFAULT_PROFILE.fourcc,
+                        help="'MJPG'、'YUYV' など（'' なら設定しない）")
+    parser.add_argument('--buffer-size', type=int, default=DEFAULT_PROFILE.buffer_size)
+    parser.add_argument('--backend', choices=sorted(BACKENDS), default=DEFAULT_PROFILE.backend)
+    parser.add_argument('--frames', type=int, default=300)
+    parser.add_argument('--warmup', type=int, default=15, help='測る前に捨てるフレーム数')
+    parser.add_argument('--json', help='結果を JSON ファイルにも書く')
+    args = parser.parse_args()
+
+    report = {'source': args.source}
+    try:
+        if args.source.isdigit() or args.source.startswith('/dev/video'):
+            device = int(args.source) if args.source.isdigit() else args.source
+            profile = CaptureProfile(args.width, args.height, args.fps, args.fourcc or None,
+                                     args.buffer_size, args.backend)
+            cap, applied, mismatches = open_capture(device, profile)
+            print('要求した設定 / 実際の設定:')
+            for key, wanted in profile._asdict().items():
+                print(f'  {key:<12} {str(wanted):>10} / {applied[key]}')
+            try:
+                stats = probe_camera(cap, args.frames, args.warmup)
+            finally:
+                cap.release()
+            report.update(requested=profile._asdict(), applied=applied,
+                          mismatches=[m[0] for m in mismatches])
+        else:
+            stats = probe_recording(args.source, args.frames)
+    except (IOError, ValueError) as e:
+        print(e, file=sys.stderr)
+        return 1
+
+    print('測定結果:')
+    print_stats(stats)
+    report['stats'] = stats
+    if args.json:
+        with open(args.json, 'w') as f:
+            f.write(json.dumps(report, indent=2, ensure_ascii=False) + '\n')
+    return 0
+
+
+if __name__ == '__main__':
+    main()
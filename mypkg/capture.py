@@ -0,0 +1,193 @@
+import threading
+import time
+from collections import namedtuple
+
+import cv2
+
+# 取り込んだフレームと撮影時刻、通し番号、読み飛ばしたフレーム数
+CapturedFrame = namedtuple('CapturedFrame', ['frame', 'stamp', 'seq', 'dropped'])
+
+# カメラの取り込み設定
+#   fourcc: 'MJPG' ならカメラ側で JPEG 圧縮する（1280x720 でも USB 帯域に収まる）
+#   buffer_size: ドライバのキューの深さ（小さいほど古いフレームが溜まらない）
+#   backend: 'v4l2' か 'any'（OpenCV に任せる）
+CaptureProfile = namedtuple('CaptureProfile',
+                            ['width', 'height', 'fps', 'fourcc', 'buffer_size', 'backend'])
+
+# /dev/video4 の 4K USB カメラで 1280x720 を 15fps で取るときの設定（params.CAMERA_MATRIX と同じ解像度）
+DEFAULT_PROFILE = CaptureProfile(1280, 720, 15, 'MJPG', 1, 'v4l2')
+
+BACKENDS = {'v4l2': cv2.CAP_V4L2, 'any': cv2.CAP_ANY}
+
+
+def decode_fourcc(value):
+    code = int(value)
+    return ''.join(chr((code >> (8 * i)) & 0xFF) for i in range(4))
+
+
+# ドライバが実際に受け付けた設定
+def applied_settings(cap):
+    return {
+        'width': int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+        'height': int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        'fps': cap.get(cv2.CAP_PROP_FPS),
+        'fourcc': decode_fourcc(cap.get(cv2.CAP_PROP_FOURCC)),
+        'buffer_size': int(cap.get(cv2.CAP_PROP_BUFFERSIZE)),
+        'backend': cap.getBackendName(),
+    }
+
+
+# 要求した設定と違う項目の一覧 [(項目, 要求, 実際)]（None の項目は比べない）
+def profile_mismatches(profile, applied):
+    mismatches = []
+    for key in ('width', 'height', 'fourcc', 'buffer_size'):
+        wanted = getattr(profile, key)
+        if wanted is not None and applied[key] != wanted:
+            mismatches.append((key, wanted, applied[key]))
+    if profile.fps is not None and abs(applied['fps'] - profile.fps) > 0.5:
+        mismatches.append(('fps', profile.fps, applied['fps']))
+    return mismatches
+
+
+def open_capture(device, profile=DEFAULT_PROFILE):
+    """取り込み設定どおりにカメラを開き、ドライバが受け付けた設定と食い違いを返す.
+
+    fourcc は解像度より先に設定する（V4L2 では形式ごとに選べる解像度・fps が違うため）。
+    戻り値は (cap, applied, mismatches)。食い違いは警告として表示する。
+    """
+    cap = cv2.VideoCapture(device, BACKENDS[profile.backend])
+    if not cap.isOpened():
+        raise IOError(f'カメラ {device} を開けませんでした')
+    if profile.fourcc is not None:
+        cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*profile.fourcc))
+    if profile.width is not None:
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, profile.width)
+    if profile.height is not None:
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, profile.height)
+    if profile.fps is not None:
+        cap.set(cv2.CAP_PROP_FPS, profile.fps)
+    if profile.buffer_size is not None:
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, profile.buffer_size)
+
+    applied = applied_settings(cap)
+    mismatches = profile_mismatches(profile, applied)
+    for key, wanted, actual in mismatches:
+        print(f'警告: カメラ {device} の {key} は {wanted} を要求しましたが {actual} になりました')
+    return cap, applied, mismatches
+
+
+class CaptureTimeout(TimeoutError):
+    """ThreadedCapture.read() の待ち時間切れ（ストリームはまだ終わっていない）."""
+
+
+class ThreadedCapture:
+    """専用スレッドでカメラから取り込み、最新フレームだけを渡す.
+
+    フレームは事前に確保したリングバッファに書き込まれる。
+    read() で受け取ったフレームは次に read() を呼ぶまで上書きされない。
+    USB の一時的な途切れで読み込みに失敗しても、retry_seconds 秒までは読み直す。
+    撮影時刻は grab() で取り込んだ直後に記録し、retrieve() のデコードの時間を含めない。
+    cap は grab() / retrieve(image) を持つもの（cv2.VideoCapture、MjpegCapture）。
+    """
+
+    def __init__(self, cap, buffer_size=3, retry_seconds=5.0):
+        if buffer_size < 3:
+            raise ValueError('buffer_size は 3 以上にしてください')
+        self.cap = cap
+        self.buffer_size = buffer_size
+        self.retry_seconds = retry_seconds
+        self.slots = [None] * buffer_size
+        self.stamps = [0.0] * buffer_size
+        self.seqs = [0] * buffer_size
+
+        self.cond = threading.Condition()
+        self.latest = -1        # 最新フレームのスロット
+        self.in_use = -1        # 利用側が持っているスロット
+        self.seq = 0            # 取り込んだフレーム数
+        self.last_read_seq = 0  # 利用側が最後に受け取った番号
+        self.dropped = 0        # 一度も読まれずに捨てたフレーム数
+        self.running = True
+        self.finished = False   # 取り込みスレッドが終わった
+        self.closed = False     # release() が呼ばれた
+
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _next_slot(self):
+        for i in range(1, self.buffer_size + 1):
+            slot = (self.latest + i) % self.buffer_size
+            if slot != self.latest and slot != self.in_use:
+                return slot
+        return 0
+
+    def _run(self):
+        last_ok = time.time()
+        while self.running:
+            with self.cond:
+                slot = self._next_slot()
+            # 取り込んだ時刻を記録してから、スロットを使い回してデコードする（初回のみ確保される）
+            ret = self.cap.grab()
+            stamp = time.time()
+            if ret:
+                ret, frame = self.cap.retrieve(self.slots[slot])
+            if not ret:
+                if not self.cap.isOpened() or stamp - last_ok > self.retry_seconds:
+                    break
+                time.sleep(0.01)
+                continue
+            last_ok = stamp
+            with self.cond:
+                self.slots[slot] = frame
+                self.stamps[slot] = stamp
+                self.seq += 1
+                self.seqs[slot] = self.seq
+                self.latest = slot
+                self.cond.notify_all()
+        with self.cond:
+            self.running = False
+            self.finished = True
+            self.cond.notify_all()
+            closed = self.closed
+        # release() のあとに終わったときは、こちらでカメラを閉じる
+        if closed:
+            self.cap.release()
+
+    # 最新フレームを返す。新しいフレームが来るまで待ち、取り込みが終わっていれば None
+    #   timeout [秒] を指定すると、それまでに来なければ CaptureTimeout を投げる
+    def read(self, timeout=None):
+        deadline = None if timeout is None else time.time() + timeout
+        with self.cond:
+            while self.seq == self.last_read_seq:
+                if not self.running:
+                    return None
+                remaining = None
+                if deadline is not None:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        raise CaptureTimeout(f'{timeout} 秒待ってもフレームが来ませんでした')
+                self.cond.wait(remaining)
+
+            slot = self.latest
+            seq = self.seqs[slot]
+            self.dropped += seq - self.last_read_seq - 1
+            self.last_read_seq = seq
+            self.in_use = slot
+            return CapturedFrame(self.slots[slot], self.stamps[slot], seq, self.dropped)
+
+    def get(self, prop_id):
+        return self.cap.get(prop_id)
+
+    # 取り込みを止めてカメラを閉じる
+    #   スレッドが grab() から戻らないうちは閉じず、スレッドが終わったときに閉じる
+    def release(self):
+        with self.cond:
+            self.running = False
+            self.closed = True
+            self.cond.notify_all()
+            finished = self.finished
+        if finished:
+            self.cap.release()
+            return
+        self.thread.join(timeout=1.0)
+        if self.thread.is_alive():
+            print('警告: 取り込みスレッドが終わっていないので、終わったときにカメラを閉じます')
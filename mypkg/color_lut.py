@@ -0,0 +1,87 @@
+import cv2
+import numpy as np
+
+# 1 バイトのビットマスクで表せる範囲の数
+MAX_RANGES = 8
+
+
+# color_ranges の値を [(lower, upper), ...] の形にそろえる
+def _as_range_list(value):
+    if np.ndim(value[0]) == 1:
+        return [value]
+    return list(value)
+
+
+class ColorClassifier:
+    """全色の範囲をルックアップテーブルにまとめ、1 回の走査でラベル付けする.
+
+    color_ranges は {色名: (lower, upper)} または {色名: [(lower, upper), ...]}。
+    H の lower が upper より大きい範囲は 179→0 をまたぐ範囲として扱う。
+    範囲が重なる画素は color_ranges の順で先にある色になる。
+    """
+
+    def __init__(self, color_ranges, hue_wrap=True):
+        self.colors = list(color_ranges)
+        self.labels_of = {color: i + 1 for i, color in enumerate(self.colors)}
+
+        ranges = []
+        for color in self.colors:
+            for lower, upper in _as_range_list(color_ranges[color]):
+                ranges.append((self.labels_of[color], lower, upper))
+        if len(ranges) > MAX_RANGES:
+            raise ValueError(f'色範囲は {MAX_RANGES} 個までです（{len(ranges)} 個指定）')
+
+        # チャンネルごとに「その値を含む範囲」のビットを立てたテーブル
+        self.channel_lut = np.zeros((256, 1, 3), dtype=np.uint8)
+        for bit, (_, lower, upper) in enumerate(ranges):
+            b = 1 << bit
+            for c in range(3):
+                lo, hi = int(lower[c]), int(upper[c])
+                if c == 0 and hue_wrap and lo > hi:
+                    # 色相の折り返し（例: 170〜10）
+                    self.channel_lut[lo:, 0, c] |= b
+                    self.channel_lut[:hi + 1, 0, c] |= b
+                else:
+                    self.channel_lut[lo:hi + 1, 0, c] |= b
+
+        # ビットマスク → ラベル（重なりは先の範囲を優先）
+        self.label_lut = np.zeros(256, dtype=np.uint8)
+        for m in range(1, 256):
+            for bit, (label, _, _) in enumerate(ranges):
+                if m & (1 << bit):
+                    self.label_lut[m] = label
+                    break
+        self.mask_lut = np.where(self.label_lut > 0, 255, 0).astype(np.uint8)
+
+        self._bits = None
+        self._hits = None
+        self._labels = None
+        self._mask = None
+
+    # バッファは大きくなるときだけ確保し直す（ROI ごとにサイズが変わっても使い回す）
+    def _buffers(self, shape):
+        h, w = shape[:2]
+        if self._bits is None or self._bits.shape[0] < h or self._bits.shape[1] < w:
+            self._bits = np.empty((h, w, 3), dtype=np.uint8)
+            self._hits = np.empty((h, w), dtype=np.uint8)
+            self._labels = np.empty((h, w), dtype=np.uint8)
+            self._mask = np.empty((h, w), dtype=np.uint8)
+        return (self._bits[:h, :w], self._hits[:h, :w],
+                self._labels[:h, :w], self._mask[:h, :w])
+
+    # ラベル画像（0 は背景、1〜 は self.colors の順）と全色の合成マスクを返す
+    #   labels: ラベル画像の出力先（共有メモリなど。省略時は内部のバッファ）
+    def classify(self, hsv, labels=None):
+        bits, hits, labels_buf, mask = self._buffers(hsv.shape)
+        if labels is None:
+            labels = labels_buf
+        bits = cv2.LUT(hsv, self.channel_lut, dst=bits)
+        np.bitwise_and(bits[:, :, 0], bits[:, :, 1], out=hits)
+        np.bitwise_and(hits, bits[:, :, 2], out=hits)
+        labels = cv2.LUT(hits, self.label_lut, dst=labels)
+        mask = cv2.LUT(hits, self.mask_lut, dst=mask)
+        return labels, mask
+
+    # ラベル画像から 1 色分のマスクを取り出す
+    def color_mask(self, labels, color, dst=None):
+        return cv2.compare(labels, self.labels_of[color], cv2.CMP_EQ, dst=dst)
@@ -0,0 +1,366 @@
+import time
+from collections import deque, namedtuple
+
+import cv2
+import numpy as np
+
+from mypkg.balls import BallBuffer
+from mypkg.blobs import circles_from_mask
+from mypkg.color_lut import ColorClassifier
+from mypkg.mjpeg import scale_camera_matrix
+from mypkg.parallel import ParallelMaskProcessor
+from mypkg.pyramid import PyramidDetector
+from mypkg.roi import RoiTracker
+from mypkg.undistort import Undistorter, print_benchmark, undistort_circle
+
+# 検出したボール（座標は歪み補正後の画像上のもの、distance は cm）
+Detection = namedtuple('Detection', ['x', 'y', 'radius', 'color', 'area', 'distance'])
+
+# 1 フレーム分の結果
+#   balls: 半径の大きい順のボール（balls.BALL_DTYPE の構造化配列。次の detect() で上書きされる）
+#   best: 最大のボールの Detection（なければ None）
+#   frame: 検出に使ったフレーム（remap なら歪み補正後、sparse なら補正前）、combined_mask: 全色の合成マスク（探索範囲分）
+#   window: 探索範囲 (x0, y0, x1, y1)（全体探索なら None）、timings: 段階ごとの処理時間 [ms]
+DetectionResult = namedtuple('DetectionResult',
+                             ['balls', 'best', 'frame', 'combined_mask', 'window', 'timings'])
+
+METHODS = ('contour', 'canny', 'hough')
+
+HOUGH_PARAMS = {
+    'dp': 1.2, 'minDist': 20, 'param1': 100, 'param2': 20, 'minRadius': 5, 'maxRadius': 120,
+}
+
+
+class StageTimer:
+    """段階ごとの処理時間 [ms] を記録する."""
+
+    def __init__(self, history=0):
+        self.history_len = history
+        self.reset()
+
+    # これまでの記録を消す（ウォームアップ後など）
+    def reset(self):
+        self.times = {}
+        self.totals = {}
+        self.count = 0
+        self.history = {}
+        self._start = 0.0
+        self._last = 0.0
+
+    def begin(self):
+        self.times = {}
+        self._start = self._last = time.perf_counter()
+
+    # 前回の lap() からの時間を stage に加算する（同じ段階を何度呼んでもよい）
+    def lap(self, stage):
+        now = time.perf_counter()
+        self.times[stage] = self.times.get(stage, 0.0) + (now - self._last) * 1000
+        self._last = now
+
+    def end(self):
+        self.times['total'] = (time.perf_counter() - self._start) * 1000
+        self.count += 1
+        for stage, ms in self.times.items():
+            self.totals[stage] = self.totals.get(stage, 0.0) + ms
+            if self.history_len:
+                self.history.setdefault(stage, deque(maxlen=self.history_len)).append(ms)
+        return self.times
+
+    # 段階ごとの平均時間 [ms]
+    def mean(self):
+        if self.count == 0:
+            return {}
+        return {stage: total / self.count for stage, total in self.totals.items()}
+
+    # 段階ごとのパーセンタイル [ms]（history を指定したときのみ）
+    def percentiles(self, qs=(50, 90, 99)):
+        return {stage: {f'p{q}': float(np.percentile(values, q)) for q in qs}
+                for stage, values in self.history.items()}
+
+
+class BallDetector:
+    """メディアンブラー → HSV → 色分類 → オープニング → 輪郭 → 最小外接円 の検出エンジン.
+
+    method は 'contour'（最小外接円）、'canny'（Canny + 輪郭）、'hough'（マスク付きハフ変換）。
+    contour では連結成分の特徴量（面積・充填率・縦横比）で候補を採点し、
+    色ごとに点数の高い max_candidates 個だけに円を当てはめる（score_weights で重みを変える）。
+    undistort は None、'remap'（フレーム全体）、'sparse'（検出した円だけ）。
+    sparse でも balls の中心と半径は補正後の座標に直すので、remap と同じ座標で返る。
+    ball_diameter と焦点距離（focal_length か camera_matrix の fx）があれば距離も求める。
+    distance_lut（distance_model.DistanceLut）を渡すと、画素直径から表を引いて求める。
+    結果は半径の大きい順に最大 max_balls 個の構造化配列（mypkg.balls）で返す。
+    roi_tracking では最大のボール 1 個の周辺だけを探すので、全体探索のフレーム以外は
+    balls にそのボール 1 個（窓の中にあるものだけ）しか返らない。複数のボールを使うときは
+    False のままにする。
+    pyramid_level を 1 以上にすると、全体探索は縮小画像で候補を探してから元解像度で求め直す
+    （method は contour だけ。ブラー・オープニング・候補の採点は同じ設定を使う）。
+    workers を 1 以上にすると、色ごとのマスク処理を共有メモリ経由でプロセスプールに振り分ける。
+    プールは frame_size (幅, 高さ) の共有メモリと一緒にここで start_method で起動するので、
+    カメラの取り込みスレッドなどを起動する前に作る（parallel.ParallelMaskProcessor）。
+    decode_scale はフレームを 1/decode_scale に縮小デコードしているとき（sources.open_source）。
+    camera_matrix・focal_length・min_area・frame_size・ハフ変換の半径は元の解像度の値を渡せば
+    ここで縮小後に合わせる。距離は元の解像度での画素直径で求めるので、距離モデルはそのまま使える。
+    """
+
+    def __init__(self, color_ranges, method='contour', blur_size=5, kernel_size=5,
+                 open_iterations=2, min_area=300, hough_params=None,
+                 camera_matrix=None, dist_coeffs=None, undistort=None,
+                 ball_diameter=None, focal_length=None,
+                 roi_tracking=False, roi_max_misses=3, roi_full_every=30,
+                 pyramid_level=0, report_undistort=False, timing_history=0, workers=0,
+                 max_candidates=3, score_weights=None, min_fill=0.3, min_aspect=0.3,
+                 max_balls=8, distance_lut=None, frame_size=(1280, 720),
+                 start_method='fork', decode_scale=1):
+        if method not in METHODS:
+            raise ValueError(f'method は {METHODS} のいずれかです: {method}')
+        if undistort not in (None, 'remap', 'sparse'):
+            raise ValueError(f'undistort は None, remap, sparse のいずれかです: {undistort}')
+        if undistort is not None and (camera_matrix is None or dist_coeffs is None):
+            raise ValueError('歪み補正には camera_matrix と dist_coeffs が必要です')
+
+        self.colors = list(color_ranges)
+        self.color_ranges = dict(color_ranges)
+        self.color_ids = {color: i for i, color in enumerate(self.colors)}
+        self.ball_buffer = BallBuffer(max_balls)
+        self.classifier = ColorClassifier(color_ranges)
+        self.method = method
+        self.blur_size = blur_size
+        self.kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (kernel_size, kernel_size))
+        self.open_iterations = open_iterations
+        self.decode_scale = decode_scale
+        self.full_min_area = min_area
+        self.hough_params = dict(HOUGH_PARAMS, **(hough_params or {}))
+        if decode_scale != 1:
+            # 縮小したフレーム上での値（面積は 1/scale^2、長さは 1/scale）
+            min_area = min_area / decode_scale ** 2
+            for key in ('minDist', 'minRadius', 'maxRadius'):
+                self.hough_params[key] = max(1, round(self.hough_params[key] / decode_scale))
+            frame_size = (frame_size[0] // decode_scale, frame_size[1] // decode_scale)
+        self.min_area = min_area
+        self.candidate_args = {'max_candidates': max_candidates, 'weights': score_weights,
+                               'min_fill': min_fill, 'min_aspect': min_aspect}
+
+        self.camera_matrix = camera_matrix
+        if camera_matrix is not None and decode_scale != 1:
+            self.camera_matrix = scale_camera_matrix(camera_matrix, decode_scale)
+        self.dist_coeffs = dist_coeffs
+        self.undistort = undistort
+        self.undistorter = None
+        self.report_undistort = report_undistort
+
+        self.ball_diameter = ball_diameter
+        # 焦点距離は元の解像度のまま（measured_radius も元の解像度の半径を返す）
+        if focal_length is None and camera_matrix is not None:
+            focal_length = camera_matrix[0, 0]
+        self.focal_length = focal_length
+        self.distance_lut = distance_lut
+
+        self.roi = RoiTracker(max_misses=roi_max_misses,
+                              full_every=roi_full_every) if roi_tracking else None
+        self.pyramid = None
+        if pyramid_level > 0:
+            if method != 'contour':
+                raise ValueError(f'ピラミッド検出は method=contour だけに対応します: {method}')
+            self.pyramid = PyramidDetector(
+                color_ranges, level=pyramid_level, min_area=min_area, blur_size=blur_size,
+                kernel_size=kernel_size, open_iterations=open_iterations,
+                candidate_args=self.candidate_args)
+
+        self.parallel = None
+        if workers > 0:
+            self.parallel = ParallelMaskProcessor(
+                self.colors, self.classifier.labels_of, workers, kernel_size=kernel_size,
+                open_iterations=open_iterations, min_area=min_area, method=method,
+                candidate_args=self.candidate_args, frame_size=frame_size,
+                start_method=start_method)
+
+        self.timer = StageTimer(history=timing_history)
+
+    # 色範囲を入れ替える（色とその順番は変えられない。AdaptiveColorRanges から呼ぶ）
+    def set_color_ranges(self, color_ranges):
+        if list(color_ranges) != self.colors:
+            raise ValueError(f'色は {self.colors} の順で指定してください: {list(color_ranges)}')
+        self.color_ranges = dict(color_ranges)
+        self.classifier = ColorClassifier(color_ranges)
+        if self.pyramid is not None:
+            self.pyramid.classifier = ColorClassifier(color_ranges)
+
+    # 歪み補正（マップは最初のフレームのサイズで作る）
+    def _undistort(self, frame):
+        if self.undistorter is None:
+            h, w = frame.shape[:2]
+            self.undistorter = Undistorter(self.camera_matrix, self.dist_coeffs, (w, h))
+            if self.report_undistort:
+                print_benchmark(self.undistorter.benchmark(frame))
+        return self.undistorter.undistort(frame)
+
+    # 距離を求められるか（距離モデルか、ボール直径と焦点距離があるか）
+    def has_distance(self):
+        return self.distance_lut is not None or (self.ball_diameter is not None
+                                                 and self.focal_length is not None)
+
+    # 距離の計算に使う元の解像度での半径（detect() の balls の半径から）
+    def measured_radius(self, radius):
+        return radius * self.decode_scale
+
+    # 補正後の座標 (x, y) を result.frame 上の画素に戻す（sparse のときだけ歪ませ直す）
+    def frame_point(self, x, y):
+        if self.undistort != 'sparse':
+            return x, y
+        k = self.camera_matrix
+        ray = np.array([[(x - k[0, 2]) / k[0, 0], (y - k[1, 2]) / k[1, 1], 1.0]])
+        pts, _ = cv2.projectPoints(ray, np.zeros(3), np.zeros(3), k, self.dist_coeffs)
+        return float(pts[0, 0, 0]), float(pts[0, 0, 1])
+
+    # sparse のとき、円の中心と半径を歪み補正後の座標に書き換える（remap と同じ座標になる）
+    def _undistort_balls(self, balls):
+        for i in range(len(balls)):
+            (x, y), radius = undistort_circle((float(balls['x'][i]), float(balls['y'][i])),
+                                              float(balls['radius'][i]), self.camera_matrix,
+                                              self.dist_coeffs)
+            balls['x'][i], balls['y'][i], balls['radius'][i] = x, y, radius
+
+    # 画素直径の測り方に効く設定（距離モデルと一緒に保存し、読み込むときに比べる）
+    def measurement_config(self):
+        return {
+            'undistort': self.undistort,
+            'method': self.method,
+            'pyramid_level': self.pyramid.level if self.pyramid is not None else 0,
+            'blur_size': self.blur_size,
+            'kernel_size': int(self.kernel.shape[0]),
+            'open_iterations': self.open_iterations,
+            'min_area': self.full_min_area,
+            'decode_scale': self.decode_scale,
+            'color_ranges': {color: np.asarray(value).tolist()
+                             for color, value in self.color_ranges.items()},
+        }
+
+    # balls の distance をまとめて求める（求まらなければ NaN のまま）
+    def _fill_distances(self, balls):
+        if not self.has_distance() or len(balls) == 0:
+            return
+        distance = balls['distance']
+        radius = self.measured_radius(balls['radius'])
+        if self.distance_lut is not None:
+            distance[:] = self.distance_lut.lookup(radius * 2)
+            return
+        np.divide(self.ball_diameter * self.focal_length, radius * 2, out=distance,
+                  where=radius > 0)
+
+    # 1 色分のマスクから円を探す
+    def _circles_from_mask(self, mask, gray, color, offset):
+        timer = self.timer
+        mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, self.kernel,
+                                iterations=self.open_iterations)
+        timer.lap('morph')
+
+        circles = []
+        if self.method == 'hough':
+            masked_gray = cv2.bitwise_and(gray, gray, mask=mask)
+            found = cv2.HoughCircles(masked_gray, cv2.HOUGH_GRADIENT, **self.hough_params)
+            timer.lap('hough')
+            if found is not None:
+                for x, y, r in found[0]:
+                    area = np.pi * r * r
+                    circles.append((x + offset[0], y + offset[1], r, color, area, area))
+            timer.lap('fit')
+            return circles
+
+        if self.method == 'contour':
+            circles = circles_from_mask(mask, color, offset, self.min_area, **self.candidate_args)
+            timer.lap('fit')
+            return circles
+
+        mask = cv2.Canny(mask, 50, 150)
+        timer.lap('canny')
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE,
+                                       offset=offset)
+        timer.lap('contours')
+        for cnt in contours:
+            area = cv2.contourArea(cnt)
+            if area < self.min_area:
+                continue
+            (x, y), radius = cv2.minEnclosingCircle(cnt)
+            circles.append((x, y, radius, color, area, area))
+        timer.lap('fit')
+        return circles
+
+    def detect(self, frame):
+        timer = self.timer
+        timer.begin()
+
+        if self.undistort == 'remap':
+            frame = self._undistort(frame)
+            timer.lap('undistort')
+
+        window = self.roi.window(frame.shape) if self.roi is not None else None
+        combined_mask = None
+
+        if window is None and self.pyramid is not None:
+            # 全体探索は縮小画像で候補を探してから元解像度で求め直す
+            circles = self.pyramid.detect(frame)
+            timer.lap('pyramid')
+        else:
+            if window is None:
+                x0, y0 = 0, 0
+                roi = frame
+            else:
+                x0, y0, x1, y1 = window
+                roi = frame[y0:y1, x0:x1]
+
+            blurred = cv2.medianBlur(roi, self.blur_size)
+            timer.lap('blur')
+            hsv = cv2.cvtColor(blurred, cv2.COLOR_BGR2HSV)
+            gray = None
+            if self.method == 'hough':
+                gray = cv2.cvtColor(blurred, cv2.COLOR_BGR2GRAY)
+            timer.lap('hsv')
+            if self.parallel is not None:
+                # ラベル画像を共有メモリに書き、色ごとの処理はワーカーに任せる
+                labels_buf = self.parallel.labels_buffer(hsv.shape)
+                labels, combined_mask = self.classifier.classify(hsv, labels=labels_buf)
+                timer.lap('classify')
+                circles = self.parallel.process(labels.shape, (x0, y0))
+                timer.lap('parallel')
+            else:
+                labels, combined_mask = self.classifier.classify(hsv)
+                timer.lap('classify')
+
+                circles = []
+                for color in self.colors:
+                    mask = self.classifier.color_mask(labels, color)
+                    timer.lap('classify')
+                    circles.extend(self._circles_from_mask(mask, gray, color, (x0, y0)))
+
+        circles.sort(key=lambda c: c[2], reverse=True)
+        balls = self.ball_buffer.fill(circles, self.color_ids)
+        # 探索範囲は補正前のフレームから切り出すので、ROI には補正前の座標を渡す
+        raw_best = None
+        if len(balls):
+            raw_best = (float(balls['x'][0]), float(balls['y'][0])), float(balls['radius'][0])
+        if self.undistort == 'sparse':
+            self._undistort_balls(balls)
+            timer.lap('undistort')
+        self._fill_distances(balls)
+        best = None
+        if len(balls):
+            ball = balls[0]
+            distance = float(ball['distance'])
+            best = Detection(float(ball['x']), float(ball['y']), float(ball['radius']),
+                             self.colors[ball['color']], float(ball['area']),
+                             None if np.isnan(distance) else distance)
+        timer.lap('fit')
+
+        if self.roi is not None:
+            if raw_best is None:
+                self.roi.update(None, 0, window is None)
+            else:
+                self.roi.update(raw_best[0], raw_best[1], window is None)
+
+        timings = timer.end()
+        return DetectionResult(balls, best, frame, combined_mask, window, timings)
+
+    # 並列処理用のワーカーと共有メモリを片付ける
+    def close(self):
+        if self.parallel is not None:
+            self.parallel.close()
@@ -0,0 +1,138 @@
+import argparse
+import csv
+import json
+import sys
+import time
+
+import numpy as np
+
+from mypkg import params
+from mypkg.detector import BallDetector
+from mypkg.frames import load_frames
+
+# 比較する検出方式（各スクリプトと同じ前処理）
+VARIANTS = {
+    'contour': {'method': 'contour', 'blur_size': 5},   # tracking_hyb1.py, ball_distance.py
+    'canny': {'method': 'canny', 'blur_size': 11},      # tracking_findc.py
+    'hough': {'method': 'hough', 'blur_size': 11},      # tracking_deploy.py
+}
+
+
+# 正解データ（CSV: frame,x,y,radius。ボールがないフレームは x を空にする）
+def load_ground_truth(path):
+    truth = {}
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            if row.get('x', '') == '':
+                truth[int(row['frame'])] = None
+            else:
+                truth[int(row['frame'])] = (float(row['x']), float(row['y']), float(row['radius']))
+    return truth
+
+
+# 中心のずれと半径の比が許容範囲内か（hugh_min.py と同じ判定）
+def is_circle_valid(det, true_circle, tol=50, ratio_range=(0.8, 1.2)):
+    dist = np.hypot(det.x - true_circle[0], det.y - true_circle[1])
+    radius_ok = ratio_range[0] * true_circle[2] <= det.radius <= ratio_range[1] * true_circle[2]
+    return dist <= tol and radius_ok
+
+
+def run_variant(frames, truth, options, tol, warmup):
+    detector = BallDetector(params.COLOR_RANGES, timing_history=len(frames), **options)
+    for frame in frames[:warmup]:
+        detector.detect(frame)
+    detector.timer.reset()
+
+    correct = false_positive = missed = with_ball = without_ball = 0
+    center_errors = []
+    radius_errors = []
+    start = time.perf_counter()
+    for i, frame in enumerate(frames):
+        best = detector.detect(frame).best
+        true_circle = truth(i)
+        if true_circle is None:
+            without_ball += 1
+            if best is not None:
+                false_positive += 1
+            continue
+        with_ball += 1
+        if best is None:
+            missed += 1
+            continue
+        center_errors.append(float(np.hypot(best.x - true_circle[0], best.y - true_circle[1])))
+        radius_errors.append(abs(best.radius - true_circle[2]))
+        if is_circle_valid(best, true_circle, tol):
+            correct += 1
+    elapsed = time.perf_counter() - start
+
+    return {
+        'options': options,
+        'frames': len(frames),
+        'throughput_fps': len(frames) / elapsed if elapsed > 0 else 0.0,
+        'latency_ms': detector.timer.percentiles(),
+        'latency_mean_ms': detector.timer.mean(),
+        'accuracy': {
+            'frames_with_ball': with_ball,
+            'frames_without_ball': without_ball,
+            'correct': correct,
+            'missed': missed,
+            'false_positive': false_positive,
+            'recognition_rate': correct / with_ball if with_ball else None,
+            'mean_center_error_px': float(np.mean(center_errors)) if center_errors else None,
+            'mean_radius_error_px': float(np.mean(radius_errors)) if radius_errors else None,
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='録画したフレームで検出方式ごとの処理時間と認識率を比較し、JSON で出力する')
+    parser.add_argument('source', help='録画した動画ファイルまたは画像ディレクトリ')
+    parser.add_argument('--ground-truth', help='正解データの CSV (frame,x,y,radius)')
+    parser.add_argument('--true-center', type=float, nargs=2, default=(640, 360),
+                        help='正解 CSV がないときの固定の中心（hugh_min.py の true_center）')
+    parser.add_argument('--true-radius', type=float, default=100)
+    parser.add_argument('--tolerance', type=float, default=50, help='中心の許容誤差 [px]')
+    parser.add_argument('--variants', nargs='+', choices=sorted(VARIANTS),
+                        default=list(VARIANTS))
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--max-frames', type=int, default=None)
+    parser.add_argument('--output', '-o', help='出力先の JSON ファイル（省略時は標準出力）')
+    args = parser.parse_args()
+
+    frames = load_frames(args.source, args.max_frames)
+    if not frames:
+        print(f'{args.source} からフレームを読み込めませんでした', file=sys.stderr)
+        return 1
+
+    if args.ground_truth:
+        table = load_ground_truth(args.ground_truth)
+
+        def truth(i):
+            return table.get(i)
+    else:
+        fixed = (args.true_center[0], args.true_center[1], args.true_radius)
+
+        def truth(i):
+            return fixed
+
+    report = {
+        'source': args.source,
+        'ground_truth': args.ground_truth,
+        'tolerance_px': args.tolerance,
+        'variants': {name: run_variant(frames, truth, VARIANTS[name], args.tolerance,
+                                       args.warmup)
+                     for name in args.variants},
+    }
+
+    text = json.dumps(report, indent=2, sort_keys=True, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,307 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from mypkg import params
+from mypkg.balls import largest, of_color
+from mypkg.calibration import load_camera_params
+from mypkg.detector import BallDetector
+from mypkg.sources import VideoFileSource
+
+MODEL_VERSION = 2
+MODEL_DIR = os.path.join(os.path.expanduser('~'), '.config', 'mypkg')
+
+# 読み込み時に違っていたら距離モデルを使わない項目（画素直径そのものが変わる）
+STRICT_KEYS = ('camera', 'image_size', 'undistort')
+
+# 距離モデル（distance は cm、px はボールの画素直径）
+#   inverse: distance = a / px + b（glaf_focal.py と同じ形）
+#   pinhole: distance = a / px（a = ボール直径 × 焦点距離）
+MODELS = ('inverse', 'pinhole')
+
+
+def fit_model(pixel_diameters, distances, model='inverse'):
+    inv = 1.0 / np.asarray(pixel_diameters, dtype=np.float64)
+    distances = np.asarray(distances, dtype=np.float64)
+    if model == 'pinhole':
+        a = float(np.dot(inv, distances) / np.dot(inv, inv))
+        return a, 0.0
+    a, b = np.polyfit(inv, distances, 1)
+    return float(a), float(b)
+
+
+def predict(coeffs, pixel_diameters):
+    a, b = coeffs
+    return a / np.asarray(pixel_diameters, dtype=np.float64) + b
+
+
+# 距離ごとに 1 つずつ外して当てはめ、外した距離での誤差を求める
+def leave_one_distance_out(pixel_diameters, distances, model='inverse'):
+    pixel_diameters = np.asarray(pixel_diameters, dtype=np.float64)
+    distances = np.asarray(distances, dtype=np.float64)
+    errors = np.empty(len(distances))
+    for i in range(len(distances)):
+        keep = np.arange(len(distances)) != i
+        coeffs = fit_model(pixel_diameters[keep], distances[keep], model)
+        errors[i] = predict(coeffs, pixel_diameters[i]) - distances[i]
+    return errors
+
+
+# 距離モデルのファイル（トラッカー名なら ~/.config/mypkg/distance_<名前>.json）
+def model_path(name):
+    if os.sep in name or name.endswith('.json'):
+        return name
+    return os.path.join(MODEL_DIR, f'distance_{name}.json')
+
+
+class DistanceLut:
+    """画素直径 → 距離 [cm] の表を起動時に作っておき、毎フレームは引くだけにする.
+
+    resolution [px] 刻みで max_diameter [px] まで作る。範囲外は端の値になる。
+    """
+
+    def __init__(self, coeffs, max_diameter=1500, resolution=0.25):
+        self.coeffs = tuple(coeffs)
+        self.resolution = resolution
+        px = np.arange(int(max_diameter / resolution) + 1) * resolution
+        px[0] = resolution / 2
+        self.table = predict(self.coeffs, px).astype(np.float32)
+
+    @classmethod
+    def from_file(cls, path, **kwargs):
+        model = load_model(path)
+        return cls((model['a'], model['b']), **kwargs)
+
+    # 画素直径（スカラーでも配列でもよい）に対する距離 [cm]
+    def lookup(self, pixel_diameter):
+        index = np.rint(np.asarray(pixel_diameter) / self.resolution).astype(np.intp)
+        distance = self.table[np.clip(index, 0, len(self.table) - 1)]
+        return float(distance) if distance.ndim == 0 else distance
+
+
+def save_model(path, model):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(json.dumps(model, indent=2, ensure_ascii=False) + '\n')
+    os.replace(tmp_path, path)
+
+
+def load_model(path):
+    with open(path) as f:
+        model = json.load(f)
+    if model.get('version') != MODEL_VERSION:
+        raise ValueError(f'{path} の版 {model.get("version")} には対応していません'
+                         '（distance_calib で作り直してください）')
+    return model
+
+
+# 距離モデルを測ったときの条件と、使う側の条件の違い [(項目, モデル, 使う側)]
+def model_mismatches(model, detector=None, camera=None, image_size=None):
+    current = {}
+    if camera is not None:
+        current['camera'] = str(camera)
+    if image_size is not None:
+        current['image_size'] = list(image_size)
+    if detector is not None:
+        current.update(detector.measurement_config())
+    recorded = dict(model['detector'], camera=model['camera'], image_size=model['image_size'])
+    return [(key, recorded.get(key), value) for key, value in current.items()
+            if recorded.get(key) != value]
+
+
+def load_distance_lut(path, detector=None, camera=None, image_size=None):
+    """トラッカー用の距離モデル path を読み、画素直径 → 距離の表を返す.
+
+    ファイルがないとき、またはカメラ・解像度・歪み補正の方法が測ったときと違うときは
+    None を返す（検出器は焦点距離から求める）。ほかの検出設定の違いは警告だけ出す。
+    """
+    path = model_path(path)
+    if not os.path.exists(path):
+        print(f'距離モデル {path} がないので、焦点距離から距離を求めます')
+        return None
+    model = load_model(path)
+    mismatches = model_mismatches(model, detector, camera, image_size)
+    strict = [m for m in mismatches if m[0] in STRICT_KEYS]
+    for key, recorded, value in mismatches:
+        print(f'{"" if key in STRICT_KEYS else "警告: "}距離モデル {path} の {key} は {recorded} で、'
+              f'この検出器は {value} です')
+    if strict:
+        print(f'距離モデル {path} は使いません（distance_calib で同じ条件で測り直してください）')
+        return None
+    lut = DistanceLut((model['a'], model['b']))
+    print(f'距離モデル {path} を読み込みました: D = {lut.coeffs[0]:.1f} / px + {lut.coeffs[1]:.2f}')
+    return lut
+
+
+# 距離ごとの録画の一覧（CSV: distance,source。distance は cm）
+#   ディレクトリを渡したときは、距離の数値を名前にしたサブディレクトリ・動画を使う
+def load_sweep(path):
+    sweep = []
+    if os.path.isdir(path):
+        for name in sorted(os.listdir(path)):
+            try:
+                distance = float(os.path.splitext(name)[0])
+            except ValueError:
+                continue
+            sweep.append((distance, os.path.join(path, name)))
+    else:
+        base = os.path.dirname(os.path.abspath(path))
+        with open(path, newline='') as f:
+            for row in csv.DictReader(f):
+                sweep.append((float(row['distance']), os.path.join(base, row['source'])))
+    return sorted(sweep)
+
+
+# 1 つの録画の各フレームで最大のボールの画素直径を測る（戻り値は (直径の配列, 画像サイズ)）
+#   直径は検出器が距離を求めるときと同じもの（sparse なら補正後）
+#   検出器が縮小デコードする設定なら、トラッカーと同じように縮小して読む
+def measure(detector, source, color_id=None, max_frames=None):
+    diameters = []
+    size = None
+    scale = detector.decode_scale
+    frames = VideoFileSource(source, decode_scale=scale)
+    try:
+        while max_frames is None or frames.seq < max_frames:
+            captured = frames.read()
+            if captured is None:
+                break
+            frame = captured.frame
+            # 距離モデルには元の解像度を記録する
+            size = (frame.shape[1] * scale, frame.shape[0] * scale)
+            balls = detector.detect(frame).balls
+            if color_id is not None:
+                balls = of_color(balls, color_id)
+            ball = largest(balls)
+            if ball is not None:
+                radius = detector.measured_radius(float(ball['radius']))
+                diameters.append(radius * 2)
+    finally:
+        frames.release()
+    return np.array(diameters), size
+
+
+# {色名: [[下限], [上限]]} の JSON（トラッカーの color_ranges と同じ値を渡す）
+def load_color_ranges(path):
+    with open(path) as f:
+        ranges = json.load(f)
+    return {color: (np.array(value[0]), np.array(value[1])) for color, value in ranges.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='距離を変えて撮ったボールの録画から距離モデルを当てはめ、検証して保存する')
+    parser.add_argument('sweep',
+                        help='CSV (distance,source) または距離を名前にした録画を置いたディレクトリ')
+    parser.add_argument('--model', choices=MODELS, default='inverse')
+    parser.add_argument('--color',
+                        help='測るボールの色（省略時は全色で最大のもの）')
+    parser.add_argument('--max-frames', type=int, default=None, help='1 距離あたりのフレーム数')
+    parser.add_argument('--output', '-o', required=True,
+                        help='保存先（トラッカー名なら ~/.config/mypkg/distance_<名前>.json）')
+    # 以下はトラッカーの BallDetector と同じ値にする（距離モデルに保存し、読み込み時に比べる）
+    parser.add_argument('--camera', required=True,
+                        help='録画したカメラ（トラッカーの DEVICE と同じ値。例: /dev/video4）')
+    parser.add_argument('--undistort', choices=('none', 'remap', 'sparse'), default='none')
+    parser.add_argument('--camera-calib', default=None,
+                        help='歪み補正に使う camera_calib の結果（省略時は --camera のもの。'
+                             'なければ params.py の値）')
+    parser.add_argument('--ranges', help='色範囲の JSON {色名: [[下限], [上限]]}（省略時は params.py）')
+    parser.add_argument('--method', choices=('contour', 'canny', 'hough'), default='contour')
+    parser.add_argument('--blur-size', type=int, default=5)
+    parser.add_argument('--min-area', type=int, default=300)
+    parser.add_argument('--decode-scale', type=int, choices=(1, 2, 4, 8), default=1,
+                        help='トラッカーの DECODE_SCALE（1/scale に縮小デコードして測る）')
+    args = parser.parse_args()
+
+    sweep = load_sweep(args.sweep)
+    if len(sweep) < 3:
+        print('距離は 3 つ以上必要です（1 つずつ外して検証するため）', file=sys.stderr)
+        return 1
+
+    color_ranges = load_color_ranges(args.ranges) if args.ranges else params.COLOR_RANGES
+    undistort = None if args.undistort == 'none' else args.undistort
+    camera_matrix = dist_coeffs = None
+    if undistort is not None:
+        # 較正した解像度と録画の解像度を比べる（最初の録画の 1 枚目で）
+        first = VideoFileSource(sweep[0][1])
+        captured = first.read()
+        first.release()
+        image_size = None if captured is None else captured.frame.shape[1::-1]
+        camera_matrix, dist_coeffs = load_camera_params(args.camera, image_size, args.camera_calib)
+    detector = BallDetector(color_ranges, method=args.method, blur_size=args.blur_size,
+                            min_area=args.min_area, camera_matrix=camera_matrix,
+                            dist_coeffs=dist_coeffs, undistort=undistort,
+                            decode_scale=args.decode_scale)
+    if args.color is not None and args.color not in detector.color_ids:
+        print(f'色範囲に {args.color} がありません', file=sys.stderr)
+        return 1
+    color_id = detector.color_ids[args.color] if args.color else None
+
+    distances, medians, samples = [], [], []
+    sizes = set()
+    print('距離[cm]  フレーム  画素直径の中央値[px]  ばらつき(IQR)[px]')
+    for distance, source in sweep:
+        diameters, size = measure(detector, source, color_id, args.max_frames)
+        if size is not None:
+            sizes.add(size)
+        if len(diameters) == 0:
+            print(f'{distance:8.1f}  {source} でボールが見つかりませんでした（除外）')
+            continue
+        q1, median, q3 = np.percentile(diameters, [25, 50, 75])
+        print(f'{distance:8.1f}  {len(diameters):8d}  {median:20.2f}  {q3 - q1:17.2f}')
+        distances.append(distance)
+        medians.append(float(median))
+        samples.append(len(diameters))
+    detector.close()
+    if len(distances) < 3:
+        print('ボールが見つかった距離が 3 つ未満です', file=sys.stderr)
+        return 1
+    if len(sizes) != 1:
+        print(f'録画の画像サイズがそろっていません: {sorted(sizes)}', file=sys.stderr)
+        return 1
+
+    coeffs = fit_model(medians, distances, args.model)
+    fit_errors = predict(coeffs, medians) - np.array(distances)
+    held_out = leave_one_distance_out(medians, distances, args.model)
+
+    print()
+    print(f'近似式: D = {coeffs[0]:.2f} / px + {coeffs[1]:.3f} [cm]')
+    print(f'当てはめ誤差   : 平均 {np.mean(np.abs(fit_errors)):.2f} cm, '
+          f'最大 {np.max(np.abs(fit_errors)):.2f} cm')
+    print(f'1 距離外し誤差 : 平均 {np.mean(np.abs(held_out)):.2f} cm, '
+          f'最大 {np.max(np.abs(held_out)):.2f} cm')
+
+    model = {
+        'version': MODEL_VERSION,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'model': args.model,
+        'a': coeffs[0],
+        'b': coeffs[1],
+        'unit': 'cm',
+        'color': args.color,
+        'camera': args.camera,
+        'image_size': list(sizes.pop()),
+        'detector': detector.measurement_config(),
+        'points': [{'distance': d, 'pixel_diameter': m, 'frames': n,
+                    'fit_error': float(e), 'held_out_error': float(h)}
+                   for d, m, n, e, h in zip(distances, medians, samples, fit_errors, held_out)],
+        'validation': {
+            'fit_mae': float(np.mean(np.abs(fit_errors))),
+            'held_out_mae': float(np.mean(np.abs(held_out))),
+            'held_out_max': float(np.max(np.abs(held_out))),
+        },
+    }
+    path = model_path(args.output)
+    save_model(path, model)
+    print(f'{path} に保存しました')
+    return 0
+
+
+if __name__ == '__main__':
+    main()
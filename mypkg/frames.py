@@ -0,0 +1,66 @@
+import glob
+import os
+
+import cv2
+
+IMAGE_EXTS = ('.png', '.jpg', '.jpeg', '.bmp')
+
+
+# 画像ディレクトリ内の画像ファイルを名前順に返す
+def list_images(path):
+    return sorted(f for f in glob.glob(os.path.join(path, '*'))
+                  if f.lower().endswith(IMAGE_EXTS))
+
+
+# 動画ファイルまたは画像ディレクトリからフレームを読み込む
+def load_frames(path, max_frames=None):
+    frames = []
+    if os.path.isdir(path):
+        for f in list_images(path)[:max_frames]:
+            img = cv2.imread(f)
+            if img is not None:
+                frames.append(img)
+    else:
+        cap = cv2.VideoCapture(path)
+        while max_frames is None or len(frames) < max_frames:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frames.append(frame)
+        cap.release()
+    return frames
+
+
+# 動画ファイルまたは画像ディレクトリのフレーム数（動画はコンテナの値なので目安）
+def count_frames(path):
+    if os.path.isdir(path):
+        return len(list_images(path))
+    cap = cv2.VideoCapture(path)
+    count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    return count
+
+
+# start 番目から stop 番目の手前までのフレームを 1 枚ずつ返す
+#   全部をメモリに載せず、動画のバッファは使い回すので、残したいフレームはコピーする
+def iter_frames(path, start=0, stop=None):
+    if os.path.isdir(path):
+        for index, f in enumerate(list_images(path)[start:stop], start):
+            img = cv2.imread(f)
+            if img is not None:
+                yield index, img
+        return
+    cap = cv2.VideoCapture(path)
+    if start > 0:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+    index = start
+    frame = None
+    try:
+        while stop is None or index < stop:
+            ret, frame = cap.read(frame)
+            if not ret:
+                break
+            yield index, frame
+            index += 1
+    finally:
+        cap.release()
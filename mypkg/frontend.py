@@ -0,0 +1,102 @@
+import time
+
+import cv2
+
+from mypkg import params
+from mypkg.preview import PreviewPublisher, draw_overlay
+
+
+# 検出結果から描画内容を作る
+#   to_frame: 補正後の座標を result.frame 上の画素に戻す関数（BallDetector.frame_point）
+def build_overlay(result, state=None, draw_colors=params.DRAW_COLORS, to_frame=None):
+    overlay = []
+    best = result.best
+    if to_frame is None:
+        def to_frame(x, y):
+            return x, y
+    if best is not None:
+        draw_color = draw_colors.get(best.color, (255, 255, 255))
+        x, y = to_frame(best.x, best.y)
+        center = (int(x), int(y))
+        overlay.append(('circle', center, best.radius, draw_color, 2))
+        overlay.append(('circle', center, 5, (0, 0, 0), -1))
+        overlay.append(('text', f'{best.color.capitalize()} Ball Pos: '
+                        f'({best.x:.0f}, {best.y:.0f})', (10, 30), draw_color))
+        if best.distance is not None:
+            overlay.append(('text', f'Distance: {best.distance:.2f} cm', (10, 60), draw_color))
+        if state is not None:
+            overlay.append(('circle', to_frame(state.x, state.y), 5, (255, 255, 255), -1))
+            overlay.append(('text', f'Filtered: ({state.x:.0f}, {state.y:.0f}) '
+                            f'{state.distance:.2f} cm v=({state.vx:.0f}, {state.vy:.0f}) px/s',
+                            (10, 90), draw_color))
+    if result.window is not None:
+        x0, y0, x1, y1 = result.window
+        overlay.append(('rect', (x0, y0), (x1, y1), (0, 255, 0), 1))
+    return overlay
+
+
+# 各トラッキングスクリプト共通のループ
+#   headless: True なら描画・画面表示を一切行わない
+#   preview_mode: ヘッドレス時のプレビュー（None / 'mjpeg' / 'files'）
+#   ball_filters: BallStateEstimator を渡すと平滑化・遅延補償した推定値も出す
+#   color_model: AdaptiveColorRanges を渡すと照明の変化に合わせて色範囲を動かす
+def run_tracker(capture, detector, window_name='Ball Detection', headless=False,
+                preview_mode=None, ball_filters=None, show_mask=True,
+                draw_colors=params.DRAW_COLORS, color_model=None):
+    preview = None
+    if headless and preview_mode:
+        preview = PreviewPublisher(mode=preview_mode, max_fps=5, scale=0.5)
+
+    try:
+        while True:
+            start_time = time.time()
+
+            captured = capture.read()
+            if captured is None:
+                print('フレーム取得に失敗')
+                break
+
+            result = detector.detect(captured.frame)
+            best = result.best
+            if color_model is not None:
+                color_model.update(result)
+
+            # 全ボールを撮影時刻で更新し、best（balls の先頭）の軌跡を現在時刻まで外挿する
+            state = None
+            if ball_filters is not None:
+                track_ids = ball_filters.update(captured.stamp, result.balls)
+                if best is not None and track_ids[0] >= 0:
+                    state = ball_filters.predict(int(track_ids[0]), time.time())
+
+            # 描画内容（ヘッドレスでプレビューを出さないときは作らない）
+            if not headless or (preview is not None and preview.due()):
+                overlay = build_overlay(result, state, draw_colors, detector.frame_point)
+                if headless:
+                    preview.submit(result.frame, overlay)
+                else:
+                    draw_overlay(result.frame, overlay)
+                    if show_mask and result.combined_mask is not None:
+                        cv2.imshow('Combined Mask', result.combined_mask)
+                    cv2.imshow(window_name, result.frame)
+
+            # FPS表示（ターミナル）
+            fps = 1 / max(time.time() - start_time, 1e-6)
+            print(f'FPS: {fps:.2f}', end='\r')
+
+            if not headless and cv2.waitKey(1) & 0xFF == 27:
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        capture.release()
+        detector.close()
+        if preview is not None:
+            preview.close()
+        if not headless:
+            cv2.destroyAllWindows()
+
+    # 段階ごとの平均処理時間
+    print()
+    print('段階ごとの平均処理時間 [ms]:')
+    for stage, ms in detector.timer.mean().items():
+        print(f'  {stage:<10}: {ms:.2f}')
@@ -0,0 +1,233 @@
+import argparse
+import csv
+import sys
+
+import cv2
+import numpy as np
+
+from mypkg import params
+from mypkg.frames import iter_frames
+
+# H, S, V のビン数（H は 0〜179、S と V は 0〜255）
+BINS = (45, 32, 32)
+HIST_RANGES = [0, 180, 0, 256, 0, 256]
+CHANNEL_MAX = (179, 255, 255)
+
+
+# ボール位置のラベル（CSV: frame,color,x,y,radius。ボールのないフレームは color を空にする）
+def load_labels(path):
+    labels = {}
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            balls = labels.setdefault(int(row['frame']), [])
+            if row.get('color', '') != '':
+                balls.append((row['color'], float(row['x']), float(row['y']),
+                              float(row['radius'])))
+    return labels
+
+
+class HsvHistograms:
+    """色ごとのボール画素と背景画素の 3 次元 HSV ヒストグラムを貯める.
+
+    ボールは半径の inner 倍の円の内側、背景は全ボールの outer 倍の円の外側の画素を数える
+    （縁の画素はどちらにも入れない）。ほかの色のボールの画素はその色にとっての背景になるので、
+    ある色の誤検出の数え方には negative() を使う。
+    """
+
+    def __init__(self, colors, bins=BINS, inner=0.85, outer=1.15):
+        self.bins = list(bins)
+        self.inner = inner
+        self.outer = outer
+        self.ball = {color: np.zeros(bins) for color in colors}
+        self.background = np.zeros(bins)
+        self.frames = 0
+
+    def _hist(self, hsv, mask):
+        return cv2.calcHist([hsv], [0, 1, 2], mask, self.bins, HIST_RANGES)
+
+    def add(self, frame, balls):
+        hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+        h, w = hsv.shape[:2]
+        background = np.full((h, w), 255, dtype=np.uint8)
+        for _, x, y, r in balls:
+            cv2.circle(background, (int(x), int(y)), int(r * self.outer), 0, -1)
+        self.background += self._hist(hsv, background)
+
+        mask = np.empty((h, w), dtype=np.uint8)
+        for color, x, y, r in balls:
+            if color not in self.ball:
+                continue
+            mask[:] = 0
+            cv2.circle(mask, (int(x), int(y)), int(r * self.inner), 255, -1)
+            self.ball[color] += self._hist(hsv, mask)
+        self.frames += 1
+
+    # color にとっての背景（ボールのない画素 + ほかの色のボールの画素）
+    def negative(self, color):
+        hist = self.background.copy()
+        for other, ball in self.ball.items():
+            if other != color:
+                hist += ball
+        return hist
+
+
+# 3 次元の累積和（箱の中の合計を 8 回の参照で求められる）
+def integral(hist):
+    table = np.zeros(tuple(n + 1 for n in hist.shape))
+    table[1:, 1:, 1:] = hist.cumsum(0).cumsum(1).cumsum(2)
+    return table
+
+
+def _box_sum(table, h0, h1, s0, s1, v0, v1):
+    h1, s1, v1 = h1 + 1, s1 + 1, v1 + 1
+    return (table[h1, s1, v1] - table[h0, s1, v1] - table[h1, s0, v1] - table[h1, s1, v0]
+            + table[h0, s0, v1] + table[h0, s1, v0] + table[h1, s0, v0] - table[h0, s0, v0])
+
+
+# ビン番号の範囲 (h0, h1, s0, s1, v0, v1) に入る画素数（h0 > h1 は 179→0 をまたぐ範囲）
+#   どの引数も配列にでき、まとめて計算する
+def box_count(table, h0, h1, s0, s1, v0, v1):
+    nh = table.shape[0] - 1
+    plain = _box_sum(table, h0, h1, s0, s1, v0, v1)
+    wrapped = (_box_sum(table, h0, nh - 1, s0, s1, v0, v1)
+               + _box_sum(table, 0, h1, s0, s1, v0, v1))
+    return np.where(np.asarray(h0) <= np.asarray(h1), plain, wrapped)
+
+
+# F 値（beta > 1 なら再現率、beta < 1 なら適合率を重視）
+def f_score(tp, fp, total, beta=1.0):
+    precision = np.divide(tp, tp + fp, out=np.zeros_like(tp, dtype=float), where=tp + fp > 0)
+    recall = tp / total
+    b2 = beta * beta
+    denom = b2 * precision + recall
+    return np.divide((1 + b2) * precision * recall, denom,
+                     out=np.zeros_like(denom, dtype=float), where=denom > 0)
+
+
+# HSV の範囲 ⇔ ビン番号の範囲 [h0, h1, s0, s1, v0, v1]
+def range_to_bins(lower, upper, bins):
+    box = []
+    for c in range(3):
+        box.append(int(lower[c]) * bins[c] // (CHANNEL_MAX[c] + 1))
+        box.append(int(upper[c]) * bins[c] // (CHANNEL_MAX[c] + 1))
+    return box
+
+
+def bins_to_range(box, bins):
+    lower = [box[2 * c] * (CHANNEL_MAX[c] + 1) // bins[c] for c in range(3)]
+    upper = [(box[2 * c + 1] + 1) * (CHANNEL_MAX[c] + 1) // bins[c] - 1 for c in range(3)]
+    return np.array(lower), np.array(upper)
+
+
+def tune_color(ball_hist, background_hist, seeds=(), beta=1.0, max_iter=50):
+    """ヒストグラムだけを使って、F 値が最大になる HSV の範囲を座標降下法で探す.
+
+    1 回の評価は累積和の参照だけなので、画素数にもビン数にもよらない。
+    seeds は初期値にする (lower, upper) の列（ボールのヒストグラムの最頻ビンも必ず試す）。
+    戻り値は (lower, upper, precision, recall)。
+    """
+    bins = ball_hist.shape
+    total = ball_hist.sum()
+    if total == 0:
+        raise ValueError('ボールの画素がありません')
+    ball = integral(ball_hist)
+    background = integral(background_hist)
+
+    def score(box):
+        tp = box_count(ball, *box)
+        fp = box_count(background, *box)
+        return f_score(tp, fp, total, beta)
+
+    peak = np.unravel_index(np.argmax(ball_hist), bins)
+    starts = [[int(peak[0]), int(peak[0]), int(peak[1]), int(peak[1]), int(peak[2]),
+               int(peak[2])]]
+    starts += [range_to_bins(lower, upper, bins) for lower, upper in seeds]
+
+    best_box, best_score = None, -1.0
+    for box in starts:
+        current = float(score(box))
+        for _ in range(max_iter):
+            improved = False
+            # 6 つの端を 1 つずつ、取りうる全ての値をまとめて評価して動かす
+            for k in range(6):
+                c = k // 2
+                candidates = np.arange(bins[c])
+                trial = [np.full(bins[c], v) for v in box]
+                trial[k] = candidates
+                scores = score(trial)
+                if c > 0:
+                    # S と V は下限 <= 上限（H だけは折り返しを許す）
+                    lo, hi = (candidates, box[k + 1]) if k % 2 == 0 else (box[k - 1], candidates)
+                    scores = np.where(lo <= hi, scores, -1.0)
+                i = int(np.argmax(scores))
+                if scores[i] > current + 1e-12:
+                    box[k] = int(candidates[i])
+                    current = float(scores[i])
+                    improved = True
+            if not improved:
+                break
+        if current > best_score:
+            best_box, best_score = list(box), current
+
+    tp = float(box_count(ball, *best_box))
+    fp = float(box_count(background, *best_box))
+    lower, upper = bins_to_range(best_box, bins)
+    precision = tp / (tp + fp) if tp + fp > 0 else 0.0
+    return lower, upper, precision, tp / total
+
+
+# トラッカーにそのまま貼れる color_ranges の Python コード
+def format_color_ranges(ranges):
+    lines = ['color_ranges = {']
+    items = list(ranges.items())
+    for i, (color, (lower, upper)) in enumerate(items):
+        comma = ',' if i < len(items) - 1 else ''
+        lines.append(f'    "{color}": (np.array({list(map(int, lower))}), '
+                     f'np.array({list(map(int, upper))})){comma}')
+    lines.append('}')
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='ボール位置のラベル付きフレームから HSV の範囲を自動で求め、color_ranges を出力する')
+    parser.add_argument('source', help='録画した動画ファイルまたは画像ディレクトリ')
+    parser.add_argument('labels', help='ボール位置の CSV (frame,color,x,y,radius)')
+    parser.add_argument('--bins', type=int, nargs=3, default=BINS, metavar=('H', 'S', 'V'))
+    parser.add_argument('--beta', type=float, default=1.0,
+                        help='F 値の beta（1 より大きいと見逃しを、小さいと誤検出を減らす方を重視）')
+    parser.add_argument('--no-seed', action='store_true',
+                        help='params.COLOR_RANGES を初期値に使わない')
+    args = parser.parse_args()
+
+    labels = load_labels(args.labels)
+    colors = sorted({ball[0] for balls in labels.values() for ball in balls})
+    if not colors:
+        print(f'{args.labels} にボールのラベルがありません', file=sys.stderr)
+        return 1
+
+    hists = HsvHistograms(colors, args.bins)
+    for index, frame in iter_frames(args.source):
+        if index in labels:
+            hists.add(frame, labels[index])
+    if hists.frames == 0:
+        print(f'{args.source} にラベル付きのフレームがありません', file=sys.stderr)
+        return 1
+
+    ranges = {}
+    for color in colors:
+        seeds = []
+        if not args.no_seed and color in params.COLOR_RANGES:
+            seeds.append(params.COLOR_RANGES[color])
+        lower, upper, precision, recall = tune_color(hists.ball[color], hists.negative(color),
+                                                     seeds, args.beta)
+        ranges[color] = (lower, upper)
+        print(f'# {color}: 適合率 {precision:.3f}, 再現率 {recall:.3f}')
+
+    print(f'# {hists.frames} フレームから求めた範囲（H の下限 > 上限は 179→0 をまたぐ範囲）')
+    print(format_color_ranges(ranges))
+    return 0
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+from collections import namedtuple
+
+import numpy as np
+
+# 推定したボールの状態（位置 [px]、距離 [cm]、それぞれの速度、推定時刻）
+BallState = namedtuple('BallState', ['x', 'y', 'distance', 'vx', 'vy', 'vdistance', 'stamp'])
+
+# 観測を軌跡に割り当てるゲート（自由度 3 のカイ二乗分布の 99% 点）
+GATE_CHI2 = 11.34
+
+
+# 1 次元分の状態遷移行列とプロセスノイズ（単位分散あたり）
+def _motion_model(order, dt):
+    if order == 2:
+        # 等速モデル（加速度を白色ノイズとみなす）
+        f = np.array([[1.0, dt],
+                      [0.0, 1.0]])
+        q = np.array([[dt ** 3 / 3, dt ** 2 / 2],
+                      [dt ** 2 / 2, dt]])
+    else:
+        # 等加速度モデル（加加速度を白色ノイズとみなす）
+        f = np.array([[1.0, dt, dt ** 2 / 2],
+                      [0.0, 1.0, dt],
+                      [0.0, 0.0, 1.0]])
+        q = np.array([[dt ** 5 / 20, dt ** 4 / 8, dt ** 3 / 6],
+                      [dt ** 4 / 8, dt ** 3 / 3, dt ** 2 / 2],
+                      [dt ** 3 / 6, dt ** 2 / 2, dt]])
+    return f, q
+
+
+class BallKalman:
+    """ボール 1 個分の (x, y, 距離) を推定するカルマンフィルタ.
+
+    model は 'cv'（等速）か 'ca'（等加速度）。
+    noise_std は cv なら加速度、ca なら加加速度の標準偏差 (x[px], y[px], 距離[cm])。
+    """
+
+    def __init__(self, model='cv', noise_std=(800.0, 800.0, 100.0),
+                 measurement_std=(2.0, 2.0, 1.0), initial_velocity_std=(500.0, 500.0, 100.0)):
+        if model not in ('cv', 'ca'):
+            raise ValueError(f'model は cv か ca です: {model}')
+        self.order = 2 if model == 'cv' else 3
+        self.n = 3 * self.order
+        self.noise_var = np.diag(np.square(noise_std))
+        self.R = np.diag(np.square(measurement_std))
+        self.H = np.zeros((3, self.n))
+        self.H[:, :3] = np.eye(3)
+        self.initial_velocity_var = np.square(initial_velocity_std)
+        self.x = None
+        self.P = None
+        self.stamp = None
+
+    @property
+    def initialized(self):
+        return self.x is not None
+
+    def _matrices(self, dt):
+        f, q = _motion_model(self.order, dt)
+        return np.kron(f, np.eye(3)), np.kron(q, self.noise_var)
+
+    def _predict(self, stamp):
+        dt = stamp - self.stamp
+        if dt <= 0:
+            return
+        F, Q = self._matrices(dt)
+        self.x = F @ self.x
+        self.P = F @ self.P @ F.T + Q
+        self.stamp = stamp
+
+    # 撮影時刻 stamp の観測 (x, y, 距離) で更新する
+    def update(self, stamp, center, distance):
+        z = np.array([center[0], center[1], distance], dtype=np.float64)
+        if self.x is None:
+            self.x = np.zeros(self.n)
+            self.x[:3] = z
+            self.P = np.zeros((self.n, self.n))
+            self.P[:3, :3] = self.R
+            self.P[3:6, 3:6] = np.diag(self.initial_velocity_var)
+            if self.order == 3:
+                self.P[6:, 6:] = np.diag(self.initial_velocity_var * 10)
+            self.stamp = stamp
+            return
+
+        self._predict(stamp)
+        y = z - self.H @ self.x
+        S = self.H @ self.P @ self.H.T + self.R
+        K = self.P @ self.H.T @ np.linalg.inv(S)
+        self.x = self.x + K @ y
+        self.P = (np.eye(self.n) - K @ self.H) @ self.P
+
+    # 観測 (x, y, 距離) と時刻 stamp での予測とのマハラノビス距離の 2 乗（フィルタ自体は変更しない）
+    def innovation_distance(self, stamp, center, distance):
+        z = np.array([center[0], center[1], distance], dtype=np.float64)
+        F, Q = self._matrices(max(0.0, stamp - self.stamp))
+        x = F @ self.x
+        P = F @ self.P @ F.T + Q
+        y = z - self.H @ x
+        S = self.H @ P @ self.H.T + self.R
+        return float(y @ np.linalg.solve(S, y))
+
+    # 時刻 stamp まで外挿した状態を返す（フィルタ自体は変更しない）
+    def predict(self, stamp):
+        if self.x is None:
+            return None
+        dt = max(0.0, stamp - self.stamp)
+        F, _ = self._matrices(dt)
+        x = F @ self.x
+        return BallState(x[0], x[1], x[2], x[3], x[4], x[5], stamp)
+
+
+class BallStateEstimator:
+    """ボールごとに BallKalman を持ち、観測を予測位置の近い軌跡に割り当てる.
+
+    update() には detect() の balls（mypkg.balls の構造化配列）を渡す。各ボールは同じ色の
+    軌跡のうち、予測とのマハラノビス距離の 2 乗が gate 以下で一番近いものに割り当て、
+    どれにも入らなければ新しい軌跡を始める。timeout 秒観測がない軌跡は捨てる。
+    距離の求まっていないボールは使わない。
+    """
+
+    def __init__(self, timeout=0.5, gate=GATE_CHI2, **kalman_args):
+        self.timeout = timeout
+        self.gate = gate
+        self.kalman_args = kalman_args
+        self.tracks = {}  # 軌跡の番号 → (色番号, BallKalman)
+        self.next_id = 0
+
+    def _retire(self, now):
+        for track_id in [track_id for track_id, (_, kf) in self.tracks.items()
+                         if now - kf.stamp > self.timeout]:
+            del self.tracks[track_id]
+
+    # 撮影時刻 stamp の balls で更新し、balls と同じ順に軌跡の番号を返す（使わないボールは -1）
+    def update(self, stamp, balls):
+        self._retire(stamp)
+        track_ids = np.full(len(balls), -1, dtype=np.int64)
+        measurements = {}
+        pairs = []
+        for i, ball in enumerate(balls):
+            if np.isnan(ball['distance']):
+                continue
+            center = (float(ball['x']), float(ball['y']))
+            measurements[i] = center, float(ball['distance'])
+            for track_id, (color, kf) in self.tracks.items():
+                if color != ball['color']:
+                    continue
+                d2 = kf.innovation_distance(stamp, *measurements[i])
+                if d2 <= self.gate:
+                    pairs.append((d2, i, track_id))
+
+        # 近い組から順に、どちらもまだ使っていなければ割り当てる
+        assigned = set()
+        for _, i, track_id in sorted(pairs):
+            if track_ids[i] < 0 and track_id not in assigned:
+                track_ids[i] = track_id
+                assigned.add(track_id)
+
+        for i, (center, distance) in measurements.items():
+            if track_ids[i] < 0:
+                track_ids[i] = self.next_id
+                self.tracks[self.next_id] = (int(balls['color'][i]),
+                                             BallKalman(**self.kalman_args))
+                self.next_id += 1
+            self.tracks[int(track_ids[i])][1].update(stamp, center, distance)
+        return track_ids
+
+    # 軌跡 track_id を現在時刻 now まで外挿した状態。ないか観測が古すぎるときは None
+    def predict(self, track_id, now):
+        track = self.tracks.get(track_id)
+        if track is None or now - track[1].stamp > self.timeout:
+            return None
+        return track[1].predict(now)
+
+    # 生きている全軌跡を now まで外挿した {軌跡の番号: (色番号, BallState)}
+    def states(self, now):
+        return {track_id: (color, kf.predict(now)) for track_id, (color, kf) in self.tracks.items()
+                if now - kf.stamp <= self.timeout}
@@ -0,0 +1,159 @@
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from mypkg.frames import list_images
+
+# 縮小率 → imdecode のフラグ（libjpeg が DCT 係数の段階で縮小するので、全画素を復元しない）
+REDUCED_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+
+# 縮小した画像用のカメラ行列（焦点距離と主点を 1/scale にする）
+def scale_camera_matrix(camera_matrix, scale):
+    scaled = np.array(camera_matrix, dtype=np.float64)
+    scaled[:2] /= scale
+    return scaled
+
+
+class MjpegDecoder:
+    """MJPEG の 1 フレーム（JPEG のバイト列）を 1/scale の大きさで直接デコードする.
+
+    roi (x, y, 幅, 高さ) は元の解像度の座標で、縮小後の画像から切り出したビューを返す
+    （OpenCV の imdecode は部分デコードや出力先の指定ができないので、切り出しはデコード後）。
+    """
+
+    def __init__(self, scale=2):
+        if scale not in REDUCED_FLAGS:
+            raise ValueError(f'scale は {sorted(REDUCED_FLAGS)} のどれかにしてください')
+        self.scale = scale
+        self.flag = REDUCED_FLAGS[scale]
+
+    def decode(self, data, roi=None):
+        frame = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), self.flag)
+        if frame is None or roi is None:
+            return frame
+        x, y, w, h = roi
+        s = self.scale
+        return frame[y // s:(y + h + s - 1) // s, x // s:(x + w + s - 1) // s]
+
+    def read_file(self, path, roi=None):
+        return self.decode(np.fromfile(path, dtype=np.uint8), roi)
+
+
+class MjpegCapture:
+    """MJPG で開いたカメラから JPEG のまま受け取り、MjpegDecoder で縮小デコードする.
+
+    cv2.VideoCapture と同じ read() / grab() / retrieve() / get() / release() を持つので
+    ThreadedCapture に渡せる。
+    read(image)・retrieve(image) は image と同じ大きさならそこに書いて返す（取り込みのバッファを使い回す）。
+    ドライバがデコード済みのフレームを返すとき（MJPG にならなかったなど）は縮小だけ行う。
+    """
+
+    def __init__(self, cap, decoder):
+        self.cap = cap
+        self.decoder = decoder
+        # V4L2 では RGB 変換を切ると MJPG のバイト列がそのまま (1, N) の配列で返る
+        cap.set(cv2.CAP_PROP_CONVERT_RGB, 0)
+        self.compressed = None
+
+    def read(self, image=None):
+        if not self.grab():
+            return False, None
+        return self.retrieve(image)
+
+    # JPEG のバイト列を取り込むだけ（デコードは retrieve() で行う）
+    def grab(self):
+        return self.cap.grab()
+
+    def retrieve(self, image=None):
+        ret, data = self.cap.retrieve()
+        if not ret:
+            return False, None
+        if self.compressed is None:
+            self.compressed = data.ndim == 2 and data.shape[0] == 1
+            if not self.compressed:
+                print('警告: カメラが JPEG のまま渡さないので、デコード後に縮小します')
+        if self.compressed:
+            frame = self.decoder.decode(data)
+            if frame is None:
+                return False, None
+            # imdecode は出力先を取れないので、渡されたバッファ（リングバッファのスロット）に写す
+            if image is not None and image.shape == frame.shape:
+                np.copyto(image, frame)
+                return True, image
+            return True, frame
+        s = self.decoder.scale
+        frame = cv2.resize(data, (data.shape[1] // s, data.shape[0] // s), dst=image,
+                           interpolation=cv2.INTER_AREA)
+        return True, frame
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def get(self, prop_id):
+        return self.cap.get(prop_id)
+
+    def release(self):
+        self.cap.release()
+
+
+# 全画素デコードしてから縮小する従来の方法
+def decode_then_resize(data, scale):
+    frame = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if scale == 1:
+        return frame
+    return cv2.resize(frame, (frame.shape[1] // scale, frame.shape[0] // scale),
+                      interpolation=cv2.INTER_AREA)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='JPEG フレームのディレクトリで、縮小デコードと全画素デコード + 縮小の速さを比べる')
+    parser.add_argument('images', help='MJPEG のフレームを保存した JPEG のディレクトリ')
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--roi', type=int, nargs=4, default=None, metavar=('X', 'Y', 'W', 'H'),
+                        help='切り出す範囲（元の解像度の座標）')
+    parser.add_argument('--max-frames', type=int, default=None)
+    args = parser.parse_args()
+
+    paths = [p for p in list_images(args.images)
+             if p.lower().endswith(('.jpg', '.jpeg'))][:args.max_frames]
+    if not paths:
+        print(f'{args.images} に JPEG がありません')
+        return 1
+    # ファイルの読み込みは測らないように、先にバイト列をメモリに載せる
+    frames = [np.fromfile(p, dtype=np.uint8) for p in paths]
+
+    print(f'フレーム数: {len(frames)}')
+    print('scale  出力サイズ    縮小デコード[ms]  全デコード+縮小[ms]  速度比  平均画素差')
+    for scale in args.scales:
+        decoder = MjpegDecoder(scale)
+        start = time.perf_counter()
+        reduced = [decoder.decode(data, args.roi) for data in frames]
+        reduced_ms = (time.perf_counter() - start) / len(frames) * 1000
+
+        start = time.perf_counter()
+        resized = [decode_then_resize(data, scale) for data in frames]
+        resized_ms = (time.perf_counter() - start) / len(frames) * 1000
+
+        # 画質の目安: 同じ範囲を比べる
+        a, b = reduced[0], resized[0]
+        if args.roi is not None:
+            x, y, w, h = args.roi
+            b = b[y // scale:(y + h + scale - 1) // scale, x // scale:(x + w + scale - 1) // scale]
+        h, w = min(a.shape[0], b.shape[0]), min(a.shape[1], b.shape[1])
+        diff = np.mean(cv2.absdiff(a[:h, :w], b[:h, :w]))
+        print(f'1/{scale:<4} {a.shape[1]:>5}x{a.shape[0]:<6} {reduced_ms:16.2f}  '
+              f'{resized_ms:19.2f}  {resized_ms / reduced_ms:6.2f}  {diff:10.2f}')
+    return 0
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+import multiprocessing as mp
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+from mypkg.blobs import circles_from_mask
+
+# ワーカープロセス側の状態（初期化時に 1 回だけ作る）
+_worker = {}
+
+
+def _init_worker(shm_name, kernel_size, open_iterations, min_area, method, candidate_args):
+    # 各ワーカーは 1 色分を 1 スレッドで処理する（コア数以上にスレッドを増やさない）
+    cv2.setNumThreads(1)
+    _worker['shm'] = shared_memory.SharedMemory(name=shm_name)
+    _worker['kernel'] = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (kernel_size, kernel_size))
+    _worker['open_iterations'] = open_iterations
+    _worker['min_area'] = min_area
+    _worker['method'] = method
+    _worker['candidate_args'] = candidate_args
+
+
+# 共有メモリ上のラベル画像から 1 色分の円を探す（受け渡すのは小さなタプルだけ）
+def _process_color(task):
+    h, w, label, color, offset = task
+    labels = np.ndarray((h, w), dtype=np.uint8, buffer=_worker['shm'].buf)
+    mask = cv2.compare(labels, label, cv2.CMP_EQ)
+    mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, _worker['kernel'],
+                            iterations=_worker['open_iterations'])
+    if _worker['method'] == 'contour':
+        return circles_from_mask(mask, color, offset, _worker['min_area'],
+                                 **_worker['candidate_args'])
+    mask = cv2.Canny(mask, 50, 150)
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE,
+                                   offset=offset)
+    circles = []
+    for cnt in contours:
+        area = cv2.contourArea(cnt)
+        if area < _worker['min_area']:
+            continue
+        (x, y), radius = cv2.minEnclosingCircle(cnt)
+        circles.append((x, y, radius, color, area, area))
+    return circles
+
+
+class ParallelMaskProcessor:
+    """色ごとのオープニング・輪郭抽出・円の当てはめをプロセスプールで並列に行う.
+
+    ラベル画像（ColorClassifier.classify の出力）は共有メモリに直接書かせ、
+    ワーカーには画像ではなく (高さ, 幅, ラベル, 色, オフセット) だけを渡す。
+    method は 'contour' か 'canny'（ハフ変換には対応しない）。
+
+    共有メモリとプールは frame_size (幅, 高さ) で最初に作る。fork はスレッドを持つ
+    プロセスでは安全でないので、カメラの取り込みやプレビューのスレッドを起動する前に作ること。
+    トラッカーのスクリプトには __main__ の判定がなく spawn / forkserver では読み直されて
+    しまうので既定は fork。ROS ノードのようにすでにスレッドがある場合は forkserver を使う。
+    """
+
+    def __init__(self, colors, labels_of, workers=None, kernel_size=5, open_iterations=2,
+                 min_area=300, method='contour', candidate_args=None, frame_size=(1280, 720),
+                 start_method='fork'):
+        if method not in ('contour', 'canny'):
+            raise ValueError(f'並列処理できる method は contour か canny です: {method}')
+        self.colors = list(colors)
+        self.labels_of = labels_of
+        self.workers = workers or len(self.colors)
+        self.frame_size = tuple(frame_size)
+        self.shm = shared_memory.SharedMemory(create=True,
+                                              size=self.frame_size[0] * self.frame_size[1])
+        ctx = mp.get_context(start_method)
+        self.pool = ctx.Pool(self.workers, initializer=_init_worker,
+                             initargs=(self.shm.name, kernel_size, open_iterations, min_area,
+                                       method, candidate_args or {}))
+
+    # classify の出力先にする共有メモリ上のバッファ
+    def labels_buffer(self, shape):
+        h, w = shape[:2]
+        if h * w > self.shm.size:
+            raise ValueError(f'フレーム {w}x{h} が並列処理の frame_size {self.frame_size} '
+                             'より大きいです')
+        return np.ndarray((h, w), dtype=np.uint8, buffer=self.shm.buf)
+
+    # 共有メモリ上のラベル画像（labels_buffer に書いたもの）から全色の円を探す
+    def process(self, shape, offset=(0, 0)):
+        h, w = shape[:2]
+        tasks = [(h, w, self.labels_of[color], color, tuple(offset)) for color in self.colors]
+        circles = []
+        for found in self.pool.map(_process_color, tasks, chunksize=1):
+            circles.extend(found)
+        return circles
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
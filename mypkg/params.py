@@ -0,0 +1,29 @@
+import numpy as np
+
+# 実際のボール直径（cm）
+BALL_DIAMETER = 5.5
+
+# カメラキャリブレーションパラメータ（/dev/video4, 1280x720）
+CAMERA_MATRIX = np.array([
+    [750.10059546,   0.0,        704.54913907],
+    [0.0,            746.54075486, 445.7714058],
+    [0.0,            0.0,          1.0]
+])
+
+DIST_COEFFS = np.array([0.04739503, -0.07422041, 0.00880341, 0.0123376, 0.02295108])
+
+# CAMERA_MATRIX を較正した解像度（幅, 高さ）
+CAMERA_IMAGE_SIZE = (1280, 720)
+
+# HSV色範囲（赤・青・黄）
+COLOR_RANGES = {
+    'red': (np.array([149, 46, 100]), np.array([179, 171, 255])),
+    'blue': (np.array([90, 90, 100]), np.array([120, 225, 255])),
+    'yellow': (np.array([10, 70, 140]), np.array([40, 135, 255]))
+}
+
+DRAW_COLORS = {
+    'red': (0, 0, 255),
+    'blue': (255, 0, 0),
+    'yellow': (0, 255, 255)
+}
@@ -0,0 +1,156 @@
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+
+BOUNDARY = 'frame'
+
+
+# 描画内容のリストを画像に描く（座標は元画像のもので、scale 倍して描く）
+#   ('circle', (x, y), 半径, 色, 太さ)
+#   ('rect', (x0, y0), (x1, y1), 色, 太さ)
+#   ('text', 文字列, (x, y), 色)
+def draw_overlay(img, overlay, scale=1.0):
+    font_scale = 0.7 * max(scale, 0.5)
+    for item in overlay:
+        kind = item[0]
+        if kind == 'circle':
+            _, (x, y), radius, color, thickness = item
+            cv2.circle(img, (int(x * scale), int(y * scale)), max(1, int(radius * scale)),
+                       color, thickness)
+        elif kind == 'rect':
+            _, (x0, y0), (x1, y1), color, thickness = item
+            cv2.rectangle(img, (int(x0 * scale), int(y0 * scale)),
+                          (int(x1 * scale), int(y1 * scale)), color, thickness)
+        elif kind == 'text':
+            _, text, (x, y), color = item
+            cv2.putText(img, text, (int(x * scale), int(y * scale)),
+                        cv2.FONT_HERSHEY_SIMPLEX, font_scale, color, 2)
+    return img
+
+
+class PreviewPublisher:
+    """検出処理とは別のスレッドで、縮小したプレビューを一定間隔で出力する.
+
+    mode='mjpeg' なら http://host:port/ に MJPEG ストリームを配信し、
+    mode='files' なら out_dir/preview.jpg を定期的に書き換える。
+    検出側は submit() を呼ぶだけで、描画・エンコード・出力はすべてこのスレッドで行う。
+    """
+
+    def __init__(self, mode='mjpeg', max_fps=5.0, scale=0.5, host='127.0.0.1', port=8080,
+                 out_dir='preview', quality=70):
+        if mode not in ('mjpeg', 'files'):
+            raise ValueError(f'mode は mjpeg か files です: {mode}')
+        self.mode = mode
+        self.period = 1.0 / max_fps
+        self.scale = scale
+        self.out_dir = out_dir
+        self.quality = quality
+        self.next_time = 0.0
+
+        self.cond = threading.Condition()
+        self.pending = None
+        self.jpeg = None
+        self.jpeg_seq = 0
+        self.running = True
+
+        self.server = None
+        if mode == 'mjpeg':
+            self.server = ThreadingHTTPServer((host, port), self._make_handler())
+            self.server.daemon_threads = True
+            threading.Thread(target=self.server.serve_forever, daemon=True).start()
+            print(f'プレビュー: http://{host}:{port}/')
+        else:
+            os.makedirs(out_dir, exist_ok=True)
+
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    # 次のプレビューを出す時刻になったか
+    def due(self):
+        return time.time() >= self.next_time
+
+    # フレームと描画内容を渡す（間隔が空いていなければ何もしない）
+    def submit(self, frame, overlay=()):
+        now = time.time()
+        if now < self.next_time:
+            return False
+        self.next_time = now + self.period
+        # 縮小はコピーも兼ねるので、元のフレームはすぐに使い回してよい
+        small = cv2.resize(frame, None, fx=self.scale, fy=self.scale,
+                           interpolation=cv2.INTER_NEAREST)
+        with self.cond:
+            self.pending = (small, list(overlay))
+            self.cond.notify_all()
+        return True
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while self.running and self.pending is None:
+                    self.cond.wait()
+                if not self.running:
+                    return
+                small, overlay = self.pending
+                self.pending = None
+
+            draw_overlay(small, overlay, self.scale)
+            ok, buf = cv2.imencode('.jpg', small, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+            if not ok:
+                continue
+            data = buf.tobytes()
+
+            if self.mode == 'files':
+                path = os.path.join(self.out_dir, 'preview.jpg')
+                tmp_path = path + '.tmp'
+                with open(tmp_path, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            else:
+                with self.cond:
+                    self.jpeg = data
+                    self.jpeg_seq += 1
+                    self.cond.notify_all()
+
+    def _make_handler(self):
+        publisher = self
+
+        class MjpegHandler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                self.send_response(200)
+                self.send_header('Content-Type',
+                                 f'multipart/x-mixed-replace; boundary={BOUNDARY}')
+                self.end_headers()
+                seq = 0
+                try:
+                    while publisher.running:
+                        with publisher.cond:
+                            while publisher.running and publisher.jpeg_seq == seq:
+                                publisher.cond.wait(1.0)
+                            data = publisher.jpeg
+                            seq = publisher.jpeg_seq
+                        if data is None:
+                            continue
+                        self.wfile.write(f'--{BOUNDARY}\r\n'.encode())
+                        self.wfile.write(b'Content-Type: image/jpeg\r\n')
+                        self.wfile.write(f'Content-Length: {len(data)}\r\n\r\n'.encode())
+                        self.wfile.write(data)
+                        self.wfile.write(b'\r\n')
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            def log_message(self, *args):
+                pass
+
+        return MjpegHandler
+
+    def close(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+        if self.server is not None:
+            self.server.shutdown()
+        self.thread.join(timeout=1.0)
@@ -0,0 +1,87 @@
+import cv2
+
+from mypkg.blobs import circles_from_mask
+from mypkg.color_lut import ColorClassifier
+
+
+class PyramidDetector:
+    """縮小画像で候補を探し、元解像度の小さなパッチで中心と半径を求め直す.
+
+    level は縮小の段数（0: 縮小しない、1: 1/2、2: 1/4）。
+    元解像度の処理は BallDetector の method='contour' と同じ設定（blur_size, kernel_size,
+    open_iterations, candidate_args）で行う。縮小画像ではピラミッドの平滑化をブラーの代わりにし、
+    オープニングは 3x3 にする。最終的な半径は元解像度の minEnclosingCircle なので、
+    距離計算の精度は変わらない。
+    """
+
+    def __init__(self, color_ranges, level=1, min_area=300, max_candidates=5,
+                 margin=1.5, pad=8, blur_size=5, kernel_size=5, open_iterations=2,
+                 candidate_args=None):
+        self.classifier = ColorClassifier(color_ranges)
+        self.colors = list(color_ranges)
+        self.level = level
+        self.scale = 2 ** level
+        self.min_area = min_area
+        self.max_candidates = max_candidates
+        self.margin = margin
+        self.pad = pad
+        self.blur_size = blur_size
+        self.open_iterations = open_iterations
+        self.candidate_args = dict(candidate_args or {})
+        self.kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (kernel_size, kernel_size))
+        self.coarse_kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
+
+    # HSV 画像から色ごとに円を探す（座標は offset を足したもの）
+    #   戻り値は blobs.circles_from_mask と同じ (x, y, 半径, 色, 面積, 点数)
+    def _find_circles(self, hsv, colors, kernel, min_area, max_candidates, offset=(0, 0)):
+        labels, _ = self.classifier.classify(hsv)
+        args = dict(self.candidate_args, max_candidates=max_candidates)
+        circles = []
+        for color in colors:
+            mask = self.classifier.color_mask(labels, color)
+            mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, kernel,
+                                    iterations=self.open_iterations)
+            circles.extend(circles_from_mask(mask, color, offset, min_area, **args))
+        return circles
+
+    # 候補の周りだけを元解像度で処理し直す
+    def _refine(self, frame, x, y, radius, color):
+        h, w = frame.shape[:2]
+        half = radius * self.margin + self.pad
+        x0, y0 = max(0, int(x - half)), max(0, int(y - half))
+        x1, y1 = min(w, int(x + half) + 1), min(h, int(y + half) + 1)
+        if x1 - x0 < 8 or y1 - y0 < 8:
+            return None
+
+        patch = cv2.medianBlur(frame[y0:y1, x0:x1], self.blur_size)
+        hsv = cv2.cvtColor(patch, cv2.COLOR_BGR2HSV)
+        # パッチ内で一番点数の高い成分を採用
+        circles = self._find_circles(hsv, [color], self.kernel, self.min_area, 1, (x0, y0))
+        return circles[0] if circles else None
+
+    # 検出した円 (x, y, 半径, 色, 面積, 点数) を半径の大きい順に返す
+    def detect(self, frame):
+        if self.level == 0:
+            blurred = cv2.medianBlur(frame, self.blur_size)
+            hsv = cv2.cvtColor(blurred, cv2.COLOR_BGR2HSV)
+            circles = self._find_circles(hsv, self.colors, self.kernel, self.min_area,
+                                         self.candidate_args.get('max_candidates', 3))
+            return sorted(circles, key=lambda c: c[2], reverse=True)
+
+        # ガウシアンピラミッドで縮小（平滑化も兼ねる）
+        small = frame
+        for _ in range(self.level):
+            small = cv2.pyrDown(small)
+        hsv = cv2.cvtColor(small, cv2.COLOR_BGR2HSV)
+        coarse = self._find_circles(hsv, self.colors, self.coarse_kernel,
+                                    self.min_area / (self.scale ** 2), self.max_candidates)
+        coarse.sort(key=lambda c: c[2], reverse=True)
+
+        results = []
+        for x, y, radius, color, _, _ in coarse[:self.max_candidates]:
+            refined = self._refine(frame, x * self.scale, y * self.scale,
+                                   radius * self.scale, color)
+            if refined is not None:
+                results.append(refined)
+        results.sort(key=lambda c: c[2], reverse=True)
+        return results
@@ -0,0 +1,64 @@
+import argparse
+import time
+
+import numpy as np
+
+from mypkg import params
+from mypkg.detector import BallDetector
+from mypkg.frames import load_frames
+
+
+# 1 つの縮小段数で全フレームを処理し、FPS と距離の列を返す
+def run_level(frames, level):
+    detector = BallDetector(params.COLOR_RANGES, pyramid_level=level,
+                            camera_matrix=params.CAMERA_MATRIX,
+                            ball_diameter=params.BALL_DIAMETER)
+    distances = []
+    start = time.perf_counter()
+    for frame in frames:
+        best = detector.detect(frame).best
+        distances.append(best.distance if best is not None else None)
+    elapsed = time.perf_counter() - start
+    return len(frames) / elapsed, distances
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ピラミッド検出の段数ごとの FPS と距離誤差を比較する')
+    parser.add_argument('source', help='録画した動画ファイルまたは画像ディレクトリ')
+    parser.add_argument('--levels', type=int, nargs='+', default=[0, 1, 2])
+    parser.add_argument('--true-distance', type=float, default=None,
+                        help='実際の距離 [cm]。省略時は縮小なし (level 0) の結果を基準にする')
+    parser.add_argument('--max-frames', type=int, default=None)
+    args = parser.parse_args()
+
+    frames = load_frames(args.source, args.max_frames)
+    if not frames:
+        print(f'{args.source} からフレームを読み込めませんでした')
+        return 1
+
+    levels = sorted(set(args.levels) | ({0} if args.true_distance is None else set()))
+    results = {level: run_level(frames, level) for level in levels}
+
+    if args.true_distance is None:
+        reference = results[0][1]
+    else:
+        reference = [args.true_distance] * len(frames)
+
+    print(f'フレーム数: {len(frames)}')
+    print('level  FPS      検出率   平均絶対誤差[cm]  最大絶対誤差[cm]')
+    for level in levels:
+        fps, distances = results[level]
+        errors = np.array([d - r for d, r in zip(distances, reference)
+                           if d is not None and r is not None])
+        detected = sum(d is not None for d in distances) / len(frames) * 100
+        if len(errors) > 0:
+            mae = f'{np.mean(np.abs(errors)):.3f}'
+            max_err = f'{np.max(np.abs(errors)):.3f}'
+        else:
+            mae = max_err = '-'
+        print(f'{level:<6} {fps:<8.1f} {detected:<7.1f}% {mae:<17} {max_err}')
+    return 0
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+class RoiTracker:
+    """前回の検出結果から次のボール位置を予測し、探索範囲を絞る.
+
+    window() が None を返したときはフレーム全体を探索する。
+    max_misses 回続けて見失うか、full_every フレームごとに全体探索に戻る。
+    """
+
+    def __init__(self, window_scale=3.0, min_half_size=40, max_misses=3, full_every=30):
+        self.window_scale = window_scale
+        self.min_half_size = min_half_size
+        self.max_misses = max_misses
+        self.full_every = full_every
+        self.reset()
+
+    def reset(self):
+        self.center = None
+        self.velocity = (0.0, 0.0)
+        self.radius = 0.0
+        self.misses = 0
+        self.frames_since_full = 0
+
+    @property
+    def locked(self):
+        return self.center is not None
+
+    # 次のフレームで探索する範囲 (x0, y0, x1, y1)。全体探索なら None
+    def window(self, frame_shape):
+        if not self.locked or self.frames_since_full >= self.full_every:
+            return None
+
+        h, w = frame_shape[:2]
+        # 等速運動を仮定して位置を予測（見失っている間も進める）
+        steps = self.misses + 1
+        px = self.center[0] + self.velocity[0] * steps
+        py = self.center[1] + self.velocity[1] * steps
+        speed = max(abs(self.velocity[0]), abs(self.velocity[1]))
+        half = max(self.min_half_size, self.window_scale * self.radius + speed * steps)
+
+        x0 = max(0, int(px - half))
+        y0 = max(0, int(py - half))
+        x1 = min(w, int(px + half) + 1)
+        y1 = min(h, int(py + half) + 1)
+        if x1 - x0 < 2 or y1 - y0 < 2:
+            return None
+        return x0, y0, x1, y1
+
+    # 検出結果（フレーム全体の座標）で状態を更新する。見失ったときは center=None
+    def update(self, center, radius, full_frame):
+        if full_frame:
+            self.frames_since_full = 0
+        else:
+            self.frames_since_full += 1
+
+        if center is None:
+            self.misses += 1
+            if self.misses > self.max_misses:
+                self.reset()
+            return
+
+        if self.center is not None:
+            steps = self.misses + 1
+            self.velocity = ((center[0] - self.center[0]) / steps,
+                             (center[1] - self.center[1]) / steps)
+        self.center = (float(center[0]), float(center[1]))
+        self.radius = float(radius)
+        self.misses = 0
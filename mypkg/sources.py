@@ -0,0 +1,289 @@
+import argparse
+import os
+import struct
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from mypkg.capture import DEFAULT_PROFILE, CapturedFrame, ThreadedCapture, open_capture
+from mypkg.frames import list_images
+from mypkg.mjpeg import REDUCED_FLAGS, MjpegCapture, MjpegDecoder
+
+# 生フレーム録画ファイルのヘッダ（マジック、版、幅、高さ、チャンネル数）
+RAW_MAGIC = b'BTRAW\x00\x00\x00'
+RAW_VERSION = 1
+RAW_HEADER = struct.Struct('<8sIIII')
+RAW_HEADER_SIZE = 64
+
+
+# 1 レコード分の型（撮影時刻 + フレーム）。レコードは固定長で並ぶ
+def raw_record_dtype(width, height, channels):
+    return np.dtype([('stamp', '<f8'), ('frame', np.uint8, (height, width, channels))])
+
+
+# ライブカメラ（別スレッドで取り込み、最新フレームだけを渡す）
+#   width, height, fps を省略した項目は設定せず、ドライバの既定のまま
+#   どれかを指定したときは profile の fourcc・バッファ枚数も設定する（既定は MJPG、1 枚）
+#   decode_scale が 2, 4, 8 なら JPEG のまま受け取って 1/decode_scale に縮小デコードする
+#   （BallDetector にも同じ decode_scale を渡し、カメラ行列や面積のしきい値を合わせる）
+def open_camera(device, width=None, height=None, fps=None, profile=DEFAULT_PROFILE,
+                decode_scale=1):
+    if width is None and height is None and fps is None:
+        profile = profile._replace(fourcc=None, buffer_size=None)
+    profile = profile._replace(width=width, height=height, fps=fps)
+    if decode_scale != 1:
+        profile = profile._replace(fourcc='MJPG')
+    cap, _, _ = open_capture(device, profile)
+    if decode_scale != 1:
+        cap = MjpegCapture(cap, MjpegDecoder(decode_scale))
+    return ThreadedCapture(cap)
+
+
+class _ReplayClock:
+    """録画時の撮影時刻を今の時刻に合わせ、realtime なら元の間隔で待つ."""
+
+    def __init__(self, realtime):
+        self.realtime = realtime
+        self.start_wall = None
+        self.first_stamp = None
+
+    def stamp(self, recorded):
+        if self.start_wall is None:
+            self.start_wall = time.time()
+            self.first_stamp = recorded
+        stamp = self.start_wall + (recorded - self.first_stamp)
+        if self.realtime:
+            wait = stamp - time.time()
+            if wait > 0:
+                time.sleep(wait)
+        return stamp
+
+
+class VideoFileSource:
+    """録画した動画ファイルまたは画像ディレクトリ.
+
+    decode_scale が 2, 4, 8 なら JPEG の画像は縮小デコードし、動画は読んでから縮小する。
+    """
+
+    def __init__(self, path, realtime=False, fps=15.0, decode_scale=1):
+        if decode_scale not in REDUCED_FLAGS:
+            raise ValueError(f'decode_scale は {sorted(REDUCED_FLAGS)} のどれかにしてください')
+        self.clock = _ReplayClock(realtime)
+        self.fps = fps
+        self.decode_scale = decode_scale
+        self.seq = 0
+        self.images = None
+        self.cap = None
+        if os.path.isdir(path):
+            self.images = list_images(path)
+        else:
+            self.cap = cv2.VideoCapture(path)
+            if not self.cap.isOpened():
+                raise IOError(f'{path} を開けませんでした')
+            self.fps = self.cap.get(cv2.CAP_PROP_FPS) or fps
+
+    def read(self):
+        if self.images is not None:
+            if self.seq >= len(self.images):
+                return None
+            frame = cv2.imread(self.images[self.seq], REDUCED_FLAGS[self.decode_scale])
+            if frame is None:
+                return None
+            recorded = self.seq / self.fps
+        else:
+            ret, frame = self.cap.read()
+            if not ret:
+                return None
+            if self.decode_scale != 1:
+                s = self.decode_scale
+                frame = cv2.resize(frame, (frame.shape[1] // s, frame.shape[0] // s),
+                                   interpolation=cv2.INTER_AREA)
+            recorded = self.seq / self.fps
+        self.seq += 1
+        return CapturedFrame(frame, self.clock.stamp(recorded), self.seq, 0)
+
+    def get(self, prop_id):
+        return self.cap.get(prop_id) if self.cap is not None else 0.0
+
+    def release(self):
+        if self.cap is not None:
+            self.cap.release()
+
+
+class RawRecorder:
+    """フレームと撮影時刻を固定長レコードのバイナリファイルに書き出す.
+
+    channels=1 のときはグレースケールの 2 次元のフレーム (高さ, 幅) も受け付ける。
+    """
+
+    def __init__(self, path, width, height, channels=3):
+        self.shape = (height, width, channels)
+        self.f = open(path, 'wb')
+        header = RAW_HEADER.pack(RAW_MAGIC, RAW_VERSION, width, height, channels)
+        self.f.write(header.ljust(RAW_HEADER_SIZE, b'\x00'))
+        self.count = 0
+
+    def write(self, frame, stamp):
+        if frame.ndim == 2:
+            frame = frame[:, :, np.newaxis]
+        if frame.shape != self.shape:
+            raise ValueError(f'フレームの形 {frame.shape} が録画設定 {self.shape} と違います')
+        self.f.write(struct.pack('<d', stamp))
+        self.f.write(np.ascontiguousarray(frame).data)
+        self.count += 1
+
+    def close(self):
+        self.f.close()
+
+
+class RawReplaySource:
+    """RawRecorder のファイルをメモリマップし、コピーせずにフレームを渡す.
+
+    フレームは copy-on-write のビューなので、描画してもファイルは変わらない。
+    realtime=True なら録画時の間隔で、False なら待たずに次々と返す。
+    """
+
+    def __init__(self, path, realtime=False):
+        with open(path, 'rb') as f:
+            magic, version, width, height, channels = RAW_HEADER.unpack(
+                f.read(RAW_HEADER.size))
+        if magic != RAW_MAGIC or version != RAW_VERSION:
+            raise ValueError(f'{path} は生フレーム録画ファイルではありません')
+        dtype = raw_record_dtype(width, height, channels)
+        count = (os.path.getsize(path) - RAW_HEADER_SIZE) // dtype.itemsize
+        self.records = np.memmap(path, dtype=dtype, mode='c', offset=RAW_HEADER_SIZE,
+                                 shape=(count,))
+        self.frames = self.records['frame']
+        if channels == 1:
+            # グレースケールは録画したときと同じ 2 次元で返す
+            self.frames = self.frames[..., 0]
+        self.stamps = self.records['stamp']
+        self.clock = _ReplayClock(realtime)
+        self.seq = 0
+
+    def __len__(self):
+        return len(self.records)
+
+    def read(self):
+        if self.seq >= len(self.records):
+            return None
+        i = self.seq
+        self.seq += 1
+        return CapturedFrame(self.frames[i], self.clock.stamp(float(self.stamps[i])),
+                             self.seq, 0)
+
+    def get(self, prop_id):
+        return 0.0
+
+    def release(self):
+        self.records = self.frames = self.stamps = None
+
+
+class RecordingSource:
+    """別のフレームソースから読んだフレームを RawRecorder に書きながら渡す."""
+
+    def __init__(self, source, path):
+        self.source = source
+        self.path = path
+        self.recorder = None
+
+    def read(self):
+        captured = self.source.read()
+        if captured is None:
+            return None
+        if self.recorder is None:
+            h, w = captured.frame.shape[:2]
+            channels = captured.frame.shape[2] if captured.frame.ndim == 3 else 1
+            self.recorder = RawRecorder(self.path, w, h, channels)
+        self.recorder.write(captured.frame, captured.stamp)
+        return captured
+
+    def get(self, prop_id):
+        return self.source.get(prop_id)
+
+    def release(self):
+        self.source.release()
+        if self.recorder is not None:
+            self.recorder.close()
+
+
+# カメラのデバイス（'/dev/video4' や番号）、動画、画像ディレクトリ、.raw ファイルを開く
+#   decode_scale はカメラと動画・画像ディレクトリで有効（.raw は録画した大きさのまま）
+def open_source(spec, width=None, height=None, fps=None, realtime=False, record=None,
+                decode_scale=1):
+    if isinstance(spec, int) or (isinstance(spec, str) and spec.isdigit()):
+        source = open_camera(int(spec), width, height, fps, decode_scale=decode_scale)
+    elif spec.startswith('/dev/video'):
+        source = open_camera(spec, width, height, fps, decode_scale=decode_scale)
+    elif spec.endswith('.raw'):
+        source = RawReplaySource(spec, realtime)
+    else:
+        source = VideoFileSource(spec, realtime, decode_scale=decode_scale)
+    if record:
+        source = RecordingSource(source, record)
+    return source
+
+
+# スクリプトの引数からフレームソースを開く
+#   python3 tracking_hyb1.py [ソース] [--record out.raw] [--realtime]
+#   decode_scale は検出器（BallDetector の decode_scale）と同じ値を渡す
+def open_source_from_args(default_device, width=None, height=None, fps=None, decode_scale=1):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('source', nargs='?', default=str(default_device),
+                        help='カメラ、動画ファイル、画像ディレクトリ、.raw 録画ファイル')
+    parser.add_argument('--record', help='読んだフレームを .raw ファイルに録画する')
+    parser.add_argument('--realtime', action='store_true',
+                        help='録画を元の撮影間隔で再生する（省略時は待たずに再生）')
+    args = parser.parse_args()
+    try:
+        return open_source(args.source, width, height, fps, args.realtime, args.record,
+                           decode_scale)
+    except (IOError, ValueError) as e:
+        print(e)
+        sys.exit(1)
+
+
+# カメラから直接 .raw ファイルに録画するコマンド
+def record_main():
+    parser = argparse.ArgumentParser(description='カメラのフレームを .raw ファイルに録画する')
+    parser.add_argument('device', help='カメラ（/dev/video4 や番号）')
+    parser.add_argument('output', help='出力先の .raw ファイル')
+    parser.add_argument('--width', type=int, default=DEFAULT_PROFILE.width)
+    parser.add_argument('--height', type=int, default=DEFAULT_PROFILE.height)
+    parser.add_argument('--fps', type=int, default=DEFAULT_PROFILE.fps)
+    parser.add_argument('--seconds', type=float, default=10.0)
+    args = parser.parse_args()
+
+    device = int(args.device) if args.device.isdigit() else args.device
+    try:
+        cap, _, _ = open_capture(device, DEFAULT_PROFILE._replace(
+            width=args.width, height=args.height, fps=args.fps))
+    except IOError as e:
+        print(e)
+        return 1
+
+    recorder = None
+    frame = None
+    end_time = time.time() + args.seconds
+    try:
+        while time.time() < end_time:
+            # 取り込み用のバッファは使い回す
+            ret, frame = cap.read(frame)
+            stamp = time.time()
+            if not ret:
+                print('フレーム取得に失敗')
+                break
+            if recorder is None:
+                h, w = frame.shape[:2]
+                recorder = RawRecorder(args.output, w, h, frame.shape[2])
+            recorder.write(frame, stamp)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        cap.release()
+        if recorder is not None:
+            recorder.close()
+            print(f'{recorder.count} フレームを {args.output} に録画しました')
+    return 0
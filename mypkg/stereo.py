@@ -0,0 +1,392 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from mypkg import params
+from mypkg.calibration import (CHECKERBOARD, SQUARE_SIZE, board_points, calibrate,
+                               find_corners, load_calibration, select_views, view_features)
+from mypkg.capture import DEFAULT_PROFILE, CapturedFrame, open_capture
+from mypkg.detector import BallDetector
+from mypkg.frames import list_images
+from mypkg.sources import RawRecorder, open_source
+
+STEREO_VERSION = 1
+STEREO_PATH = os.path.join(os.path.expanduser('~'), '.config', 'mypkg', 'stereo_calibration.json')
+
+# tracking_hyb1.py と ball_distance.py のカメラ
+LEFT_DEVICE = '/dev/video0'
+RIGHT_DEVICE = '/dev/video4'
+
+STEREO_CRITERIA = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 100, 1e-5)
+
+# 1 行が左右で対応づけた 1 個のボール（座標は左カメラ基準 [cm]、distance は原点からの距離）
+STEREO_DTYPE = np.dtype([
+    ('color', np.int8),
+    ('xl', np.float32), ('yl', np.float32),
+    ('xr', np.float32), ('yr', np.float32),
+    ('X', np.float32), ('Y', np.float32), ('Z', np.float32),
+    ('distance', np.float32),
+    ('mono_distance', np.float32),
+])
+
+
+# 左右のディレクトリで同じ名前の画像を組にする
+def pair_images(left_dir, right_dir):
+    right = {os.path.basename(p): p for p in list_images(right_dir)}
+    return [(p, right[os.path.basename(p)]) for p in list_images(left_dir)
+            if os.path.basename(p) in right]
+
+
+def stereo_calibrate(pairs, image_size, left, right, board=CHECKERBOARD,
+                     square_size=SQUARE_SIZE):
+    """左右の交点の組 [(左の交点, 右の交点)] からカメラ間の姿勢と平行化の変換を求める.
+
+    left, right は各カメラの (camera_matrix, dist_coeffs)（ここでは固定する）。
+    """
+    objp = board_points(board, square_size)
+    rms, k1, d1, k2, d2, rot, trans, _, _ = cv2.stereoCalibrate(
+        [objp] * len(pairs), [l for l, _ in pairs], [r for _, r in pairs],
+        left[0], left[1], right[0], right[1], tuple(image_size),
+        criteria=STEREO_CRITERIA, flags=cv2.CALIB_FIX_INTRINSIC)
+    r1, r2, p1, p2, q, _, _ = cv2.stereoRectify(k1, d1, k2, d2, tuple(image_size), rot, trans,
+                                                alpha=0)
+    return {
+        'rms': float(rms),
+        'left': {'camera_matrix': k1, 'dist_coeffs': d1.ravel(), 'R': r1, 'P': p1},
+        'right': {'camera_matrix': k2, 'dist_coeffs': d2.ravel(), 'R': r2, 'P': p2},
+        'R': rot, 'T': trans.ravel(), 'Q': q,
+        'baseline': float(np.linalg.norm(trans)),
+    }
+
+
+def save_stereo_calibration(path, calib, image_size, board=CHECKERBOARD,
+                            square_size=SQUARE_SIZE, extra=None):
+    def to_list(value):
+        if isinstance(value, dict):
+            return {k: to_list(v) for k, v in value.items()}
+        return np.asarray(value).tolist()
+
+    data = {
+        'version': STEREO_VERSION,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'image_size': list(image_size),
+        'board': {'cols': board[0], 'rows': board[1], 'square_size': square_size},
+        'rms': calib['rms'],
+        'baseline': calib['baseline'],
+    }
+    for key in ('left', 'right', 'R', 'T', 'Q'):
+        data[key] = to_list(calib[key])
+    data.update(extra or {})
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(json.dumps(data, indent=2, ensure_ascii=False) + '\n')
+    os.replace(tmp_path, path)
+
+
+def load_stereo_calibration(path=STEREO_PATH):
+    with open(path) as f:
+        data = json.load(f)
+    if data.get('version') != STEREO_VERSION:
+        raise ValueError(f'{path} の版 {data.get("version")} には対応していません')
+    for side in ('left', 'right'):
+        data[side] = {k: np.array(v, dtype=np.float64) for k, v in data[side].items()}
+    for key in ('R', 'T', 'Q'):
+        data[key] = np.array(data[key], dtype=np.float64)
+    return data
+
+
+class StereoCapture:
+    """2 台のカメラを grab() で続けて取り込んでから retrieve() でデコードする.
+
+    grab() はフレームを受け取るだけで速いので、左右の撮影時刻の差が小さくなる。
+    read() は (左, 右) の CapturedFrame を返し、フレームの配列は次の read() で上書きされる。
+    """
+
+    def __init__(self, left, right, profile=DEFAULT_PROFILE):
+        self.caps = [open_capture(left, profile)[0], open_capture(right, profile)[0]]
+        self.frames = [None, None]
+        self.seq = 0
+
+    def read(self):
+        if not all(cap.grab() for cap in self.caps):
+            return None
+        stamp = time.time()
+        for i, cap in enumerate(self.caps):
+            ret, self.frames[i] = cap.retrieve(self.frames[i])
+            if not ret:
+                return None
+        self.seq += 1
+        return tuple(CapturedFrame(frame, stamp, self.seq, 0) for frame in self.frames)
+
+    def release(self):
+        for cap in self.caps:
+            cap.release()
+
+
+class StereoFileSource:
+    """録画した左右の動画・画像ディレクトリ・.raw を 1 フレームずつ組にして読む."""
+
+    def __init__(self, left, right, realtime=False):
+        self.sources = [open_source(left, realtime=realtime), open_source(right)]
+
+    def read(self):
+        pair = [source.read() for source in self.sources]
+        if pair[0] is None or pair[1] is None:
+            return None
+        return tuple(pair)
+
+    def release(self):
+        for source in self.sources:
+            source.release()
+
+
+# カメラ 2 台なら StereoCapture、それ以外は録画として開く
+def open_stereo_source(left, right, realtime=False):
+    def is_camera(spec):
+        return spec.isdigit() or spec.startswith('/dev/video')
+
+    if is_camera(left) and is_camera(right):
+        return StereoCapture(int(left) if left.isdigit() else left,
+                             int(right) if right.isdigit() else right)
+    return StereoFileSource(left, right, realtime)
+
+
+class StereoBallLocator:
+    """左右のフレームで並列にボールを検出し、同じ色で対応づけて三角測量する.
+
+    中心だけを平行化した座標に移し（画像全体は補正しない）、平行化後の y の差が
+    max_dy [px] 以内で視差が正のものを、y の差と半径の比が小さい順に対応づける。
+    """
+
+    def __init__(self, stereo, color_ranges=None, max_dy=8.0, max_radius_ratio=1.5,
+                 max_pairs=8, **detector_options):
+        color_ranges = color_ranges or params.COLOR_RANGES
+        self.stereo = stereo
+        self.sides = [stereo['left'], stereo['right']]
+        # 三角測量の結果はチェッカーボードの単位 [mm]。距離は cm で返す
+        self.unit = 0.1
+        self.detectors = [BallDetector(color_ranges, camera_matrix=side['camera_matrix'],
+                                       dist_coeffs=side['dist_coeffs'], undistort='sparse',
+                                       ball_diameter=params.BALL_DIAMETER, **detector_options)
+                          for side in self.sides]
+        self.colors = self.detectors[0].colors
+        self.max_dy = max_dy
+        self.max_radius_ratio = max_radius_ratio
+        self.buffer = np.zeros(max_pairs, dtype=STEREO_DTYPE)
+        # OpenCV は GIL を外すので、左右の検出はスレッドで並べれば足りる
+        self.pool = ThreadPoolExecutor(max_workers=2)
+
+    # 検出器（sparse）の座標は歪み補正済みなので、平行化の回転と投影だけを行う
+    def _rectify(self, balls, side):
+        if len(balls) == 0:
+            return np.empty((0, 2))
+        pts = np.stack([balls['x'], balls['y']], axis=1).astype(np.float64).reshape(-1, 1, 2)
+        return cv2.undistortPoints(pts, side['camera_matrix'], None,
+                                   R=side['R'], P=side['P']).reshape(-1, 2)
+
+    # 左右のボールの対応 [(左の番号, 右の番号)]
+    def _match(self, left, right, pl, pr):
+        if len(left) == 0 or len(right) == 0:
+            return []
+        dy = np.abs(pl[:, None, 1] - pr[None, :, 1])
+        disparity = pl[:, None, 0] - pr[None, :, 0]
+        ratio = np.maximum(left['radius'][:, None], right['radius'][None, :]) / \
+            np.maximum(np.minimum(left['radius'][:, None], right['radius'][None, :]), 1e-6)
+        ok = ((left['color'][:, None] == right['color'][None, :]) & (dy <= self.max_dy)
+              & (disparity > 0) & (ratio <= self.max_radius_ratio))
+        cost = np.where(ok, dy / self.max_dy + (ratio - 1), np.inf)
+        pairs = []
+        for flat in np.argsort(cost, axis=None):
+            i, j = np.unravel_index(flat, cost.shape)
+            if not np.isfinite(cost[i, j]) or len(pairs) == len(self.buffer):
+                break
+            if all(i != a and j != b for a, b in pairs):
+                pairs.append((int(i), int(j)))
+        return pairs
+
+    def locate(self, left_frame, right_frame):
+        """戻り値は (STEREO_DTYPE の配列, 左の検出結果, 右の検出結果).
+
+        配列は使い回すバッファのビューなので、次の locate() で上書きされる。
+        """
+        futures = [self.pool.submit(d.detect, f)
+                   for d, f in zip(self.detectors, (left_frame, right_frame))]
+        results = [future.result() for future in futures]
+        left, right = results[0].balls, results[1].balls
+        pl, pr = self._rectify(left, self.sides[0]), self._rectify(right, self.sides[1])
+        pairs = self._match(left, right, pl, pr)
+        out = self.buffer[:len(pairs)]
+        if not pairs:
+            return out, results[0], results[1]
+
+        li = np.array([i for i, _ in pairs])
+        ri = np.array([j for _, j in pairs])
+        points = cv2.triangulatePoints(self.sides[0]['P'], self.sides[1]['P'],
+                                       pl[li].T, pr[ri].T)
+        # 平行化した左カメラの座標から元の左カメラの座標に戻す
+        xyz = self.sides[0]['R'].T @ (points[:3] / points[3]) * self.unit
+        out['color'] = left['color'][li]
+        out['xl'], out['yl'] = left['x'][li], left['y'][li]
+        out['xr'], out['yr'] = right['x'][ri], right['y'][ri]
+        out['X'], out['Y'], out['Z'] = xyz
+        out['distance'] = np.linalg.norm(xyz, axis=0)
+        out['mono_distance'] = left['distance'][li]
+        return out, results[0], results[1]
+
+    def close(self):
+        self.pool.shutdown()
+        for detector in self.detectors:
+            detector.close()
+
+
+def calib_main():
+    parser = argparse.ArgumentParser(
+        description='左右同時に撮ったチェッカーボードの画像の組からステレオ較正を行い、保存する')
+    parser.add_argument('left', help='左カメラの画像ディレクトリ')
+    parser.add_argument('right', help='右カメラの画像ディレクトリ（左と同じファイル名で組にする）')
+    parser.add_argument('--left-calib', help='左カメラの camera_calib の結果（省略時はここで較正）')
+    parser.add_argument('--right-calib', help='右カメラの camera_calib の結果（省略時はここで較正）')
+    parser.add_argument('--board', type=int, nargs=2, default=CHECKERBOARD,
+                        metavar=('COLS', 'ROWS'), help='内側の交点の数')
+    parser.add_argument('--square-size', type=float, default=SQUARE_SIZE, help='[mm]')
+    parser.add_argument('--max-views', type=int, default=25)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--output', '-o', default=STEREO_PATH)
+    args = parser.parse_args()
+    board = tuple(args.board)
+
+    pairs = pair_images(args.left, args.right)
+    if not pairs:
+        print(f'{args.left} と {args.right} に同じ名前の画像がありません', file=sys.stderr)
+        return 1
+    paths = [p for pair in pairs for p in pair]
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        results = list(pool.map(find_corners, paths, [board] * len(paths)))
+    left_found, right_found = results[0::2], results[1::2]
+    sizes = {size for _, corners, size in results if corners is not None}
+    if len(sizes) != 1:
+        print(f'交点の見つかった画像のサイズがそろっていません: {sorted(sizes)}', file=sys.stderr)
+        return 1
+    image_size = sizes.pop()
+
+    # 各カメラの内部パラメータ（ファイルがなければ、そのカメラで交点の見つかった画像で較正）
+    intrinsics = []
+    for name, calib_path, found in (('左', args.left_calib, left_found),
+                                    ('右', args.right_calib, right_found)):
+        if calib_path is not None:
+            data = load_calibration(calib_path)
+            intrinsics.append((data['camera_matrix'], data['dist_coeffs']))
+            continue
+        views = [(path, corners) for path, corners, _ in found if corners is not None]
+        if len(views) < 5:
+            print(f'{name}カメラの交点の見つかった画像が 5 枚未満です', file=sys.stderr)
+            return 1
+        features = [view_features(corners, board, image_size) for _, corners in views]
+        views = [views[i] for i in select_views(features, args.max_views)]
+        calib = calibrate(views, image_size, board, args.square_size)
+        print(f'{name}カメラ: {len(views)} 枚、再投影誤差 {calib["rms"]:.3f} px')
+        intrinsics.append((calib['camera_matrix'], calib['dist_coeffs']))
+
+    both = [(l[1], r[1]) for l, r in zip(left_found, right_found)
+            if l[1] is not None and r[1] is not None]
+    print(f'左右とも交点が見つかった組: {len(both)}/{len(pairs)}')
+    if len(both) < 5:
+        print('ステレオ較正には左右とも交点の見つかった組が 5 つ以上必要です', file=sys.stderr)
+        return 1
+
+    stereo = stereo_calibrate(both, image_size, intrinsics[0], intrinsics[1], board,
+                              args.square_size)
+    print(f'ステレオ較正: 再投影誤差 {stereo["rms"]:.3f} px、基線長 {stereo["baseline"]:.1f} mm')
+    save_stereo_calibration(args.output, stereo, image_size, board, args.square_size,
+                            {'pairs_found': len(both), 'pairs_total': len(pairs)})
+    print(f'{args.output} に保存しました')
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='2 台のカメラ（または左右の録画）でボールを検出し、三角測量で距離を求める')
+    parser.add_argument('left', nargs='?', default=LEFT_DEVICE,
+                        help='左カメラ、または左の動画・画像ディレクトリ・.raw')
+    parser.add_argument('right', nargs='?', default=RIGHT_DEVICE,
+                        help='右カメラ、または右の動画・画像ディレクトリ・.raw')
+    parser.add_argument('--calib', default=STEREO_PATH, help='stereo_calib の結果')
+    parser.add_argument('--max-dy', type=float, default=8.0,
+                        help='左右の対応を認める平行化後の y のずれ [px]')
+    parser.add_argument('--max-frames', type=int, default=None)
+    parser.add_argument('--realtime', action='store_true', help='録画を元の撮影間隔で再生する')
+    parser.add_argument('--record', help='読んだ左右のフレームを DIR/left.raw, DIR/right.raw に録画する')
+    parser.add_argument('--output', '-o', help='対応づけたボールを CSV に書く')
+    args = parser.parse_args()
+
+    try:
+        stereo = load_stereo_calibration(args.calib)
+        source = open_stereo_source(args.left, args.right, args.realtime)
+    except (IOError, ValueError) as e:
+        print(e, file=sys.stderr)
+        return 1
+    locator = StereoBallLocator(stereo, max_dy=args.max_dy)
+    print(f'ステレオ較正 {args.calib} を読み込みました（基線長 {stereo["baseline"]:.1f} mm）')
+
+    recorders = None
+    writer = None
+    out_file = None
+    if args.output:
+        out_file = open(args.output, 'w', newline='')
+        writer = csv.writer(out_file)
+        writer.writerow(['frame', 'stamp', 'color'] + list(STEREO_DTYPE.names[1:]))
+
+    frames = 0
+    start = time.perf_counter()
+    try:
+        while args.max_frames is None or frames < args.max_frames:
+            pair = source.read()
+            if pair is None:
+                break
+            left, right = pair
+            if args.record:
+                if recorders is None:
+                    os.makedirs(args.record, exist_ok=True)
+                    recorders = [RawRecorder(os.path.join(args.record, f'{side}.raw'),
+                                             c.frame.shape[1], c.frame.shape[0])
+                                 for side, c in (('left', left), ('right', right))]
+                for recorder, c in zip(recorders, pair):
+                    recorder.write(c.frame, left.stamp)
+
+            balls, _, _ = locator.locate(left.frame, right.frame)
+            frames += 1
+            for ball in balls:
+                text = ', '.join(f'{name}={float(ball[name]):.1f}'
+                                 for name in ('X', 'Y', 'Z'))
+                print(f'[{frames}] {locator.colors[ball["color"]]}: 距離 {ball["distance"]:.1f} cm'
+                      f'（単眼 {ball["mono_distance"]:.1f} cm）{text}')
+                if writer is not None:
+                    writer.writerow([frames, f'{left.stamp:.6f}', locator.colors[ball['color']]]
+                                    + [f'{float(ball[name]):.3f}'
+                                       for name in STEREO_DTYPE.names[1:]])
+    except KeyboardInterrupt:
+        pass
+    finally:
+        source.release()
+        locator.close()
+        if recorders is not None:
+            for recorder in recorders:
+                recorder.close()
+        if out_file is not None:
+            out_file.close()
+
+    elapsed = time.perf_counter() - start
+    print(f'{frames} フレーム、{frames / elapsed if elapsed > 0 else 0.0:.1f} fps')
+    return 0
+
+
+if __name__ == '__main__':
+    main()
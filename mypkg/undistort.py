@@ -0,0 +1,119 @@
+import hashlib
+import os
+import time
+
+import cv2
+import numpy as np
+
+# リマップテーブルの保存先
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'mypkg', 'undistort')
+
+
+# camera_matrix / dist_coeffs / 解像度からキャッシュのキーを作る
+def map_cache_key(camera_matrix, dist_coeffs, size):
+    h = hashlib.sha1()
+    h.update(np.ascontiguousarray(camera_matrix, dtype=np.float64).tobytes())
+    h.update(np.ascontiguousarray(dist_coeffs, dtype=np.float64).ravel().tobytes())
+    h.update(np.array(size, dtype=np.int32).tobytes())
+    return h.hexdigest()
+
+
+class Undistorter:
+    """事前計算したリマップテーブルで歪み補正を行う."""
+
+    def __init__(self, camera_matrix, dist_coeffs, size, cache_dir=CACHE_DIR):
+        # size は (幅, 高さ)
+        self.camera_matrix = np.asarray(camera_matrix, dtype=np.float64)
+        self.dist_coeffs = np.asarray(dist_coeffs, dtype=np.float64)
+        self.size = (int(size[0]), int(size[1]))
+        self.cache_dir = cache_dir
+        self.map1, self.map2 = self._load_or_build_maps()
+        self.buffer = None
+
+    def _cache_path(self):
+        if self.cache_dir is None:
+            return None
+        key = map_cache_key(self.camera_matrix, self.dist_coeffs, self.size)
+        return os.path.join(self.cache_dir, f'{key}.npz')
+
+    def _load_or_build_maps(self):
+        path = self._cache_path()
+        if path is not None and os.path.exists(path):
+            try:
+                data = np.load(path)
+                return data['map1'], data['map2']
+            except (OSError, KeyError, ValueError):
+                # 壊れたキャッシュは作り直す
+                pass
+
+        # 固定小数点形式 (CV_16SC2) のマップを一度だけ作る
+        map1, map2 = cv2.initUndistortRectifyMap(
+            self.camera_matrix, self.dist_coeffs, None, self.camera_matrix,
+            self.size, cv2.CV_16SC2)
+
+        if path is not None:
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                tmp_path = path + '.tmp.npz'
+                np.savez(tmp_path, map1=map1, map2=map2)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                print(f'リマップテーブルを保存できませんでした: {e}')
+        return map1, map2
+
+    # 歪み補正（結果は使い回しのバッファに書き込まれる）
+    def undistort(self, frame):
+        h, w = frame.shape[:2]
+        if (w, h) != self.size:
+            raise ValueError(
+                f'フレームサイズ {w}x{h} がマップ {self.size[0]}x{self.size[1]} と一致しません')
+        if (self.buffer is None or self.buffer.shape != frame.shape
+                or self.buffer.dtype != frame.dtype):
+            self.buffer = np.empty_like(frame)
+        cv2.remap(frame, self.map1, self.map2, cv2.INTER_LINEAR, dst=self.buffer)
+        return self.buffer
+
+    # cv2.undistort との1フレームあたりの処理時間を比較する
+    def benchmark(self, frame, repeat=30):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            cv2.undistort(frame, self.camera_matrix, self.dist_coeffs)
+        undistort_ms = (time.perf_counter() - start) * 1000 / repeat
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            self.undistort(frame)
+        remap_ms = (time.perf_counter() - start) * 1000 / repeat
+
+        return {
+            'undistort_ms': undistort_ms,
+            'remap_ms': remap_ms,
+            'saved_ms': undistort_ms - remap_ms,
+        }
+
+
+# benchmark() の結果を表示する
+def print_benchmark(result):
+    print(f"cv2.undistort: {result['undistort_ms']:.2f} ms/frame, "
+          f"remap: {result['remap_ms']:.2f} ms/frame, "
+          f"短縮: {result['saved_ms']:.2f} ms/frame")
+
+
+# 検出した円の中心と縁の点だけを歪み補正する（フレーム全体は補正しない）
+def undistort_circle(center, radius, camera_matrix, dist_coeffs, rim_points=8):
+    angles = np.linspace(0, 2 * np.pi, rim_points, endpoint=False)
+    pts = np.empty((rim_points + 1, 1, 2), dtype=np.float64)
+    pts[0, 0] = center
+    pts[1:, 0, 0] = center[0] + radius * np.cos(angles)
+    pts[1:, 0, 1] = center[1] + radius * np.sin(angles)
+
+    # P に camera_matrix を渡して画素座標のまま返してもらう
+    undist = cv2.undistortPoints(pts, camera_matrix, dist_coeffs, P=camera_matrix)[:, 0]
+    new_center = undist[0]
+    rim = undist[1:]
+
+    # 向かい合う縁の点の距離の平均を補正後の直径とする
+    half = rim_points // 2
+    diameters = np.linalg.norm(rim[:half] - rim[half:2 * half], axis=1)
+    new_radius = float(np.mean(diameters)) / 2
+    return (float(new_center[0]), float(new_center[1])), new_radius
@@ -0,0 +1,53 @@
+import argparse
+
+import numpy as np
+
+from mypkg import params
+from mypkg.detector import BallDetector
+from mypkg.frames import load_frames
+
+
+# 1 つのモードで全フレームを処理し、距離の列と 1 フレームあたりの時間 [ms] を返す
+def run_mode(frames, undistort):
+    detector = BallDetector(params.COLOR_RANGES, camera_matrix=params.CAMERA_MATRIX,
+                            dist_coeffs=params.DIST_COEFFS, undistort=undistort,
+                            ball_diameter=params.BALL_DIAMETER)
+    distances = []
+    for frame in frames:
+        best = detector.detect(frame).best
+        distances.append(best.distance if best is not None else None)
+    return distances, detector.timer.mean().get('total', 0.0)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='全画面補正とスパース補正の処理時間と距離の差を比較する')
+    parser.add_argument('source', help='録画した動画ファイルまたは画像ディレクトリ')
+    parser.add_argument('--max-frames', type=int, default=None)
+    args = parser.parse_args()
+
+    frames = load_frames(args.source, args.max_frames)
+    if not frames:
+        print(f'{args.source} からフレームを読み込めませんでした')
+        return 1
+
+    full, full_ms = run_mode(frames, 'remap')
+    sparse, sparse_ms = run_mode(frames, 'sparse')
+
+    diffs = np.array([s - f for f, s in zip(full, sparse)
+                      if f is not None and s is not None])
+
+    print(f'フレーム数          : {len(frames)}')
+    print(f'全画面補正          : {full_ms:.2f} ms/frame')
+    print(f'スパース補正        : {sparse_ms:.2f} ms/frame')
+    print(f'短縮                : {full_ms - sparse_ms:.2f} ms/frame')
+    print(f'両方で検出したフレーム: {len(diffs)}')
+    if len(diffs) > 0:
+        print(f'距離の差 平均       : {np.mean(diffs):+.3f} cm')
+        print(f'距離の差 平均絶対値 : {np.mean(np.abs(diffs)):.3f} cm')
+        print(f'距離の差 最大絶対値 : {np.max(np.abs(diffs)):.3f} cm')
+    return 0
+
+
+if __name__ == '__main__':
+    main()
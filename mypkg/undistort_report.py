@@ -0,0 +1,166 @@
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from mypkg import params
+from mypkg.calibration import (CHECKERBOARD, SQUARE_SIZE, board_points, calib_path,
+                               find_corners, load_calibration)
+from mypkg.frames import list_images
+
+
+# 各行・各列の交点に直線を当てはめたときの残差 [px]（lines は (本数, 点数, 2)）
+def line_residuals(lines):
+    centered = lines - lines.mean(axis=1, keepdims=True)
+    cov = np.einsum('lpi,lpj->lij', centered, centered)
+    # 最小固有値の固有ベクトルが直線の法線
+    _, vecs = np.linalg.eigh(cov)
+    normal = vecs[:, :, 0]
+    return np.einsum('lpi,li->lp', centered, normal)
+
+
+# 点ごとの値を画像を grid 分割した領域ごとに平均する（点のない領域は NaN）
+def region_means(points, values, size, grid):
+    gx = np.clip((points[:, 0] * grid[1] / size[0]).astype(int), 0, grid[1] - 1)
+    gy = np.clip((points[:, 1] * grid[0] / size[1]).astype(int), 0, grid[0] - 1)
+    cell = gy * grid[1] + gx
+    count = np.bincount(cell, minlength=grid[0] * grid[1])
+    total = np.bincount(cell, weights=values, minlength=grid[0] * grid[1])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (total / count).reshape(grid)
+
+
+def save_heatmap(path, heat, size, vmax):
+    norm = np.nan_to_num(heat / vmax if vmax > 0 else heat, nan=0.0)
+    img = cv2.applyColorMap(np.clip(norm * 255, 0, 255).astype(np.uint8), cv2.COLORMAP_JET)
+    img[np.isnan(heat)] = 0
+    img = cv2.resize(img, size, interpolation=cv2.INTER_NEAREST)
+    cv2.imwrite(path, img)
+
+
+def evaluate(views, camera_matrix, dist_coeffs, size, board=CHECKERBOARD,
+             square_size=SQUARE_SIZE, grid=(6, 8)):
+    """1 組のカメラパラメータで、画像ごとの再投影誤差と補正後の直線性を求める.
+
+    views は [(path, corners)]。交点を全画像まとめて undistortPoints で補正し、
+    行・列ごとの直線からのずれ（理想は 0）を一度に計算する。
+    """
+    objp = board_points(board, square_size)
+    corners = np.concatenate([c.reshape(-1, 2) for _, c in views]).astype(np.float64)
+
+    # 再投影誤差（画像ごとに姿勢を求めて投影し直す）
+    projected = []
+    for _, c in views:
+        _, rvec, tvec = cv2.solvePnP(objp, c, camera_matrix, dist_coeffs)
+        pts, _ = cv2.projectPoints(objp, rvec, tvec, camera_matrix, dist_coeffs)
+        projected.append(pts.reshape(-1, 2))
+    reproj = np.linalg.norm(np.concatenate(projected) - corners, axis=1)
+
+    # 補正後の交点の直線性
+    undistorted = cv2.undistortPoints(corners.reshape(-1, 1, 2), camera_matrix, dist_coeffs,
+                                      P=camera_matrix).reshape(len(views), board[1], board[0], 2)
+    rows = line_residuals(undistorted.reshape(-1, board[0], 2))
+    cols = line_residuals(undistorted.transpose(0, 2, 1, 3).reshape(-1, board[1], 2))
+    # 交点ごとに行と列の残差の大きい方
+    rows = np.abs(rows).reshape(len(views), board[1], board[0])
+    cols = np.abs(cols).reshape(len(views), board[0], board[1]).transpose(0, 2, 1)
+    straight = np.maximum(rows, cols).ravel()
+
+    per_view = reproj.reshape(len(views), -1)
+    return {
+        # 距離の計算に効く焦点距離 [px]
+        'focal_length': [float(camera_matrix[0][0]), float(camera_matrix[1][1])],
+        'reprojection_rms': float(np.sqrt(np.mean(reproj ** 2))),
+        'reprojection_max': float(reproj.max()),
+        'straightness_rms': float(np.sqrt(np.mean(straight ** 2))),
+        'straightness_max': float(straight.max()),
+        'per_view': [{'image': path, 'reprojection_rms': float(np.sqrt(np.mean(e ** 2))),
+                      'straightness_max': float(s.max())}
+                     for (path, _), e, s in zip(views, per_view,
+                                               straight.reshape(len(views), -1))],
+        'heatmap_reprojection': region_means(corners, reproj, size, grid),
+        'heatmap_straightness': region_means(corners, straight, size, grid),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='チェッカーボードの画像でカメラパラメータを評価し、歪み補正の品質レポートを書く')
+    parser.add_argument('images', help='チェッカーボードを撮った画像のディレクトリ')
+    parser.add_argument('--calib', nargs='*', default=None,
+                        help='比較するキャリブレーションファイル（省略時は --camera のものがあれば使う）')
+    parser.add_argument('--camera', default=None,
+                        help='撮影したカメラ（トラッカーの DEVICE と同じ値。例: /dev/video4）')
+    parser.add_argument('--no-params', action='store_true',
+                        help='params.py のカメラパラメータを比較に含めない')
+    parser.add_argument('--board', type=int, nargs=2, default=CHECKERBOARD,
+                        metavar=('COLS', 'ROWS'))
+    parser.add_argument('--square-size', type=float, default=SQUARE_SIZE)
+    parser.add_argument('--grid', type=int, nargs=2, default=(6, 8), metavar=('ROWS', 'COLS'),
+                        help='ヒートマップの分割数')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--output', '-o', default='undistort_report')
+    args = parser.parse_args()
+    board = tuple(args.board)
+    grid = tuple(args.grid)
+
+    candidates = []
+    calib_paths = args.calib
+    if calib_paths is None:
+        calib_paths = []
+        if args.camera is not None and os.path.exists(calib_path(args.camera)):
+            calib_paths = [calib_path(args.camera)]
+    for path in calib_paths:
+        data = load_calibration(path)
+        candidates.append((os.path.basename(path), data['camera_matrix'], data['dist_coeffs']))
+    if not args.no_params:
+        candidates.append(('params', params.CAMERA_MATRIX, params.DIST_COEFFS))
+    if not candidates:
+        print('評価するカメラパラメータがありません', file=sys.stderr)
+        return 1
+
+    paths = list_images(args.images)
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        results = list(pool.map(find_corners, paths, [board] * len(paths)))
+    found = [(path, corners) for path, corners, _ in results if corners is not None]
+    sizes = {size for _, corners, size in results if corners is not None}
+    if not found:
+        print(f'{args.images} で交点の見つかった画像がありません', file=sys.stderr)
+        return 1
+    if len(sizes) > 1:
+        print(f'画像サイズがそろっていません: {sorted(sizes)}', file=sys.stderr)
+        return 1
+    size = sizes.pop()
+    print(f'交点検出: {len(found)}/{len(paths)} 枚')
+
+    os.makedirs(args.output, exist_ok=True)
+    report = {'images': args.images, 'views': len(found), 'image_size': list(size),
+              'calibrations': {}}
+    evaluations = {name: evaluate(found, k, d, size, board, args.square_size, grid)
+                   for name, k, d in candidates}
+    # ヒートマップの色の範囲は全キャリブレーションで共通にする
+    vmax = {key: max(float(np.nanmax(e[key])) for e in evaluations.values())
+            for key in ('heatmap_reprojection', 'heatmap_straightness')}
+
+    print('名前                          再投影RMS[px]  再投影最大[px]  直線性RMS[px]  直線性最大[px]')
+    for name, result in sorted(evaluations.items(), key=lambda kv: kv[1]['straightness_rms']):
+        for key in vmax:
+            heat_path = os.path.join(args.output, f'{name}.{key}.png')
+            save_heatmap(heat_path, result[key], size, vmax[key])
+            result[key] = [[None if np.isnan(v) else float(v) for v in row] for row in result[key]]
+        report['calibrations'][name] = result
+        print(f'{name:<30}{result["reprojection_rms"]:13.3f}{result["reprojection_max"]:16.3f}'
+              f'{result["straightness_rms"]:15.3f}{result["straightness_max"]:16.3f}')
+
+    with open(os.path.join(args.output, 'report.json'), 'w') as f:
+        f.write(json.dumps(report, indent=2, ensure_ascii=False) + '\n')
+    print(f'{args.output} にレポートを書きました')
+    return 0
+
+
+if __name__ == '__main__':
+    main()
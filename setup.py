@@ -20,6 +20,20 @@ setup(
     tests_require=['pytest'],
     entry_points={
         'console_scripts': [
+            'undistort_compare = mypkg.undistort_compare:main',
+            'pyramid_bench = mypkg.pyramid_bench:main',
+            'detector_bench = mypkg.detector_bench:main',
+            'ball_node = mypkg.ball_node:main',
+            'raw_record = mypkg.sources:record_main',
+            'batch_detect = mypkg.batch:main',
+            'hsv_tune = mypkg.hsv_tune:main',
+            'distance_calib = mypkg.distance_model:main',
+            'camera_calib = mypkg.calibration:main',
+            'undistort_report = mypkg.undistort_report:main',
+            'camera_profile = mypkg.camera_profile:main',
+            'mjpeg_bench = mypkg.mjpeg:main',
+            'stereo_calib = mypkg.stereo:calib_main',
+            'stereo_distance = mypkg.stereo:main',
         ],
     },
 )
@@ -0,0 +1,78 @@
+import cv2
+import numpy as np
+
+from mypkg import params
+from mypkg.adaptive_color import AdaptiveColorModel, AdaptiveColorRanges
+from mypkg.detector import Detection, DetectionResult
+
+
+class FakeDetector:
+    """色範囲の反映だけを記録する（座標はそのまま）."""
+
+    def __init__(self, color_ranges):
+        self.colors = list(color_ranges)
+        self.color_ranges = dict(color_ranges)
+
+    def set_color_ranges(self, color_ranges):
+        self.color_ranges = dict(color_ranges)
+
+    def frame_point(self, x, y):
+        return x, y
+
+
+def _hsv_pixels(h, s, v, n=200):
+    return np.tile(np.array([[h, s, v]], dtype=np.uint8), (n, 1))
+
+
+# 色相 hue ± 5、彩度 150〜222 のまだらなフレームと、その中央のボールの検出結果
+def _result(hue, found=True):
+    ys, xs = np.mgrid[0:120, 0:160]
+    hsv = np.stack([hue - 5 + xs % 11, 150 + (ys % 19) * 4, np.full_like(xs, 200)], axis=2)
+    frame = cv2.cvtColor(hsv.astype(np.uint8), cv2.COLOR_HSV2BGR)
+    best = Detection(80.0, 60.0, 30.0, 'blue', np.pi * 30.0 ** 2, 50.0) if found else None
+    return DetectionResult(None, best, frame, None, None, {})
+
+
+def test_model_rolls_back_when_drifted():
+    model = AdaptiveColorModel(params.COLOR_RANGES['blue'], learning_rate=0.5, max_drift=0.6)
+    for _ in range(10):
+        model.update(_hsv_pixels(30, 200, 200))
+    assert model.drifted()
+    assert not np.array_equal(model.color_range()[0], params.COLOR_RANGES['blue'][0])
+    # 一度も確かめていないので、元の色範囲に戻る
+    model.rollback()
+    assert model.drift() == 0.0
+    assert model.color_range() is params.COLOR_RANGES['blue']
+
+
+def test_drifted_model_is_not_applied():
+    detector = FakeDetector(params.COLOR_RANGES)
+    ranges = AdaptiveColorRanges(detector, params.COLOR_RANGES, update_every=5,
+                                 learning_rate=0.5)
+    for _ in range(5):
+        ranges.update(_result(30))
+    # 黄色に寄ったヒストグラムは元の範囲から離れすぎたので、反映せずに戻している
+    assert ranges.models['blue'].drift() == 0.0
+    assert detector.color_ranges == params.COLOR_RANGES
+    assert not ranges.pending_confirm
+
+
+def test_ranges_roll_back_to_static_after_misses():
+    detector = FakeDetector(params.COLOR_RANGES)
+    ranges = AdaptiveColorRanges(detector, params.COLOR_RANGES, update_every=5, max_misses=3,
+                                 learning_rate=0.2)
+    # 範囲の端に寄った青で学習し、狭めた範囲を反映する
+    for _ in range(5):
+        ranges.update(_result(113))
+    assert ranges.pending_confirm
+    lower, upper = detector.color_ranges['blue']
+    assert not np.array_equal(lower, params.COLOR_RANGES['blue'][0])
+
+    # 反映した範囲で見失い続けたら、元の静的な範囲に戻す
+    for _ in range(3):
+        ranges.update(_result(113, found=False))
+    assert not ranges.pending_confirm
+    for color, (lower, upper) in params.COLOR_RANGES.items():
+        np.testing.assert_array_equal(detector.color_ranges[color][0], lower)
+        np.testing.assert_array_equal(detector.color_ranges[color][1], upper)
+
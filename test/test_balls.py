@@ -0,0 +1,65 @@
+import numpy as np
+
+from mypkg.balls import BALL_DTYPE, BallBuffer, largest, nearest, of_color, per_color
+
+COLOR_IDS = {'red': 0, 'blue': 1, 'yellow': 2}
+
+CIRCLES = [
+    (100.0, 50.0, 30.0, 'blue', 2800.0, 0.9),
+    (300.0, 60.0, 20.0, 'red', 1250.0, 0.8),
+    (500.0, 70.0, 25.0, 'red', 1900.0, 0.7),
+    (700.0, 80.0, 10.0, 'yellow', 310.0, 0.6),
+]
+
+
+def _balls(distances=None):
+    balls = BallBuffer(8).fill(CIRCLES, COLOR_IDS).copy()
+    if distances is not None:
+        balls['distance'] = distances
+    return balls
+
+
+def test_fill_writes_fields():
+    balls = BallBuffer(8).fill(CIRCLES, COLOR_IDS)
+    assert balls.dtype == BALL_DTYPE
+    assert len(balls) == len(CIRCLES)
+    np.testing.assert_array_equal(balls['color'], [1, 0, 0, 2])
+    np.testing.assert_array_equal(balls['radius'], [30, 20, 25, 10])
+    np.testing.assert_array_equal(balls['area'], [2800, 1250, 1900, 310])
+    np.testing.assert_allclose(balls['score'], [0.9, 0.8, 0.7, 0.6], rtol=1e-6)
+    assert np.all(np.isnan(balls['distance']))
+
+
+def test_fill_reuses_buffer_and_limits_count():
+    buffer = BallBuffer(2)
+    first = buffer.fill(CIRCLES, COLOR_IDS)
+    assert len(first) == 2
+    second = buffer.fill(CIRCLES[2:], COLOR_IDS)
+    # 同じ配列のビューなので、前のフレームの結果は上書きされる
+    assert np.shares_memory(first, second)
+    assert first['x'][0] == 500.0
+    assert len(buffer.fill([], COLOR_IDS)) == 0
+
+
+def test_largest():
+    assert largest(_balls())['x'] == 100.0
+    assert largest(_balls()[:0]) is None
+
+
+def test_nearest_uses_distance_or_radius():
+    assert nearest(_balls([50.0, np.nan, 30.0, 80.0]))['x'] == 500.0
+    # 距離がひとつも求まっていなければ半径が最大のもの
+    assert nearest(_balls())['x'] == 100.0
+    assert nearest(_balls()[:0]) is None
+
+
+def test_per_color_keeps_largest_of_each_color():
+    balls = per_color(_balls())
+    np.testing.assert_array_equal(balls['color'], [0, 1, 2])
+    np.testing.assert_array_equal(balls['x'], [500.0, 100.0, 700.0])
+    assert len(per_color(_balls()[:0])) == 0
+
+
+def test_of_color():
+    np.testing.assert_array_equal(of_color(_balls(), 0)['x'], [300.0, 500.0])
+    assert len(of_color(_balls(), 5)) == 0
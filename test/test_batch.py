@@ -0,0 +1,9 @@
+from mypkg.batch import shard_path
+
+
+def test_shard_path_distinguishes_same_named_sources(tmp_path):
+    a = shard_path(str(tmp_path), 'day1/run.mp4', 0)
+    b = shard_path(str(tmp_path), 'day2/run.mp4', 0)
+    assert a != b
+    assert shard_path(str(tmp_path), 'day1/run.mp4', 0) == a
+    assert shard_path(str(tmp_path), 'day1/run.mp4', 1800) != a
@@ -0,0 +1,37 @@
+import cv2
+import numpy as np
+
+from mypkg.blobs import axis_ratio, blob_stats, circles_from_mask
+
+
+def _mask(*shapes):
+    mask = np.zeros((400, 600), np.uint8)
+    for center, axes, angle in shapes:
+        cv2.ellipse(mask, center, axes, angle, 0, 360, 255, -1)
+    return mask
+
+
+def test_axis_ratio_of_circle_and_ellipse():
+    circle = _mask(((200, 200), (50, 50), 0))
+    ellipse = _mask(((200, 200), (80, 20), 45))
+    assert axis_ratio(cv2.moments(circle, binaryImage=True)) > 0.95
+    np.testing.assert_allclose(axis_ratio(cv2.moments(ellipse, binaryImage=True)), 0.25,
+                               atol=0.03)
+
+
+def test_diagonal_ellipse_is_rejected():
+    # 45 度傾いた細長い楕円は外接矩形がほぼ正方形になる
+    mask = _mask(((150, 200), (40, 40), 0), ((420, 200), (110, 25), 45))
+    _, blobs = blob_stats(mask)
+    assert blobs['aspect'].min() > 0.9
+    circles = circles_from_mask(mask, 'red', min_area=100, min_aspect=0.5)
+    assert len(circles) == 1
+    x, y, radius = circles[0][:3]
+    assert abs(x - 150) < 2 and abs(y - 200) < 2 and abs(radius - 40) < 2
+
+
+def test_candidates_after_rejected_ones_are_examined():
+    mask = _mask(((300, 200), (150, 30), 45), ((100, 80), (30, 30), 0))
+    circles = circles_from_mask(mask, 'red', min_area=100, max_candidates=1, min_aspect=0.5)
+    assert len(circles) == 1
+    assert abs(circles[0][0] - 100) < 2
@@ -0,0 +1,46 @@
+import numpy as np
+
+from mypkg import params
+from mypkg import calibration
+from mypkg.calibration import calib_path, load_camera_params, save_calibration
+
+
+def _save(path, image_size, camera_matrix=params.CAMERA_MATRIX):
+    calib = {'rms': 0.2, 'camera_matrix': camera_matrix,
+             'dist_coeffs': params.DIST_COEFFS, 'per_view_errors': []}
+    save_calibration(path, calib, image_size)
+
+
+def test_load_camera_params_scales_to_image_size(tmp_path):
+    path = str(tmp_path / 'calib.json')
+    _save(path, (1280, 720))
+    camera_matrix, _ = load_camera_params(path=path, image_size=(640, 360))
+    np.testing.assert_allclose(camera_matrix[:2], params.CAMERA_MATRIX[:2] / 2)
+    np.testing.assert_allclose(camera_matrix[2], [0, 0, 1])
+
+
+def test_load_camera_params_keeps_other_aspect(tmp_path, capsys):
+    path = str(tmp_path / 'calib.json')
+    _save(path, (1280, 720))
+    camera_matrix, _ = load_camera_params(path=path, image_size=(1280, 675))
+    np.testing.assert_allclose(camera_matrix, params.CAMERA_MATRIX)
+    assert '縦横比が違います' in capsys.readouterr().out
+
+
+def test_load_camera_params_same_size(tmp_path):
+    path = str(tmp_path / 'calib.json')
+    _save(path, (1280, 720))
+    camera_matrix, _ = load_camera_params(path=path, image_size=(1280, 720))
+    np.testing.assert_allclose(camera_matrix, params.CAMERA_MATRIX)
+
+
+def test_calib_path_per_camera(tmp_path, monkeypatch):
+    monkeypatch.setattr(calibration, 'CALIB_DIR', str(tmp_path))
+    assert calib_path(0) == calib_path('/dev/video0')
+    assert calib_path('/dev/video4') != calib_path(0)
+    camera_matrix = params.CAMERA_MATRIX.copy()
+    camera_matrix[0, 0] *= 1.1
+    _save(calib_path('/dev/video4'), (1280, 720), camera_matrix)
+    # 別のカメラは /dev/video4 の較正を使わない
+    np.testing.assert_allclose(load_camera_params('/dev/video4', (1280, 720))[0], camera_matrix)
+    np.testing.assert_allclose(load_camera_params(0, (1280, 720))[0], params.CAMERA_MATRIX)
@@ -0,0 +1,110 @@
+import time
+
+import numpy as np
+import pytest
+
+from mypkg.capture import CaptureTimeout, ThreadedCapture
+
+
+class FakeCapture:
+    """delays[i] 秒待ってから i 枚目を返す（fail の番号は読み込み失敗）。尽きたら閉じる.
+
+    retrieve_delay 秒はデコードにかかる時間（grab() の時刻は grab_times に残す）。
+    """
+
+    def __init__(self, delays, fail=(), retrieve_delay=0.0):
+        self.delays = list(delays)
+        self.fail = set(fail)
+        self.retrieve_delay = retrieve_delay
+        self.grab_times = []
+        self.count = 0
+        self.opened = True
+
+    def grab(self):
+        if self.count >= len(self.delays):
+            self.opened = False
+            return False
+        time.sleep(self.delays[self.count])
+        self.grab_times.append(time.time())
+        self.count += 1
+        return self.count - 1 not in self.fail
+
+    def retrieve(self, image=None):
+        time.sleep(self.retrieve_delay)
+        return True, np.full((2, 2, 3), self.count - 1, dtype=np.uint8)
+
+    def read(self, image=None):
+        if not self.grab():
+            return False, None
+        return self.retrieve(image)
+
+    def isOpened(self):
+        return self.opened
+
+    def get(self, prop_id):
+        return 0.0
+
+    def release(self):
+        self.opened = False
+
+
+def test_read_waits_for_slow_first_frame():
+    capture = ThreadedCapture(FakeCapture([1.2, 0.01]))
+    try:
+        # 1 秒以上かかっても終わりとは扱わない
+        captured = capture.read()
+        assert captured is not None
+        assert captured.frame[0, 0, 0] == 0
+    finally:
+        capture.release()
+
+
+def test_read_timeout_is_not_end_of_stream():
+    capture = ThreadedCapture(FakeCapture([0.3, 0.01]))
+    try:
+        with pytest.raises(CaptureTimeout):
+            capture.read(timeout=0.05)
+        assert capture.read() is not None
+    finally:
+        capture.release()
+
+
+def test_read_retries_transient_failures():
+    capture = ThreadedCapture(FakeCapture([0.01, 0.01, 0.01], fail={0, 1}))
+    try:
+        captured = capture.read()
+        assert captured is not None
+        assert captured.frame[0, 0, 0] == 2
+    finally:
+        capture.release()
+
+
+def test_read_returns_none_at_end_of_stream():
+    capture = ThreadedCapture(FakeCapture([0.01]))
+    try:
+        assert capture.read() is not None
+        assert capture.read() is None
+    finally:
+        capture.release()
+
+
+def test_stamp_is_taken_at_grab():
+    fake = FakeCapture([0.01], retrieve_delay=0.2)
+    capture = ThreadedCapture(fake)
+    try:
+        captured = capture.read()
+        # デコードの 0.2 秒は撮影時刻に含めない
+        assert captured.stamp - fake.grab_times[0] < 0.1
+    finally:
+        capture.release()
+
+
+def test_release_waits_for_the_thread_before_closing():
+    fake = FakeCapture([0.01, 1.5])
+    capture = ThreadedCapture(fake)
+    assert capture.read() is not None
+    # 2 枚目の grab() の途中で止めるので、スレッドが終わるまではカメラを閉じない
+    capture.release()
+    assert fake.opened
+    capture.thread.join()
+    assert not fake.opened
@@ -0,0 +1,79 @@
+import cv2
+import numpy as np
+import pytest
+
+from mypkg.color_lut import MAX_RANGES, ColorClassifier
+
+
+def _random_hsv(shape=(120, 160), seed=0):
+    rng = np.random.default_rng(seed)
+    hsv = rng.integers(0, 256, size=shape + (3,), dtype=np.uint8)
+    hsv[:, :, 0] %= 180
+    return hsv
+
+
+# 従来の方法（色ごとに inRange して OR、折り返す範囲は 2 つに分ける）
+def _in_range(hsv, lower, upper):
+    lower, upper = np.asarray(lower), np.asarray(upper)
+    if lower[0] <= upper[0]:
+        return cv2.inRange(hsv, lower, upper)
+    low = cv2.inRange(hsv, lower, np.array([179, upper[1], upper[2]]))
+    high = cv2.inRange(hsv, np.array([0, lower[1], lower[2]]), upper)
+    return cv2.bitwise_or(low, high)
+
+
+def _reference_labels(hsv, color_ranges):
+    labels = np.zeros(hsv.shape[:2], dtype=np.uint8)
+    # 後の色から書き、先の色で上書きする（重なりは先の色を優先）
+    for label, value in reversed(list(enumerate(color_ranges.values(), 1))):
+        ranges = [value] if np.ndim(value[0]) == 1 else value
+        mask = np.zeros(hsv.shape[:2], dtype=np.uint8)
+        for lower, upper in ranges:
+            mask |= _in_range(hsv, lower, upper)
+        labels[mask > 0] = label
+    return labels
+
+
+COLOR_RANGES = {
+    # 179→0 をまたぐ赤
+    'red': (np.array([170, 80, 80]), np.array([10, 255, 255])),
+    # 赤と重なる範囲を持つオレンジ（重なる画素は赤になる）
+    'orange': (np.array([5, 60, 60]), np.array([25, 255, 255])),
+    # 2 つの範囲を持つ色
+    'blue': [(np.array([90, 90, 100]), np.array([110, 225, 255])),
+             (np.array([115, 50, 50]), np.array([130, 200, 200]))],
+}
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_classify_matches_in_range(seed):
+    hsv = _random_hsv(seed=seed)
+    classifier = ColorClassifier(COLOR_RANGES)
+    labels, mask = classifier.classify(hsv)
+    expected = _reference_labels(hsv, COLOR_RANGES)
+    np.testing.assert_array_equal(labels, expected)
+    np.testing.assert_array_equal(mask, np.where(expected > 0, 255, 0))
+
+
+def test_color_mask_and_overlap_priority():
+    classifier = ColorClassifier(COLOR_RANGES)
+    # H=7 は赤とオレンジの両方の範囲に入る
+    hsv = np.array([[[7, 200, 200], [20, 200, 200], [120, 100, 100], [60, 200, 200]]],
+                   dtype=np.uint8)
+    labels, _ = classifier.classify(hsv)
+    np.testing.assert_array_equal(labels[0], [1, 2, 3, 0])
+    np.testing.assert_array_equal(classifier.color_mask(labels, 'orange')[0], [0, 255, 0, 0])
+
+
+def test_classify_writes_into_given_buffer():
+    hsv = _random_hsv()
+    out = np.empty(hsv.shape[:2], dtype=np.uint8)
+    labels, _ = ColorClassifier(COLOR_RANGES).classify(hsv, labels=out)
+    assert labels is out or np.shares_memory(labels, out)
+    np.testing.assert_array_equal(out, _reference_labels(hsv, COLOR_RANGES))
+
+
+def test_too_many_ranges():
+    ranges = [(np.array([i, 0, 0]), np.array([i, 255, 255])) for i in range(MAX_RANGES + 1)]
+    with pytest.raises(ValueError):
+        ColorClassifier({'many': ranges})
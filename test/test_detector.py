@@ -0,0 +1,42 @@
+import cv2
+import numpy as np
+
+from mypkg import params
+from mypkg.detector import BallDetector
+
+
+# 歪みのない画像に描いた円を、カメラで撮ったように歪ませたフレーム
+def _distorted_frame(center, radius, size=(1280, 720)):
+    w, h = size
+    hsv = np.zeros((h, w, 3), np.uint8)
+    lower, upper = params.COLOR_RANGES['blue']
+    cv2.circle(hsv, center, radius, ((np.asarray(lower) + np.asarray(upper)) // 2).tolist(), -1)
+    ideal = cv2.cvtColor(hsv, cv2.COLOR_HSV2BGR)
+    # 歪んだフレームの各画素が、歪みのない画像のどこに当たるか
+    xs, ys = np.meshgrid(np.arange(w, dtype=np.float32), np.arange(h, dtype=np.float32))
+    pts = np.stack([xs.ravel(), ys.ravel()], axis=1).reshape(-1, 1, 2)
+    undist = cv2.undistortPoints(pts, params.CAMERA_MATRIX, params.DIST_COEFFS,
+                                 P=params.CAMERA_MATRIX).reshape(h, w, 2)
+    return cv2.remap(ideal, undist[:, :, 0], undist[:, :, 1], cv2.INTER_LINEAR)
+
+
+def _detector(undistort):
+    return BallDetector(params.COLOR_RANGES, camera_matrix=params.CAMERA_MATRIX,
+                        dist_coeffs=params.DIST_COEFFS, undistort=undistort,
+                        ball_diameter=params.BALL_DIAMETER)
+
+
+def test_sparse_and_remap_give_same_centre_off_axis():
+    frame = _distorted_frame((1150, 640), 45)
+    raw = _detector(None).detect(frame).best
+    remap = _detector('remap').detect(frame).best
+    sparse = _detector('sparse').detect(frame).best
+    assert abs(remap.x - 1150) < 2 and abs(remap.y - 640) < 2
+    # 補正しない中心とは離れている（補正が効いている）
+    assert np.hypot(raw.x - remap.x, raw.y - remap.y) > 5
+    assert abs(sparse.x - remap.x) < 1.5 and abs(sparse.y - remap.y) < 1.5
+    assert abs(sparse.radius - remap.radius) < 1.5
+    assert abs(sparse.distance - remap.distance) / remap.distance < 0.03
+    # 補正後の中心をフレーム上に戻すと、補正しないときの中心に重なる
+    fx, fy = _detector('sparse').frame_point(sparse.x, sparse.y)
+    assert abs(fx - raw.x) < 1.5 and abs(fy - raw.y) < 1.5
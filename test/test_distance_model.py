@@ -0,0 +1,55 @@
+import numpy as np
+
+from mypkg import params
+from mypkg.detector import BallDetector
+from mypkg.distance_model import (MODEL_VERSION, DistanceLut, fit_model, load_distance_lut,
+                                  save_model)
+
+
+def _model(detector, **overrides):
+    model = {
+        'version': MODEL_VERSION,
+        'a': 2000.0,
+        'b': 1.0,
+        'camera': '/dev/video4',
+        'image_size': [1280, 720],
+        'detector': detector.measurement_config(),
+    }
+    model.update(overrides)
+    return model
+
+
+def test_fit_model_recovers_coefficients():
+    px = np.array([20.0, 40.0, 80.0, 160.0])
+    coeffs = fit_model(px, 2000.0 / px + 1.0)
+    np.testing.assert_allclose(coeffs, (2000.0, 1.0))
+
+
+def test_lut_matches_model():
+    lut = DistanceLut((2000.0, 1.0))
+    np.testing.assert_allclose(lut.lookup(np.array([40.0, 100.0])), [51.0, 21.0], rtol=1e-6)
+
+
+def test_load_distance_lut_matching(tmp_path):
+    detector = BallDetector(params.COLOR_RANGES)
+    path = str(tmp_path / 'model.json')
+    save_model(path, _model(detector))
+    lut = load_distance_lut(path, detector, '/dev/video4', (1280, 720))
+    assert lut is not None
+    assert lut.coeffs == (2000.0, 1.0)
+
+
+def test_load_distance_lut_refuses_other_camera_or_undistort(tmp_path):
+    detector = BallDetector(params.COLOR_RANGES)
+    path = str(tmp_path / 'model.json')
+    save_model(path, _model(detector))
+    assert load_distance_lut(path, detector, '/dev/video0', (1280, 720)) is None
+    assert load_distance_lut(path, detector, '/dev/video4', (640, 480)) is None
+
+    sparse = BallDetector(params.COLOR_RANGES, camera_matrix=params.CAMERA_MATRIX,
+                          dist_coeffs=params.DIST_COEFFS, undistort='sparse')
+    assert load_distance_lut(path, sparse, '/dev/video4', (1280, 720)) is None
+
+
+def test_load_distance_lut_missing(tmp_path):
+    assert load_distance_lut(str(tmp_path / 'none.json')) is None
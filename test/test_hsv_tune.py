@@ -0,0 +1,60 @@
+import numpy as np
+
+from mypkg.hsv_tune import HsvHistograms, box_count, integral, tune_color
+
+
+def _random_hist(shape=(12, 4, 4), seed=0):
+    return np.random.default_rng(seed).integers(0, 10, size=shape).astype(np.float64)
+
+
+def test_box_count_matches_direct_sum():
+    hist = _random_hist()
+    table = integral(hist)
+    assert box_count(table, 2, 7, 1, 2, 0, 3) == hist[2:8, 1:3, 0:4].sum()
+
+
+def test_box_count_hue_wraparound():
+    hist = _random_hist()
+    table = integral(hist)
+    # h0 > h1 は 11→0 をまたぐ範囲
+    expected = hist[9:, 0:2, 1:3].sum() + hist[:3, 0:2, 1:3].sum()
+    assert box_count(table, 9, 2, 0, 1, 1, 2) == expected
+
+
+def test_box_count_vectorized():
+    hist = _random_hist()
+    table = integral(hist)
+    h0 = np.array([0, 9, 5])
+    h1 = np.array([3, 2, 5])
+    counts = box_count(table, h0, h1, 0, 3, 0, 3)
+    expected = [box_count(table, a, b, 0, 3, 0, 3) for a, b in zip(h0, h1)]
+    np.testing.assert_array_equal(counts, expected)
+
+
+def test_negative_includes_other_balls():
+    hists = HsvHistograms(['red', 'yellow'], bins=(12, 4, 4))
+    hists.background[0, 0, 0] = 5
+    hists.ball['red'][1, 1, 1] = 7
+    hists.ball['yellow'][2, 2, 2] = 3
+    negative = hists.negative('red')
+    assert negative[0, 0, 0] == 5
+    assert negative[2, 2, 2] == 3
+    assert negative[1, 1, 1] == 0
+
+
+def test_tune_color_avoids_other_ball():
+    bins = (12, 4, 4)
+    hists = HsvHistograms(['red', 'yellow'], bins=bins)
+    hists.ball['red'][1, 3, 3] = 100
+    # 赤の画素の一部は黄色と同じビンにある（背景だけで数えると含めてしまう）
+    hists.ball['red'][2, 3, 3] = 10
+    hists.ball['yellow'][2, 3, 3] = 100
+    hists.background[6, 0, 0] = 1000
+    lower, upper, precision, recall = tune_color(hists.ball['red'], hists.negative('red'))
+    assert precision == 1.0
+    # 黄色のビン (H ビン 2 = 30〜44) は含まない（下限 > 上限なら 179→0 をまたぐ範囲）
+    h = 35
+    if lower[0] <= upper[0]:
+        assert not lower[0] <= h <= upper[0]
+    else:
+        assert not (h >= lower[0] or h <= upper[0])
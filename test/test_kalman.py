@@ -0,0 +1,122 @@
+import numpy as np
+import pytest
+
+from mypkg.balls import BALL_DTYPE
+from mypkg.kalman import BallKalman, BallStateEstimator
+
+
+def _track(kf, velocity=(300.0, -150.0, -20.0), start=(100.0, 400.0, 80.0), frames=30,
+           dt=1 / 15):
+    for i in range(frames):
+        t = i * dt
+        kf.update(t, (start[0] + velocity[0] * t, start[1] + velocity[1] * t),
+                  start[2] + velocity[2] * t)
+    return (frames - 1) * dt
+
+
+def test_first_update_sets_position():
+    kf = BallKalman()
+    assert kf.predict(0.0) is None
+    kf.update(1.0, (10.0, 20.0), 50.0)
+    state = kf.predict(1.0)
+    assert (state.x, state.y, state.distance) == (10.0, 20.0, 50.0)
+    assert (state.vx, state.vy, state.vdistance) == (0.0, 0.0, 0.0)
+
+
+@pytest.mark.parametrize('model', ['cv', 'ca'])
+def test_constant_velocity_is_tracked(model):
+    kf = BallKalman(model=model)
+    last = _track(kf)
+    state = kf.predict(last)
+    np.testing.assert_allclose((state.vx, state.vy, state.vdistance), (300.0, -150.0, -20.0),
+                               rtol=0.05)
+    # 0.1 秒先は速度で外挿する
+    ahead = kf.predict(last + 0.1)
+    np.testing.assert_allclose(ahead.x, state.x + 0.1 * state.vx, atol=1.0)
+    assert ahead.stamp == last + 0.1
+
+
+def test_predict_does_not_change_filter():
+    kf = BallKalman()
+    last = _track(kf, frames=5)
+    before = kf.x.copy(), kf.P.copy(), kf.stamp
+    kf.predict(last + 1.0)
+    np.testing.assert_array_equal(kf.x, before[0])
+    np.testing.assert_array_equal(kf.P, before[1])
+    assert kf.stamp == before[2]
+
+
+def test_update_reduces_uncertainty():
+    kf = BallKalman()
+    kf.update(0.0, (0.0, 0.0), 50.0)
+    velocity_var = kf.P[3, 3]
+    kf.update(1 / 15, (20.0, 0.0), 50.0)
+    assert kf.P[3, 3] < velocity_var
+
+
+def test_unknown_model():
+    with pytest.raises(ValueError):
+        BallKalman(model='ukf')
+
+
+def _balls(*rows):
+    balls = np.zeros(len(rows), dtype=BALL_DTYPE)
+    for i, (color, x, y, distance) in enumerate(rows):
+        balls[i] = (color, x, y, 20.0, distance, 0.0, 0.0)
+    return balls
+
+
+def test_estimator_drops_stale_tracks():
+    estimator = BallStateEstimator(timeout=0.5)
+    (track_id,) = estimator.update(0.0, _balls((0, 10.0, 10.0, 50.0)))
+    assert estimator.predict(track_id, 0.3) is not None
+    assert estimator.predict(track_id, 0.6) is None
+    assert estimator.predict(track_id + 1, 0.0) is None
+    # 時間が空いたら前の速度を引き継がずに新しい軌跡で始め直す
+    (new_id,) = estimator.update(2.0, _balls((0, 500.0, 10.0, 50.0)))
+    assert new_id != track_id
+    assert estimator.predict(new_id, 2.0).vx == 0.0
+    assert list(estimator.states(2.0)) == [new_id]
+
+
+def test_estimator_skips_balls_without_distance():
+    estimator = BallStateEstimator()
+    ids = estimator.update(0.0, _balls((0, 10.0, 10.0, np.nan), (0, 300.0, 10.0, 50.0)))
+    assert ids[0] == -1 and ids[1] >= 0
+    assert len(estimator.states(0.0)) == 1
+
+
+def test_estimator_tracks_two_balls_of_the_same_color():
+    estimator = BallStateEstimator(timeout=0.5)
+    dt = 1 / 15
+    first = None
+    for i in range(30):
+        t = i * dt
+        a = (0, 100.0 + 300.0 * t, 200.0, 80.0)
+        b = (0, 600.0 - 300.0 * t, 400.0, 60.0)
+        # 検出の順番は半径で入れ替わるので、並びに頼らず予測位置で割り当てる
+        rows = (a, b) if i % 2 else (b, a)
+        ids = estimator.update(t, _balls(*rows))
+        ids = ids if i % 2 else ids[::-1]
+        if first is None:
+            first = tuple(ids)
+        assert tuple(ids) == first
+    a_state = estimator.predict(first[0], t)
+    b_state = estimator.predict(first[1], t)
+    np.testing.assert_allclose((a_state.vx, a_state.y, a_state.distance), (300.0, 200.0, 80.0),
+                               rtol=0.05)
+    np.testing.assert_allclose((b_state.vx, b_state.y, b_state.distance), (-300.0, 400.0, 60.0),
+                               rtol=0.05)
+
+
+def test_estimator_gates_far_detections():
+    estimator = BallStateEstimator()
+    (track_id,) = estimator.update(0.0, _balls((0, 100.0, 100.0, 50.0)))
+    (near_id,) = estimator.update(1 / 15, _balls((0, 104.0, 100.0, 50.0)))
+    assert near_id == track_id
+    # 予測から大きく外れた同じ色のボールは、別のボールとして新しい軌跡を始める
+    ids = estimator.update(2 / 15, _balls((0, 108.0, 100.0, 50.0), (0, 900.0, 500.0, 50.0)))
+    assert ids[0] == track_id and ids[1] != track_id
+    # 色が違えば近くても割り当てない
+    (other_id,) = estimator.update(3 / 15, _balls((1, 112.0, 100.0, 50.0)))
+    assert other_id not in (track_id, ids[1])
@@ -0,0 +1,69 @@
+import cv2
+import numpy as np
+
+from mypkg import params
+from mypkg.detector import BallDetector
+from mypkg.mjpeg import MjpegCapture, MjpegDecoder
+
+
+class FakeMjpegCamera:
+    """CONVERT_RGB を切った V4L2 のように JPEG のバイト列を (1, N) で返す."""
+
+    def __init__(self, frame):
+        ok, data = cv2.imencode('.jpg', frame)
+        assert ok
+        self.data = data.reshape(1, -1)
+
+    def set(self, prop_id, value):
+        return True
+
+    def grab(self):
+        return True
+
+    def retrieve(self, image=None):
+        return True, self.data.copy()
+
+    def read(self, image=None):
+        return self.retrieve(image)
+
+    def isOpened(self):
+        return True
+
+    def get(self, prop_id):
+        return 0.0
+
+    def release(self):
+        pass
+
+
+def _ball_frame(size=(1280, 720), center=(400, 300), radius=60):
+    hsv = np.zeros((size[1], size[0], 3), np.uint8)
+    lower, upper = params.COLOR_RANGES['blue']
+    color = ((np.asarray(lower) + np.asarray(upper)) // 2).tolist()
+    cv2.circle(hsv, center, radius, color, -1)
+    return cv2.cvtColor(hsv, cv2.COLOR_HSV2BGR)
+
+
+def test_mjpeg_capture_reuses_buffer():
+    cap = MjpegCapture(FakeMjpegCamera(_ball_frame()), MjpegDecoder(2))
+    ret, first = cap.read()
+    assert ret and first.shape == (360, 640, 3)
+    ret, second = cap.read(first)
+    assert ret
+    assert second is first
+
+
+def test_decode_scale_keeps_full_resolution_distance():
+    frame = _ball_frame()
+    small = cv2.resize(frame, (640, 360), interpolation=cv2.INTER_AREA)
+    full = BallDetector(params.COLOR_RANGES, ball_diameter=5.5, focal_length=700)
+    half = BallDetector(params.COLOR_RANGES, ball_diameter=5.5, focal_length=700,
+                        decode_scale=2)
+    best_full = full.detect(frame).best
+    best_half = half.detect(small).best
+    assert best_half is not None
+    assert abs(best_half.x * 2 - best_full.x) < 3
+    assert abs(best_half.distance - best_full.distance) / best_full.distance < 0.05
+    # min_area は縮小後のフレームに合わせる
+    assert half.min_area == full.min_area / 4
+    assert half.measurement_config()['min_area'] == full.measurement_config()['min_area']
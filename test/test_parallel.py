@@ -0,0 +1,38 @@
+import cv2
+import numpy as np
+import pytest
+
+from mypkg import params
+from mypkg.detector import BallDetector
+
+
+# 色の違うボールを 3 個描いたフレーム（各色の範囲の真ん中の HSV）
+def _frame(size=(640, 360)):
+    w, h = size
+    hsv = np.zeros((h, w, 3), np.uint8)
+    for (center, radius), color in zip((((120, 100), 40), ((330, 200), 55), ((520, 260), 30)),
+                                       ('red', 'blue', 'yellow')):
+        lower, upper = params.COLOR_RANGES[color]
+        mid = (np.asarray(lower) + np.asarray(upper)) // 2
+        cv2.circle(hsv, center, radius, mid.tolist(), -1)
+    return cv2.cvtColor(hsv, cv2.COLOR_HSV2BGR)
+
+
+def _balls(frame, method, **kwargs):
+    detector = BallDetector(params.COLOR_RANGES, method=method,
+                            frame_size=frame.shape[1::-1], **kwargs)
+    try:
+        return detector.detect(frame).balls.copy()
+    finally:
+        detector.close()
+
+
+@pytest.mark.parametrize('start_method', ['fork', 'forkserver'])
+@pytest.mark.parametrize('method', ['contour', 'canny'])
+def test_parallel_matches_serial(method, start_method):
+    frame = _frame()
+    serial = _balls(frame, method)
+    parallel = _balls(frame, method, workers=2, start_method=start_method)
+    assert len(serial) == 3
+    for name in serial.dtype.names:
+        np.testing.assert_array_equal(parallel[name], serial[name], err_msg=name)
@@ -0,0 +1,34 @@
+import cv2
+import numpy as np
+import pytest
+
+from mypkg import params
+from mypkg.detector import BallDetector
+
+
+def _frame():
+    hsv = np.zeros((720, 1280, 3), np.uint8)
+    for i, (lower, upper) in enumerate(params.COLOR_RANGES.values()):
+        color = ((np.asarray(lower) + np.asarray(upper)) // 2).tolist()
+        cv2.circle(hsv, (250 + 350 * i, 360), 40 + 15 * i, color, -1)
+    # 45 度傾いた細長い成分（候補の採点で落ちる）
+    lower, upper = params.COLOR_RANGES['blue']
+    color = ((np.asarray(lower) + np.asarray(upper)) // 2).tolist()
+    cv2.ellipse(hsv, (1100, 150), (120, 20), 45, 0, 360, color, -1)
+    return cv2.cvtColor(hsv, cv2.COLOR_HSV2BGR)
+
+
+@pytest.mark.parametrize('level', [1, 2])
+def test_pyramid_matches_full_resolution(level):
+    frame = _frame()
+    full = BallDetector(params.COLOR_RANGES).detect(frame).balls
+    pyramid = BallDetector(params.COLOR_RANGES, pyramid_level=level).detect(frame).balls
+    assert len(pyramid) == len(full) == len(params.COLOR_RANGES)
+    for name in ('x', 'y', 'radius'):
+        np.testing.assert_allclose(pyramid[name], full[name], atol=1.0)
+    np.testing.assert_array_equal(pyramid['color'], full['color'])
+
+
+def test_pyramid_rejects_other_methods():
+    with pytest.raises(ValueError):
+        BallDetector(params.COLOR_RANGES, method='canny', pyramid_level=1)
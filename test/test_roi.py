@@ -0,0 +1,67 @@
+from mypkg.roi import RoiTracker
+
+SHAPE = (720, 1280, 3)
+
+
+def test_window_is_full_frame_until_locked():
+    roi = RoiTracker()
+    assert not roi.locked
+    assert roi.window(SHAPE) is None
+
+
+def test_window_follows_velocity():
+    roi = RoiTracker(window_scale=2.0, min_half_size=10)
+    roi.update((600.0, 300.0), 20.0, True)
+    roi.update((620.0, 290.0), 20.0, False)
+    # 次は (640, 280) と予測し、半径と速さの分だけ広げる（2 * 20 + 20）
+    assert roi.window(SHAPE) == (580, 220, 701, 341)
+
+
+def test_window_is_clamped_at_frame_edges():
+    roi = RoiTracker()
+    roi.update((10.0, 710.0), 20.0, True)
+    x0, y0, x1, y1 = roi.window(SHAPE)
+    assert (x0, y1) == (0, 720)
+    assert 0 < x1 < 1280 and 0 < y0 < 720
+    roi.reset()
+    roi.update((1275.0, 3.0), 20.0, True)
+    x0, y0, x1, y1 = roi.window(SHAPE)
+    assert (y0, x1) == (0, 1280)
+    # 予測位置が画面の外に出て幅がなくなったら全体探索
+    roi.reset()
+    roi.update((1200.0, 360.0), 5.0, True)
+    roi.update((1400.0, 360.0), 5.0, False)
+    assert roi.window(SHAPE) is None
+
+
+def test_lost_lock_falls_back_to_full_frame():
+    roi = RoiTracker(max_misses=3)
+    roi.update((600.0, 300.0), 20.0, True)
+    window = roi.window(SHAPE)
+    for _ in range(3):
+        roi.update(None, 0, False)
+        # 見失っている間は探索範囲を広げて探し続ける
+        assert roi.locked
+        wider = roi.window(SHAPE)
+        assert wider[0] <= window[0] and wider[2] >= window[2]
+    roi.update(None, 0, False)
+    assert not roi.locked
+    assert roi.window(SHAPE) is None
+    # 次に見つけたところから追い直す（前の速度は引き継がない）
+    roi.update((100.0, 100.0), 20.0, True)
+    assert roi.velocity == (0.0, 0.0)
+
+
+def test_full_search_every_n_frames():
+    roi = RoiTracker(full_every=5)
+    roi.update((600.0, 300.0), 20.0, True)
+    for _ in range(4):
+        assert roi.window(SHAPE) is not None
+        roi.update((600.0, 300.0), 20.0, False)
+    assert roi.window(SHAPE) is not None
+    roi.update((600.0, 300.0), 20.0, False)
+    # full_every フレーム続けて絞ったら、捉えていても全体探索する
+    assert roi.locked
+    assert roi.window(SHAPE) is None
+    roi.update((600.0, 300.0), 20.0, True)
+    assert roi.window(SHAPE) is not None
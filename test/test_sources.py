@@ -0,0 +1,117 @@
+import numpy as np
+import pytest
+
+from mypkg import sources
+from mypkg.capture import DEFAULT_PROFILE, CapturedFrame
+
+
+def _opened_profile(monkeypatch, *args, **kwargs):
+    opened = []
+    monkeypatch.setattr(sources, 'open_capture',
+                        lambda device, profile: opened.append(profile) or (None, {}, []))
+    monkeypatch.setattr(sources, 'ThreadedCapture', lambda cap: cap)
+    sources.open_camera('/dev/video0', *args, **kwargs)
+    return opened[0]
+
+
+def test_open_camera_leaves_unspecified_settings(monkeypatch):
+    profile = _opened_profile(monkeypatch)
+    assert (profile.width, profile.height, profile.fps) == (None, None, None)
+    assert profile.fourcc is None and profile.buffer_size is None
+
+
+def test_open_camera_uses_profile_when_size_given(monkeypatch):
+    profile = _opened_profile(monkeypatch, 640, 480)
+    assert (profile.width, profile.height, profile.fps) == (640, 480, None)
+    assert profile.fourcc == DEFAULT_PROFILE.fourcc
+
+
+def _frames(count=4, shape=(6, 8, 3)):
+    return [np.full(shape, i * 10, dtype=np.uint8) + np.arange(shape[1], dtype=np.uint8)[:, None]
+            for i in range(count)]
+
+
+def test_raw_round_trip(tmp_path):
+    path = str(tmp_path / 'clip.raw')
+    frames = _frames()
+    recorder = sources.RawRecorder(path, 8, 6)
+    for i, frame in enumerate(frames):
+        recorder.write(frame, 100.0 + i * 0.05)
+    recorder.close()
+
+    replay = sources.RawReplaySource(path)
+    assert len(replay) == len(frames)
+    stamps = []
+    for i, frame in enumerate(frames):
+        captured = replay.read()
+        np.testing.assert_array_equal(captured.frame, frame)
+        assert captured.seq == i + 1
+        stamps.append(captured.stamp)
+    assert replay.read() is None
+    # 撮影間隔は録画したときのまま
+    np.testing.assert_allclose(np.diff(stamps), 0.05, atol=1e-6)
+    replay.release()
+
+
+def test_raw_replay_frames_are_copy_on_write(tmp_path):
+    path = str(tmp_path / 'clip.raw')
+    recorder = sources.RawRecorder(path, 8, 6)
+    recorder.write(_frames(1)[0], 0.0)
+    recorder.close()
+
+    captured = sources.RawReplaySource(path).read()
+    captured.frame[:] = 255
+    again = sources.RawReplaySource(path).read()
+    np.testing.assert_array_equal(again.frame, _frames(1)[0])
+
+
+def test_raw_recorder_rejects_other_shape(tmp_path):
+    recorder = sources.RawRecorder(str(tmp_path / 'clip.raw'), 8, 6)
+    with pytest.raises(ValueError):
+        recorder.write(np.zeros((6, 9, 3), np.uint8), 0.0)
+    recorder.close()
+
+
+def test_raw_replay_rejects_other_files(tmp_path):
+    path = tmp_path / 'other.raw'
+    path.write_bytes(b'\x00' * 128)
+    with pytest.raises(ValueError):
+        sources.RawReplaySource(str(path))
+
+
+class ListSource:
+    def __init__(self, frames):
+        self.frames = frames
+        self.seq = 0
+
+    def read(self):
+        if self.seq >= len(self.frames):
+            return None
+        self.seq += 1
+        return CapturedFrame(self.frames[self.seq - 1], float(self.seq), self.seq, 0)
+
+    def release(self):
+        pass
+
+
+def test_recording_source_writes_what_it_reads(tmp_path):
+    path = str(tmp_path / 'clip.raw')
+    frames = _frames()
+    source = sources.RecordingSource(ListSource(frames), path)
+    while source.read() is not None:
+        pass
+    source.release()
+    replay = sources.RawReplaySource(path)
+    np.testing.assert_array_equal(replay.frames, np.stack(frames))
+
+
+def test_recording_source_writes_grayscale(tmp_path):
+    path = str(tmp_path / 'gray.raw')
+    frames = [frame[:, :, 0].copy() for frame in _frames()]
+    source = sources.RecordingSource(ListSource(frames), path)
+    while source.read() is not None:
+        pass
+    source.release()
+    replay = sources.RawReplaySource(path)
+    assert replay.read().frame.shape == (6, 8)
+    np.testing.assert_array_equal(replay.frames, np.stack(frames))
@@ -0,0 +1,57 @@
+import cv2
+import numpy as np
+
+from mypkg import params
+from mypkg.stereo import StereoBallLocator
+
+SIZE = (1280, 720)
+# 右カメラは左カメラの 60 mm 右で、少しだけ内側に向ける（右カメラ座標 = R @ 左カメラ座標 + T）
+ROT, _ = cv2.Rodrigues(np.array([0.0, -0.03, 0.0]))
+TRANS = np.array([-60.0, 0.0, 0.0])
+
+
+def _stereo():
+    k, d = params.CAMERA_MATRIX, params.DIST_COEFFS
+    r1, r2, p1, p2, q, _, _ = cv2.stereoRectify(k, d, k, d, SIZE, ROT, TRANS.reshape(3, 1),
+                                                alpha=0)
+    return {
+        'left': {'camera_matrix': k, 'dist_coeffs': d, 'R': r1, 'P': p1},
+        'right': {'camera_matrix': k, 'dist_coeffs': d, 'R': r2, 'P': p2},
+        'R': ROT, 'T': TRANS, 'Q': q, 'baseline': 60.0,
+    }
+
+
+# rvec, tvec のカメラで 3 次元点 point [mm] のボールを撮ったフレーム（歪みも加える）
+def _view(point, rvec, tvec):
+    k, d = params.CAMERA_MATRIX, params.DIST_COEFFS
+    center, _ = cv2.projectPoints(point.reshape(1, 3), rvec, tvec, k, None)
+    depth = (cv2.Rodrigues(rvec)[0] @ point + tvec)[2]
+    radius = k[0, 0] * params.BALL_DIAMETER * 10 / 2 / depth
+    w, h = SIZE
+    hsv = np.zeros((h, w, 3), np.uint8)
+    lower, upper = params.COLOR_RANGES['blue']
+    # 中心は 1/16 画素単位で描く（視差の丸め誤差を小さくする）
+    cv2.circle(hsv, tuple(int(round(v * 16)) for v in center.ravel()), int(round(radius * 16)),
+               ((np.asarray(lower) + np.asarray(upper)) // 2).tolist(), -1, shift=4)
+    ideal = cv2.cvtColor(hsv, cv2.COLOR_HSV2BGR)
+    # 歪んだフレームの各画素が、歪みのない画像のどこに当たるか
+    xs, ys = np.meshgrid(np.arange(w, dtype=np.float32), np.arange(h, dtype=np.float32))
+    pts = np.stack([xs.ravel(), ys.ravel()], axis=1).reshape(-1, 1, 2)
+    undist = cv2.undistortPoints(pts, k, d, P=k).reshape(h, w, 2)
+    return cv2.remap(ideal, undist[:, :, 0], undist[:, :, 1], cv2.INTER_LINEAR)
+
+
+def test_locate_recovers_3d_point():
+    point = np.array([80.0, 40.0, 600.0])
+    left = _view(point, np.zeros(3), np.zeros(3))
+    right = _view(point, cv2.Rodrigues(ROT)[0].ravel(), TRANS)
+    locator = StereoBallLocator(_stereo())
+    try:
+        balls, _, _ = locator.locate(left, right)
+        assert len(balls) == 1
+        xyz = np.array([balls['X'][0], balls['Y'][0], balls['Z'][0]])
+        # 左カメラ座標 [cm]
+        np.testing.assert_allclose(xyz, point / 10, atol=0.3)
+        assert abs(balls['distance'][0] - np.linalg.norm(point) / 10) < 0.3
+    finally:
+        locator.close()